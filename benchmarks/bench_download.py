@@ -0,0 +1,156 @@
+"""Benchmark de bout en bout du moteur de téléchargement contre fake_server.
+
+Chaque scénario tourne dans un processus neuf (CPU et RSS isolés), face à
+un fake_server lancé dans un autre processus. Mesures: débit, CPU par Go
+transféré (processus client), pic de RSS, délai jusqu'au premier octet.
+
+Scénarios:
+  free        1 fichier, mode gratuit (page, formulaire f1, lien direct)
+  premium     1 fichier via l'API premium, 1 connexion
+  segmented   1 fichier via l'API premium, --connections connexions
+  parallel    --files fichiers via l'API premium, --files jobs simultanés
+  resumed     1 fichier premium coupé à mi-course puis repris (journal .part)
+  prefetch    pré-récupération des noms de 50 pages distinctes (débit en pages/s)
+
+Usage:
+  python benchmarks/bench_download.py --size 256M
+  python benchmarks/bench_download.py --scenarios premium,segmented --bandwidth 50M --latency 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SCENARIOS = ["free", "premium", "segmented", "parallel", "resumed", "prefetch"]
+PREFETCH_PAGES = 50
+
+def peak_rss_mb() -> float | None:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+def start_server(args, files: int, fail_after: str | None = None):
+    cmd = [sys.executable, os.path.join(HERE, "fake_server.py"), "--files", str(files), "--size", args.size,
+           "--bandwidth", args.bandwidth, "--latency", str(args.latency)]
+    if fail_after:
+        cmd += ["--fail-after", fail_after]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+    return proc, proc.stdout.readline().strip()
+
+async def run_scenario(name: str, args, base: str) -> dict:
+    import main as core
+
+    outdir = tempfile.mkdtemp(prefix="f1bench_")
+    first_byte: dict[str, float] = {}
+    t0 = 0.0
+
+    def _progress(url, filename, downloaded, total, pct):
+        if downloaded and url not in first_byte:
+            first_byte[url] = time.perf_counter() - t0
+
+    def _log(msg):
+        pass
+
+    files = {"parallel": args.files, "prefetch": PREFETCH_PAGES}.get(name, 1)
+    urls = [f"{base}/?f{i}" for i in range(files)]
+    api_key = None if name in ("free", "prefetch") else "bench"
+    connections = args.connections if name == "segmented" else 1
+    retry = core.RetryPolicy(3, base_delay=0.05)
+    scheduler = core.JobScheduler(max(files, 1), max(args.connections, files))
+    try:
+        async with core.make_client(scheduler) as client:
+            # Mesures à partir du client prêt (création du contexte TLS exclue)
+            t0, cpu0 = time.perf_counter(), time.process_time()
+            if name == "prefetch":
+                # Pages distinctes: une même page serait lue une seule fois (PAGE_FLIGHT)
+                await core.prefetch_display_names(client, urls)
+            else:
+                async def _job(u):
+                    await core.download_file(client, u, outdir=outdir, log_cb=_log, progress_cb=_progress,
+                                             api_key=api_key, connections=connections, retry=retry)
+                errors = await scheduler.run(urls, _job)
+                if errors:
+                    raise errors[0][1]
+        wall = time.perf_counter() - t0
+        cpu = time.process_time() - cpu0
+        done = [f for f in os.listdir(outdir) if not f.endswith((".part", ".json"))]
+        nbytes = sum(os.path.getsize(os.path.join(outdir, f)) for f in done)
+    finally:
+        shutil.rmtree(outdir, ignore_errors=True)
+    result = {"scenario": name, "wall_s": wall, "bytes": nbytes, "files": len(done), "cpu_s": cpu, "rss_mb": peak_rss_mb()}
+    if name == "prefetch":
+        result["pages_per_s"] = PREFETCH_PAGES / wall
+    else:
+        result["mb_per_s"] = nbytes / 1024 / 1024 / wall
+        result["cpu_s_per_gb"] = cpu / (nbytes / 1024 ** 3) if nbytes else None
+        result["ttfb_ms"] = 1000 * min(first_byte.values()) if first_byte else None
+    return result
+
+def child(args):
+    """Processus d'un scénario: lance le serveur, mesure, imprime une ligne JSON."""
+    files = {"parallel": args.files, "prefetch": PREFETCH_PAGES}.get(args.run, 1)
+    # Coupure à mi-fichier: le serveur accepte les suffixes K/M/G
+    fail_after = f"{args.size}/2" if args.run == "resumed" else None
+    proc, base = start_server(args, files, fail_after)
+    try:
+        # À fixer avant l'import de main (API_BASE est lu à l'import)
+        os.environ["F1_API_BASE"] = f"{base}/v1"
+        sys.path.insert(0, os.path.join(HERE, ".."))
+        print(json.dumps(asyncio.run(run_scenario(args.run, args, base))), flush=True)
+    finally:
+        proc.terminate()
+        proc.wait()
+
+def fmt(v, spec):
+    return "—" if v is None else format(v, spec)
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="Benchmark du moteur contre fake_server")
+    p.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"liste séparée par des virgules ({', '.join(SCENARIOS)})")
+    p.add_argument("--size", default="256M", help="taille de chaque fichier")
+    p.add_argument("--files", type=int, default=4, help="fichiers du scénario parallel")
+    p.add_argument("--connections", type=int, default=4, help="connexions du scénario segmented")
+    p.add_argument("--bandwidth", default="0", help="débit max par connexion côté serveur (0 = illimité)")
+    p.add_argument("--latency", type=float, default=0.0, help="latence serveur par requête (ms)")
+    p.add_argument("--json", action="store_true", help="sortie JSON brute (une ligne par scénario)")
+    p.add_argument("--run", help=argparse.SUPPRESS)
+    return p
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.run:
+        return child(args)
+    forwarded = ["--size", args.size, "--files", str(args.files), "--connections", str(args.connections),
+                 "--bandwidth", args.bandwidth, "--latency", str(args.latency)]
+    if not args.json:
+        print(f"{'scénario':<11}{'fichiers':>9}{'débit':>14}{'CPU s/Go':>10}{'RSS Mo':>8}{'TTFB ms':>9}")
+    for name in [s.strip() for s in args.scenarios.split(",") if s.strip()]:
+        if name not in SCENARIOS:
+            print(f"⚠️ Scénario inconnu ignoré: {name}")
+            continue
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), "--run", name] + forwarded,
+                             capture_output=True, text=True)
+        lines = [ln for ln in out.stdout.splitlines() if ln.startswith("{")]
+        if out.returncode or not lines:
+            tail = (out.stderr or out.stdout).strip().splitlines()
+            print(f"❌ {name}: {tail[-1] if tail else out.returncode}")
+            continue
+        r = json.loads(lines[-1])
+        if args.json:
+            print(json.dumps(r))
+            continue
+        rate = f"{r['pages_per_s']:.0f} pages/s" if "pages_per_s" in r else f"{r['mb_per_s']:.1f} MB/s"
+        print(f"{name:<11}{r['files']:>9}{rate:>14}{fmt(r.get('cpu_s_per_gb'), '.2f'):>10}"
+              f"{fmt(r['rss_mb'], '.0f'):>8}{fmt(r.get('ttfb_ms'), '.0f'):>9}")
+
+if __name__ == "__main__":
+    main()
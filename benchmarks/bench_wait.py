@@ -0,0 +1,61 @@
+"""Micro-benchmark de extract_wait_seconds sur des pages de tailles réelles.
+
+Compare les motifs précompilés (main.WAIT_MATCHERS) à l'ancienne boucle
+(motifs bruts via le cache de re, préfixe optionnel, repli final).
+Usage: python benchmarks/bench_wait.py
+"""
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import main as core  # noqa: E402
+
+LEGACY_WAIT_REGEXES = [
+    r"(?:veuillez\s+)?patiente[rz]\s*(\d+)\s*(?:sec|secondes?|s)\b",
+    r"please\s+wait\s*(\d+)\s*(?:sec|seconds?)\b",
+    r"t[ée]l[ée]chargement\s+gratuit\s+dans\s*(\d+)",
+    r"vous\s+devez\s+attendre\s+encore\s+(\d+)\s+minutes?",
+    r"var\s+ct\s*=\s*(\d+)\s*;",
+    r"var\s+ct\s*=\s*(\d+)\s*\*\s*60\s*;",
+]
+
+def legacy_wait_seconds(text: str) -> int:
+    low = text.lower()
+    for pat in LEGACY_WAIT_REGEXES:
+        m = re.search(pat, low)
+        if m:
+            secs = int(m.group(1))
+            return secs * 60 if "minute" in pat else secs
+    expr = re.search(r"var\s+ct\s*=\s*(\d+)\s*\*\s*60", low)
+    return int(expr.group(1)) * 60 if expr else 0
+
+FILLER = '<tr><td class="normal">Lorem ipsum dolor sit amet</td><td><a href="/?x">lien</a></td></tr>\n'
+
+def make_page(size: int, marker: str) -> str:
+    """Page d'environ `size` octets, `marker` en fin de page (script du compte à rebours)."""
+    body = FILLER * max(1, size // len(FILLER))
+    return f"<html><body><table>{body}</table><script>{marker}</script></body></html>"
+
+CASES = [
+    ("var ct = N*60", "var ct = 5*60;", 300),
+    ("attente texte", "Vous devez attendre encore 5 minutes", 300),
+    ("sans attente", "", 0),
+]
+SIZES = [20_000, 60_000, 200_000]  # page gratuite typique: 20-60 Ko
+
+def bench(fn, page, n=200):
+    return min(timeit.repeat(lambda: fn(page), number=n, repeat=5)) / n * 1e6
+
+def main():
+    print(f"{'cas':<16}{'taille':>9}{'ancien µs':>12}{'nouveau µs':>12}{'gain':>7}")
+    for label, marker, expected in CASES:
+        for size in SIZES:
+            page = make_page(size, marker)
+            assert core.extract_wait_seconds(page) == expected
+            old, new = bench(legacy_wait_seconds, page), bench(core.extract_wait_seconds, page)
+            print(f"{label:<16}{len(page):>9}{old:>12.1f}{new:>12.1f}{old / new:>6.1f}x")
+
+if __name__ == "__main__":
+    main()
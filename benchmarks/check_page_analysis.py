@@ -0,0 +1,112 @@
+"""Vérifie que analyze_page (un seul parcours) donne les mêmes résultats que
+les fonctions unitaires (extract_display_filename, extract_wait_seconds,
+detect_captcha, looks_like_error_html, find_download_form, find_direct_link,
+<form id="f1">), sur les pages enregistrées de benchmarks/pages/, avec
+chaque parseur disponible (html.parser, lxml).
+
+Compare aussi le résultat de lxml (opt-in via F1_HTML_PARSER) à celui de
+html.parser (défaut): les écarts sont signalés, et comptés avec --strict.
+
+Usage:
+  python benchmarks/check_page_analysis.py            # tous les parseurs installés
+  python benchmarks/check_page_analysis.py --parser lxml
+  python benchmarks/check_page_analysis.py --strict   # échoue aussi si lxml diverge
+Code de sortie 1 si une différence est trouvée.
+"""
+import argparse
+import importlib.util
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PAGES_DIR = os.path.join(HERE, "pages")
+BASE_URL = "https://1fichier.com/?abcdef12345"
+PARSERS = ["html.parser", "lxml"]
+DEFAULT_PARSER = "html.parser"
+
+sys.path.insert(0, os.path.join(HERE, ".."))
+import main as core  # noqa: E402
+from bs4 import BeautifulSoup  # noqa: E402
+
+def _form_key(form):
+    return None if form is None else str(form)
+
+def reference(text: str, parser: str) -> dict:
+    """Résultats des fonctions unitaires (chacune reparcourt le document)."""
+    soup = BeautifulSoup(text, parser)
+    return {
+        "name": core.extract_display_filename(soup),
+        "wait_seconds": core.extract_wait_seconds(text),
+        "captcha": core.detect_captcha(soup),
+        "error": core.looks_like_error_html(text),
+        "form": _form_key(core.find_download_form(soup)),
+        "form_f1": _form_key(soup.find("form", id="f1")),
+        "direct_link": core.find_direct_link(soup, BASE_URL),
+    }
+
+def single_pass(text: str, parser: str) -> dict:
+    core.HTML_PARSER = parser
+    page = core.analyze_page(text, BASE_URL)
+    return {
+        "name": page.name,
+        "wait_seconds": page.wait_seconds,
+        "captcha": page.captcha,
+        "error": page.error,
+        "form": _form_key(page.form),
+        "form_f1": _form_key(page.form_f1),
+        "direct_link": page.direct_link,
+    }
+
+def pages():
+    for fname in sorted(os.listdir(PAGES_DIR)):
+        if fname.endswith(".html"):
+            with open(os.path.join(PAGES_DIR, fname), encoding="utf-8") as f:
+                yield fname, f.read()
+
+def check(parser: str) -> int:
+    """Compare les deux analyses sur chaque page; retourne le nombre de différences."""
+    diffs = 0
+    for fname, text in pages():
+        ref, new = reference(text, parser), single_pass(text, parser)
+        bad = [k for k in ref if ref[k] != new[k]]
+        for k in bad:
+            print(f"❌ {parser} {fname} {k}: attendu {ref[k]!r}, obtenu {new[k]!r}")
+        if not bad:
+            print(f"✅ {parser:<11} {fname}")
+        diffs += len(bad)
+    return diffs
+
+def check_against_default(parser: str) -> int:
+    """Compare analyze_page sous `parser` à analyze_page sous html.parser (défaut)."""
+    diffs = 0
+    for fname, text in pages():
+        ref, new = single_pass(text, DEFAULT_PARSER), single_pass(text, parser)
+        bad = [k for k in ref if ref[k] != new[k]]
+        for k in bad:
+            print(f"⚠️ {parser} ≠ {DEFAULT_PARSER} {fname} {k}: {ref[k]!r} / {new[k]!r}")
+        if not bad:
+            print(f"✅ {parser} == {DEFAULT_PARSER} {fname}")
+        diffs += len(bad)
+    return diffs
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Équivalence analyze_page / fonctions unitaires")
+    p.add_argument("--parser", choices=PARSERS, help="un seul parseur (défaut: tous ceux installés)")
+    p.add_argument("--strict", action="store_true", help="compter les écarts entre lxml et html.parser")
+    args = p.parse_args(argv)
+    parsers = [args.parser] if args.parser else [n for n in PARSERS if n == "html.parser" or importlib.util.find_spec(n)]
+    diffs = 0
+    for parser in parsers:
+        diffs += check(parser)
+    divergences = 0
+    for parser in parsers:
+        if parser != DEFAULT_PARSER:
+            divergences += check_against_default(parser)
+    skipped = [n for n in PARSERS if n not in parsers]
+    if skipped and not args.parser:
+        print(f"⚠️ Parseur non installé, non vérifié: {', '.join(skipped)}")
+    print(f"{diffs} différence(s), {divergences} écart(s) avec {DEFAULT_PARSER}")
+    return 1 if diffs or (args.strict and divergences) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
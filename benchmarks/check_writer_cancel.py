@@ -0,0 +1,89 @@
+"""Vérifie qu'une annulation pendant la contre-pression de BufferedFileWriter
+ne corrompt ni le .part ni son journal.
+
+Scénario: première écriture lente, deuxième bloc en attente (contre-pression),
+annulation du producteur, puis aclose() (lui-même annulé une seconde fois
+dans la variante "double"). Le fichier doit contenir les deux blocs à leur
+place et le journal couvrir [0, 8), sans erreur d'écriture. Dans la variante
+"double", le tampon non écrit peut être perdu, mais le journal ne doit
+déclarer que des octets réellement présents.
+Usage: python benchmarks/check_writer_cancel.py  (code de sortie 1 en cas d'écart)
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import main as core  # noqa: E402
+
+SLOW_WRITE = 0.3
+
+class SlowWriter(core.BufferedFileWriter):
+    """Première écriture volontairement lente (disque saturé)."""
+    slow = True
+
+    def _write_blocking(self, buf, offset):
+        if self.slow:
+            self.slow = False
+            time.sleep(SLOW_WRITE)
+        super()._write_blocking(buf, offset)
+
+async def scenario(part_path: str, double: bool) -> list[str]:
+    journal = core.ResumeJournal(part_path, "https://1fichier.com/?test", 8)
+    writer = SlowWriter(part_path, "wb", buffer_size=4, max_pending=4, journal=journal)
+
+    async def produce():
+        await writer.write(b"AAAA")  # soumis, écriture lente
+        await writer.write(b"BBBB")  # contre-pression: attend la première écriture
+
+    task = asyncio.create_task(produce())
+    await asyncio.sleep(SLOW_WRITE / 3)
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    errors = []
+    closing = asyncio.create_task(writer.aclose())
+    if double:
+        await asyncio.sleep(0)
+        closing.cancel()
+    try:
+        await closing
+    except asyncio.CancelledError:
+        pass
+    except Exception as e:  # noqa: BLE001
+        errors.append(f"aclose: {e!r}")
+    if not writer._f.closed:
+        errors.append("fichier non fermé")
+    with open(part_path, "rb") as f:
+        data = f.read()
+    saved = core.ResumeJournal.load(part_path)
+    ranges = saved.ranges if saved else None
+    if double:
+        end = ranges[0][1] if ranges else 0
+        if ranges not in ([], [[0, end]]) or data[:end] != b"AAAABBBB"[:end]:
+            errors.append(f"journal {ranges!r} incohérent avec le .part {data!r}")
+    else:
+        if data != b"AAAABBBB":
+            errors.append(f".part: attendu b'AAAABBBB', obtenu {data!r}")
+        if ranges != [[0, 8]]:
+            errors.append(f"journal: attendu [[0, 8]], obtenu {ranges!r}")
+    return errors
+
+def main():
+    failed = 0
+    for name, double in (("simple", False), ("double", True)):
+        with tempfile.TemporaryDirectory() as tmp:
+            errors = asyncio.run(scenario(os.path.join(tmp, "f.bin.part"), double))
+        for e in errors:
+            print(f"❌ {name}: {e}")
+        if not errors:
+            print(f"✅ {name}: .part et journal intacts après annulation")
+        failed += bool(errors)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
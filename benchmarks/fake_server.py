@@ -0,0 +1,263 @@
+"""Serveur local imitant 1fichier, pour mesurer le moteur sans le vrai site.
+
+Routes (même forme d'URL que le site):
+  GET  /?<id>                     page gratuite: nom, compte à rebours `var ct = N;`,
+                                  formulaire f1 (id "captcha" / "gone": page captcha / erreur)
+  POST /?<id>                     page après attente avec le lien direct
+  GET  /dl/<id>/<nom>             hôte de fichier: Range, ETag, Content-Disposition
+  POST /v1/file/info.cgi          API premium: infos du fichier (+ checksum sha256 si --checksum)
+  POST /v1/download/get_token.cgi API premium: lien direct
+
+Les fichiers f0..f<N-1> sont générés à la volée (aucune mémoire par Go).
+Défauts injectables: latence par requête, débit plafonné par connexion,
+coupure du premier transfert de chaque fichier après K octets, 503 aléatoires.
+
+Usage autonome:
+  python benchmarks/fake_server.py --files 4 --size 64M --wait 0 --bandwidth 20M
+Affiche l'URL de base; pointer F1_API_BASE vers <base>/v1 pour le mode premium.
+"""
+import argparse
+import hashlib
+import http.server
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from main import parse_rate  # noqa: E402
+
+BLOCK_SIZE = 1024 * 1024
+WRITE_SIZE = 64 * 1024
+
+class FakeOneFichier(http.server.ThreadingHTTPServer):
+    """Serveur + configuration; `stats` compte les requêtes par route."""
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, files=1, size=16 * 1024 * 1024, wait=0,
+                 latency=0.0, bandwidth=0, fail_after=None, fault_rate=0.0, checksum=False, seed=1):
+        super().__init__((host, port), FakeHandler)
+        self.files = {f"f{i}": size for i in range(files)}
+        self.wait = wait
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.fail_after = fail_after
+        self.fault_rate = fault_rate
+        self.checksum = checksum
+        self.block = random.Random(seed).randbytes(BLOCK_SIZE)
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.cut_done: set[str] = set()
+        self.stats: dict[str, int] = {}
+        self._digests: dict[str, str] = {}
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    def page_url(self, file_id: str) -> str:
+        return f"{self.base_url}/?{file_id}"
+
+    def filename(self, file_id: str) -> str:
+        return f"bench_{file_id}.bin"
+
+    def data(self, start: int, end: int):
+        """Octets [start, end] du contenu (identique pour tous les fichiers), par blocs."""
+        pos = start
+        while pos <= end:
+            off = pos % BLOCK_SIZE
+            n = min(WRITE_SIZE, BLOCK_SIZE - off, end - pos + 1)
+            yield self.block[off:off + n]
+            pos += n
+
+    def digest(self, file_id: str) -> str:
+        with self.lock:
+            if file_id not in self._digests:
+                h = hashlib.sha256()
+                for chunk in self.data(0, self.files[file_id] - 1):
+                    h.update(chunk)
+                self._digests[file_id] = h.hexdigest()
+            return self._digests[file_id]
+
+    def count(self, route: str):
+        with self.lock:
+            self.stats[route] = self.stats.get(route, 0) + 1
+
+    def start(self) -> "FakeOneFichier":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+class FakeHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # en-têtes et corps écrits séparément: évite l'ACK retardé
+    server: FakeOneFichier
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, ctype="text/html; charset=utf-8", headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _html(self, body: str):
+        self._send(200, f"<html><head><title>1fichier</title></head><body>{body}</body></html>".encode())
+
+    def _json(self, obj: dict):
+        self._send(200, json.dumps(obj).encode(), "application/json")
+
+    def _body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def _file_id(self, url: str) -> str | None:
+        fid = urlsplit(url).query.split("&", 1)[0]
+        return fid if fid in self.server.files else None
+
+    def do_GET(self):
+        srv = self.server
+        if srv.latency:
+            time.sleep(srv.latency)
+        path, _, query = self.path.partition("?")
+        if path.startswith("/dl/"):
+            return self._serve_file(path)
+        srv.count("page")
+        if query == "captcha":
+            return self._html('<div class="g-recaptcha" data-sitekey="bench"></div>')
+        if query == "gone":
+            return self._html("<p>Le fichier demandé n'existe plus.</p>")
+        fid = self._file_id(self.path)
+        if fid is None:
+            return self._send(404, b"not found")
+        script = f"<script>var ct = {srv.wait};</script>" if srv.wait else ""
+        size_mb = srv.files[fid] / 1024 / 1024
+        self._html(
+            f'<table><tr><td class="normal"><span style="font-weight:bold">{srv.filename(fid)}</span></td>'
+            f"<td>{size_mb:.2f} Mo</td></tr></table>{script}"
+            f'<form id="f1" method="post" action="/?{fid}"><input type="hidden" name="adz" value="1">'
+            '<input type="submit" value="Accéder au téléchargement"></form>'
+        )
+
+    def do_POST(self):
+        srv = self.server
+        if srv.latency:
+            time.sleep(srv.latency)
+        body = self._body()
+        path = self.path.split("?", 1)[0]
+        if path.startswith("/v1/"):
+            srv.count("api")
+            try:
+                fid = self._file_id(json.loads(body or b"{}").get("url", ""))
+            except ValueError:
+                fid = None
+            if fid is None:
+                return self._json({"status": "KO", "message": "Resource not found #469"})
+            if path == "/v1/file/info.cgi":
+                info = {"url": srv.page_url(fid), "filename": srv.filename(fid), "size": srv.files[fid]}
+                if srv.checksum:
+                    info["checksum"] = srv.digest(fid)
+                return self._json(info)
+            if path == "/v1/download/get_token.cgi":
+                return self._json({"status": "OK", "url": f"{srv.base_url}/dl/{fid}/{srv.filename(fid)}"})
+            return self._send(404, b"not found")
+        srv.count("form")
+        fid = self._file_id(self.path)
+        if fid is None:
+            return self._send(404, b"not found")
+        self._html(f'<a href="/dl/{fid}/{srv.filename(fid)}">Cliquez ici pour télécharger le fichier</a>')
+
+    def _serve_file(self, path: str):
+        srv = self.server
+        srv.count("file")
+        parts = path.split("/")
+        fid = parts[2] if len(parts) > 2 else ""
+        if fid not in srv.files:
+            return self._send(404, b"not found")
+        if srv.fault_rate and srv.rng.random() < srv.fault_rate:
+            return self._send(503, b"busy", "text/plain", {"Retry-After": "0"})
+        size = srv.files[fid]
+        start, end = 0, size - 1
+        etag = f'"{fid}-{size}"'
+        rng = self.headers.get("Range")
+        if_range = self.headers.get("If-Range")
+        m = re.match(r"bytes=(\d+)-(\d*)", rng or "")
+        partial = bool(m) and (if_range is None or if_range == etag)
+        if partial:
+            start = int(m.group(1))
+            end = min(int(m.group(2)), size - 1) if m.group(2) else size - 1
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Content-Disposition", f'attachment; filename="{srv.filename(fid)}"')
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", etag)
+        self.end_headers()
+        cut = None
+        if srv.fail_after is not None:
+            with srv.lock:
+                if fid not in srv.cut_done:
+                    srv.cut_done.add(fid)
+                    cut = srv.fail_after
+        sent = 0
+        t0 = time.monotonic()
+        try:
+            for chunk in srv.data(start, end):
+                if cut is not None and sent >= cut:
+                    self.close_connection = True
+                    return
+                self.wfile.write(chunk)
+                sent += len(chunk)
+                if srv.bandwidth:
+                    ahead = sent / srv.bandwidth - (time.monotonic() - t0)
+                    if ahead > 0:
+                        time.sleep(ahead)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="Faux serveur 1fichier pour les benchmarks")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=0)
+    p.add_argument("--files", type=int, default=1, help="nombre de fichiers f0..fN-1")
+    p.add_argument("--size", default="16M", help="taille de chaque fichier (ex: 64M, 1G)")
+    p.add_argument("--wait", type=int, default=0, help="compte à rebours des pages gratuites (s)")
+    p.add_argument("--latency", type=float, default=0.0, help="latence ajoutée par requête (ms)")
+    p.add_argument("--bandwidth", default="0", help="débit max par connexion (ex: 20M, 0 = illimité)")
+    p.add_argument("--fail-after", default=None, help="coupe le premier transfert de chaque fichier après N octets (ex: 8M, 64M/2)")
+    p.add_argument("--fault-rate", type=float, default=0.0, help="probabilité d'un 503 sur l'hôte de fichier")
+    p.add_argument("--checksum", action="store_true", help="info.cgi renvoie le sha256")
+    return p
+
+def parse_size_fraction(text: str) -> int:
+    """"8M" -> octets; "64M/2" -> la moitié de 64M."""
+    size, _, div = text.partition("/")
+    return parse_rate(size) // int(div or 1)
+
+def server_from_args(args) -> FakeOneFichier:
+    return FakeOneFichier(
+        args.host, args.port, files=args.files, size=parse_rate(args.size), wait=args.wait,
+        latency=args.latency / 1000, bandwidth=parse_rate(args.bandwidth),
+        fail_after=parse_size_fraction(args.fail_after) if args.fail_after else None,
+        fault_rate=args.fault_rate, checksum=args.checksum,
+    )
+
+def main(argv=None):
+    srv = server_from_args(build_parser().parse_args(argv))
+    print(srv.base_url, flush=True)
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -6,17 +6,21 @@ file, attente entre téléchargements, pause/reprise, etc.).
 
 Principes clefs:
  - Thread principal: uniquement pour Tkinter.
- - Thread worker: lance un event loop asyncio (asyncio.run) pour exécuter les
-     opérations réseau (httpx) et les coroutines de téléchargement.
+ - Thread réseau: un event loop asyncio persistant exécute les opérations
+     réseau (préfetch des noms, téléchargements) avec un seul client httpx
+     (core.make_client), dont les connexions sont réutilisées d'un lot à l'autre.
  - Communication UI <-> worker via:
-         * Queue LOG_QUEUE (texte log + progression) + polling .after()
-         * Callbacks `progress_cb` / `wait_cb` renvoyant dans le thread principal
-             via root.after.
+         * Queue LOG_QUEUE (texte log + événements à afficher) + polling .after()
+         * Événements typés de core.download_file (`event_cb`, voir
+             _on_core_event): progression via ProgressBus, le reste renvoyé
+             dans le thread principal via root.after; leur texte n'est
+             produit qu'à l'affichage, dans la langue courante.
  - Pause: asyncio.Event (set = actif, clear = en pause) consultée dans le
      code core.download_file pour geler les boucles (attente + flux).
- - Compte à rebours attente: mis à jour par wait_cb. Si après reprise aucun
-     nouveau callback ne survient (cas edge), un fallback local décrémente le
-     compteur côté GUI.
+ - Compte à rebours attente: core.WaitScheduler garde l'échéance de chaque
+     fichier en attente (pause = échéances décalées); l'affichage recalcule
+     le restant à chaque image (_render_waits), sans thread ni callback par
+     seconde.
 """
 
 import asyncio
@@ -26,7 +30,9 @@ import os
 import io
 import json
 import base64
-import time
+import math
+import logging
+import logging.handlers
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import main as core  # le fichier main.py existant
@@ -46,6 +52,15 @@ TEXT = {
         'api_key_saved': "Clé API sauvegardée",
         'api_key_cleared': "Clé API effacée",
         'api_key_load_error': "Erreur chargement clé API:",
+        'connections': "Connexions par fichier (premium):",
+        'parallel': "Téléchargements simultanés:",
+        'preallocate': "Préallouer les fichiers",
+        'checksum': "Empreinte SHA-256",
+        'retries': "Nouvelles tentatives:",
+        'limit': "Débit max total (ex: 2M):",
+        'limit_per_file': "Par fichier:",
+        'limit_schedule': "Horaires (ex: 08:00-19:00=1M):",
+        'limit_invalid': "⚠️ Limite de débit ignorée:",
         'add': "Ajouter",
         'start': "Démarrer",
         'pause': "Pause",
@@ -61,9 +76,11 @@ TEXT = {
         'info_downloading_exists': "Téléchargement déjà en cours.",
         'prefetch_start': "🔍 Pré-récupération des noms...",
         'prefetch_error': "[Préfetch noms] Erreur:",
+        'store_error': "⚠️ File persistante indisponible:",
+        'store_restored': "📋 File précédente restaurée: {n} lien(s) non terminé(s)",
         'prefetch_summary_header': "— Récapitulatif —",
         'prefetch_unknown_name': "(nom inconnu)",
-        'stop_info': "L'arrêt prendra effet à la fin du fichier courant.",
+        'stop_info': "L'arrêt prendra effet à la fin des fichiers en cours.",
         'status_waiting': "En attente",
         'status_running': "En cours",
         'status_paused': "En pause",
@@ -89,6 +106,15 @@ TEXT = {
         'api_key_saved': "API key saved",
         'api_key_cleared': "API key cleared",
         'api_key_load_error': "API key loading error:",
+        'connections': "Connections per file (premium):",
+        'parallel': "Simultaneous downloads:",
+        'preallocate': "Preallocate files",
+        'checksum': "SHA-256 checksum",
+        'retries': "Retries:",
+        'limit': "Max total rate (e.g. 2M):",
+        'limit_per_file': "Per file:",
+        'limit_schedule': "Schedule (e.g. 08:00-19:00=1M):",
+        'limit_invalid': "⚠️ Rate limit ignored:",
         'add': "Add",
         'start': "Start",
         'pause': "Pause",
@@ -104,9 +130,11 @@ TEXT = {
         'info_downloading_exists': "Download already running.",
         'prefetch_start': "🔍 Prefetching names...",
         'prefetch_error': "[Prefetch names] Error:",
+        'store_error': "⚠️ Persistent queue unavailable:",
+        'store_restored': "📋 Previous queue restored: {n} unfinished link(s)",
         'prefetch_summary_header': "— Summary —",
         'prefetch_unknown_name': "(unknown name)",
-        'stop_info': "Stop will occur after current file finishes.",
+        'stop_info': "Stop will occur after the running files finish.",
         'status_waiting': "Waiting",
         'status_running': "Running",
         'status_paused': "Paused",
@@ -123,6 +151,12 @@ TEXT = {
 }
 
 LOG_QUEUE = queue.Queue()
+PROGRESS_FRAME_MS = 50  # intervalle d'application de la progression (~20 images/s)
+LOG_POLL_MS = 150       # intervalle de lecture de LOG_QUEUE
+LOG_VIEW_LINES = 2000   # lignes gardées dans la zone de logs (les plus anciennes sont retirées)
+LOG_FILE = os.environ.get("F1_LOG_FILE") or os.path.join(os.path.expanduser("~"), ".1fichier_gui.log")
+LOG_FILE_MAX_BYTES = 2 * 1024 * 1024  # taille d'un fichier avant rotation
+LOG_FILE_BACKUPS = 3                  # anciens fichiers gardés (.1, .2, .3)
 
 class QueueWriter(io.TextIOBase):
     def write(self, s):  # type: ignore[override]
@@ -147,15 +181,23 @@ class DownloaderGUI:
         root.geometry("900x600")
         # État interne (initialiser avant les widgets car certains callbacks les consultent)
         self._original_stdout = None
-        self.worker_thread = None
+        self.loop = None       # event loop du thread réseau (voir _submit)
+        self.client = None     # client httpx partagé (créé dans ce loop)
+        self.scheduler = None  # limites par hôte du client + plafond de jobs
         self.stop_requested = False
         self.urls_in_progress = {}
         self.queued_order = []
         self.pause_event = None
         self.downloading = False
-        self.current_url = None
-        self.wait_remaining = {}
-        self.wait_countdown_threads = set()
+        self.active_urls = set()
+        self.progress_bus = core.ProgressBus()
+        self.batch_estimator = core.SpeedEstimator()
+        self.waits = core.WaitScheduler()  # échéances des attentes (mode gratuit)
+        self.waiting_urls = set()          # lignes affichant un compte à rebours
+        self.store = None      # file persistante (core.JobStore), voir _load_job_store
+        self.meta_cache = None # noms / état des liens (core.MetadataCache)
+        self.last_errors = {}  # motif du dernier échec par URL (événements failed)
+        self.log_file = self._open_log_file()  # historique complet (zone de logs bornée)
         
         # Configuration file path
         self.config_file = os.path.join(os.path.expanduser("~"), ".1fichier_config.json")
@@ -165,34 +207,37 @@ class DownloaderGUI:
         
         # Charger la clé API sauvegardée
         self._load_api_key()
+        # Restaurer la file non terminée de la session précédente
+        self._load_job_store()
         # Lancement polling logs
-        self.root.after(150, self._poll_log_queue)
-        # Prépare motifs de traduction logs FR->EN
+        self.root.after(LOG_POLL_MS, self._poll_log_queue)
+        self.root.after(PROGRESS_FRAME_MS, self._drain_progress)
+        # Prépare motifs de traduction logs FR->EN (les événements de téléchargement
+        # sont rendus directement dans la langue courante, voir core.format_event)
         self._log_translate_patterns = [
             (re.compile(r'^🔗 Traitement de (.+)$'), '🔗 Processing \\1'),
-            (re.compile(r'^📄 Nom: (.+)$'), '📄 Name: \\1'),
             (re.compile(r'^📄 Nom détecté: (.+) ← (.+)$'), '📄 Name detected: \\1 ← \\2'),
             (re.compile(r"^📄 Nom introuvable \(pour l'instant\) ← (.+)$"), '📄 Name not found (yet) ← \\1'),
-            (re.compile(r'^⏳ Attente (.+)$'), '⏳ Waiting \\1'),
-            (re.compile(r'^✅ Terminé → (.+)$'), '✅ Done → \\1'),
-            (re.compile(r'^✅ Terminé → (.+) \(sans attente\)$'), '✅ Done → \\1 (no wait)'),
+            (re.compile(r'^📄 Nom en cache: (.+) ← (.+)$'), '📄 Cached name: \\1 ← \\2'),
+            (re.compile(r'^📄 Fichier indisponible \(cache\) ← (.+)$'), '📄 File unavailable (cached) ← \\1'),
             (re.compile(r'^🔑 Tentative téléchargement premium via API \(ID: (.+)\)$'), '🔑 Attempting premium download via API (ID: \\1)'),
-            (re.compile(r'^📄 Nom via API: (.+)$'), '📄 Name via API: \\1'),
-            (re.compile(r'^⬇️ Téléchargement premium → (.+)$'), '⬇️ Premium downloading → \\1'),
-            (re.compile(r'^✅ Téléchargement premium terminé → (.+)$'), '✅ Premium download completed → \\1'),
+            (re.compile(r'^🔀 Téléchargement segmenté: (\d+) connexions$'), '🔀 Segmented download: \\1 connections'),
+            (re.compile(r'^ℹ️ Plages non supportées, connexion unique\.$'), 'ℹ️ Ranges not supported, single connection.'),
+            (re.compile(r'^ℹ️ Journal de reprise obsolète, redémarrage complet\.$'), 'ℹ️ Resume journal outdated, restarting from beginning.'),
+            (re.compile(r'^ℹ️ Fichier distant modifié, redémarrage complet\.$'), 'ℹ️ Remote file changed, restarting from beginning.'),
+            (re.compile(r'^ℹ️ Requête Range ignorée par le serveur, redémarrage complet\.$'), 'ℹ️ Server ignored the Range request, restarting from beginning.'),
+            (re.compile(r'^ℹ️ Réponse complète sans requête Range, redémarrage complet\.$'), 'ℹ️ Full response to a request without Range, restarting from beginning.'),
+            (re.compile(r'^🔁 (.+): (.+) — nouvelle tentative (\d+)/(\d+) dans (\d+)s$'), '🔁 \\1: \\2 — retry \\3/\\4 in \\5s'),
+            (re.compile(r'^🔁 Transfert: (.+) — reprise via le lien direct$'), '🔁 Transfer: \\1 — resuming via the direct link'),
+            (re.compile(r'^🔒 Empreinte vérifiée$'), '🔒 Checksum verified'),
+            (re.compile(r'^🔑 Lien premium expiré, renouvellement$'), '🔑 Premium link expired, renewing'),
+            (re.compile(r'^❌ Empreinte invalide: (.+)$'), '❌ Checksum mismatch: \\1'),
             (re.compile(r'^⚠️ Échec téléchargement premium, passage en mode gratuit\.\.\.$'), '⚠️ Premium download failed, switching to free mode...'),
             (re.compile(r'^⚠️ Erreur API premium: (.+), passage en mode gratuit\.\.\.$'), '⚠️ Premium API error: \\1, switching to free mode...'),
-            (re.compile(r'^❌ Page reçue indique indisponibilité / conditions\. \(Fichier supprimé ou limites atteintes\.\)$'), '❌ Page indicates unavailability / conditions (File removed or limits reached).'),
-            (re.compile(r'^⚠️ Captcha détecté\. Résolution manuelle requise.*$'), '⚠️ Captcha detected. Manual resolution required (open in browser, solve, then reuse cookie/token).'),
-            (re.compile(r'^⚠️ Captcha détecté après soumission\. Abandon\.$'), '⚠️ Captcha detected after submission. Aborting.'),
-            (re.compile(r'^⚠️ Captcha détecté après attente\. Abandon\.$'), '⚠️ Captcha detected after wait. Aborting.'),
             (re.compile(r'^📝 Soumission du formulaire de téléchargement…$'), '📝 Submitting download form…'),
             (re.compile(r'^❌ Échec soumission formulaire \(tentative (\d+)\): (.+)$'), r'❌ Form submission failed (attempt \\1): \\2'),
-            (re.compile(r"^❌ Impossible de trouver le lien direct \(peut-être Captcha ou changement de page\)\. Active --debug pour plus d'info\.$"), '❌ Unable to find direct link (maybe Captcha or page changed). Enable --debug for more info.'),
-            (re.compile(r'^❌ Page HTML reçue au lieu du fichier .*Aucune sauvegarde\.$'), '❌ HTML page received instead of file (probably unavailable / removed / conditions). No save.'),
             (re.compile(r'^▶️ Reprise à ([0-9.]+) MB$'), '▶️ Resuming at \\1 MB'),
             (re.compile(r'^ℹ️ Reprise impossible, redémarrage complet\.$'), 'ℹ️ Resume not possible, restarting from beginning.'),
-            (re.compile(r'^⬇️ Téléchargement → (.+)$'), '⬇️ Downloading → \\1'),
             (re.compile(r'^— Récapitulatif —$'), '— Summary —'),
             (re.compile(r'^\(nom inconnu\)$'), '(unknown name)'),
         ]
@@ -239,6 +284,47 @@ class DownloaderGUI:
         self._api_key_placeholder_active = False
         self._set_api_key_placeholder()
 
+        # Options de téléchargement
+        frm_opts = ttk.Frame(self.root)
+        frm_opts.pack(fill=tk.X, padx=8, pady=2)
+        self.lbl_connections = ttk.Label(frm_opts, text=TEXT[self.lang]['connections'])
+        self.lbl_connections.pack(side=tk.LEFT)
+        self.connections_var = tk.IntVar(value=1)
+        self.connections_spin = ttk.Spinbox(frm_opts, from_=1, to=16, width=4, textvariable=self.connections_var)
+        self.connections_spin.pack(side=tk.LEFT, padx=5)
+        self.lbl_parallel = ttk.Label(frm_opts, text=TEXT[self.lang]['parallel'])
+        self.lbl_parallel.pack(side=tk.LEFT, padx=(15, 0))
+        self.parallel_var = tk.IntVar(value=1)
+        self.parallel_spin = ttk.Spinbox(frm_opts, from_=1, to=10, width=4, textvariable=self.parallel_var)
+        self.parallel_spin.pack(side=tk.LEFT, padx=5)
+        self.preallocate_var = tk.BooleanVar(value=False)
+        self.preallocate_chk = ttk.Checkbutton(frm_opts, text=TEXT[self.lang]['preallocate'], variable=self.preallocate_var)
+        self.preallocate_chk.pack(side=tk.LEFT, padx=(15, 0))
+        self.checksum_var = tk.BooleanVar(value=False)
+        self.checksum_chk = ttk.Checkbutton(frm_opts, text=TEXT[self.lang]['checksum'], variable=self.checksum_var)
+        self.checksum_chk.pack(side=tk.LEFT, padx=(15, 0))
+        self.lbl_retries = ttk.Label(frm_opts, text=TEXT[self.lang]['retries'])
+        self.lbl_retries.pack(side=tk.LEFT, padx=(15, 0))
+        self.retries_var = tk.IntVar(value=core.DEFAULT_RETRY_POLICY.retries)
+        self.retries_spin = ttk.Spinbox(frm_opts, from_=0, to=20, width=4, textvariable=self.retries_var)
+        self.retries_spin.pack(side=tk.LEFT, padx=5)
+
+        # Limites de débit (vide ou 0 = illimité)
+        frm_limits = ttk.Frame(self.root)
+        frm_limits.pack(fill=tk.X, padx=8, pady=2)
+        self.lbl_limit = ttk.Label(frm_limits, text=TEXT[self.lang]['limit'])
+        self.lbl_limit.pack(side=tk.LEFT)
+        self.limit_var = tk.StringVar(value="")
+        ttk.Entry(frm_limits, textvariable=self.limit_var, width=8).pack(side=tk.LEFT, padx=5)
+        self.lbl_limit_per_file = ttk.Label(frm_limits, text=TEXT[self.lang]['limit_per_file'])
+        self.lbl_limit_per_file.pack(side=tk.LEFT, padx=(15, 0))
+        self.limit_per_file_var = tk.StringVar(value="")
+        ttk.Entry(frm_limits, textvariable=self.limit_per_file_var, width=8).pack(side=tk.LEFT, padx=5)
+        self.lbl_limit_schedule = ttk.Label(frm_limits, text=TEXT[self.lang]['limit_schedule'])
+        self.lbl_limit_schedule.pack(side=tk.LEFT, padx=(15, 0))
+        self.limit_schedule_var = tk.StringVar(value="")
+        ttk.Entry(frm_limits, textvariable=self.limit_schedule_var, width=30).pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
+
         # Zone URLs
         self.frm_urls = ttk.LabelFrame(self.root, text=TEXT[self.lang]['urls_box'])
         self.frm_urls.pack(fill=tk.BOTH, expand=False, padx=8, pady=5)
@@ -349,6 +435,44 @@ class DownloaderGUI:
         key = self.api_key_var.get().strip()
         return key if key else None
 
+    def get_connections(self) -> int:
+        """Retourne le nombre de connexions par fichier (1 si saisie invalide)."""
+        try:
+            return max(1, int(self.connections_var.get()))
+        except (tk.TclError, ValueError):
+            return 1
+
+    def get_parallel(self) -> int:
+        """Retourne le nombre de téléchargements simultanés (1 si saisie invalide)."""
+        try:
+            return max(1, int(self.parallel_var.get()))
+        except (tk.TclError, ValueError):
+            return 1
+
+    def get_retries(self) -> int:
+        """Retourne le nombre de nouvelles tentatives (défaut du cœur si saisie invalide)."""
+        try:
+            return max(0, int(self.retries_var.get()))
+        except (tk.TclError, ValueError):
+            return core.DEFAULT_RETRY_POLICY.retries
+
+    def get_limits(self) -> tuple[int, int, list]:
+        """Retourne (débit total, débit par fichier, horaires); saisie invalide = illimité."""
+        def _parse(var, parse, default):
+            text = var.get().strip()
+            if not text:
+                return default
+            try:
+                return parse(text)
+            except ValueError as e:
+                LOG_QUEUE.put(f"{TEXT[self.lang]['limit_invalid']} {e}\n")
+                return default
+        return (
+            _parse(self.limit_var, core.parse_rate, 0),
+            _parse(self.limit_per_file_var, core.parse_rate, 0),
+            _parse(self.limit_schedule_var, core.parse_schedule, []),
+        )
+
     def _setup_log_context_menu(self):
         """Configure le menu contextuel pour les logs."""
         # Supprimer tous les éléments existants
@@ -404,10 +528,14 @@ class DownloaderGUI:
             self.tree_context_menu.add_command(label="Copier URL", command=self._copy_tree_url)
             self.tree_context_menu.add_command(label="Copier nom fichier", command=self._copy_tree_filename)
             self.tree_context_menu.add_command(label="Copier ligne complète", command=self._copy_tree_full_line)
+            self.tree_context_menu.add_separator()
+            self.tree_context_menu.add_command(label="Retirer de la file", command=self.remove_selected)
         else:
             self.tree_context_menu.add_command(label="Copy URL", command=self._copy_tree_url)
             self.tree_context_menu.add_command(label="Copy filename", command=self._copy_tree_filename)
             self.tree_context_menu.add_command(label="Copy full line", command=self._copy_tree_full_line)
+            self.tree_context_menu.add_separator()
+            self.tree_context_menu.add_command(label="Remove from queue", command=self.remove_selected)
 
     def _show_tree_context_menu(self, event):
         """Affiche le menu contextuel du tableau."""
@@ -468,6 +596,14 @@ class DownloaderGUI:
         self.lbl_api_key.config(text=TEXT[self.lang]['api_key_label'])
         self.api_save_btn.config(text=TEXT[self.lang]['api_key_save'])
         self.api_clear_btn.config(text=TEXT[self.lang]['api_key_clear'])
+        self.lbl_connections.config(text=TEXT[self.lang]['connections'])
+        self.lbl_parallel.config(text=TEXT[self.lang]['parallel'])
+        self.preallocate_chk.config(text=TEXT[self.lang]['preallocate'])
+        self.checksum_chk.config(text=TEXT[self.lang]['checksum'])
+        self.lbl_retries.config(text=TEXT[self.lang]['retries'])
+        self.lbl_limit.config(text=TEXT[self.lang]['limit'])
+        self.lbl_limit_per_file.config(text=TEXT[self.lang]['limit_per_file'])
+        self.lbl_limit_schedule.config(text=TEXT[self.lang]['limit_schedule'])
         self.frm_urls.config(text=TEXT[self.lang]['urls_box'])
         self.add_btn.config(text=TEXT[self.lang]['add'])
         self.start_btn.config(text=TEXT[self.lang]['start'])
@@ -540,46 +676,82 @@ class DownloaderGUI:
         if path:
             self.outdir_var.set(path)
 
-    def append_log(self, msg: str):
+    @staticmethod
+    def _open_log_file():
+        """Logger vers LOG_FILE, avec rotation (None si le fichier est inaccessible)."""
+        logger = logging.getLogger("1fichier.gui")
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        if not logger.handlers:
+            try:
+                handler = logging.handlers.RotatingFileHandler(LOG_FILE, maxBytes=LOG_FILE_MAX_BYTES, backupCount=LOG_FILE_BACKUPS, encoding="utf-8")
+            except OSError:
+                return None
+            handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+            logger.addHandler(handler)
+        return logger
+
+    def append_log(self, msg: str, translate: bool = True):
         """Ajoute une chaîne dans la zone de logs (en conservant le scroll en bas)."""
-        if self.lang == 'en':
+        if translate and self.lang == 'en':
             msg = self._translate_log_text(msg)
+        self._insert_log_text(msg)
+
+    def _insert_log_text(self, text: str):
+        """Un seul insert en fin de zone, puis retrait des lignes au-delà de LOG_VIEW_LINES."""
         self.log_text.configure(state=tk.NORMAL)
-        self.log_text.insert(tk.END, msg)
+        self.log_text.insert(tk.END, text)
+        excess = int(self.log_text.index("end-1c").split(".")[0]) - LOG_VIEW_LINES
+        if excess > 0:
+            self.log_text.delete("1.0", f"{excess + 1}.0")
         self.log_text.see(tk.END)
         self.log_text.configure(state=tk.DISABLED)
 
     def _poll_log_queue(self):
         """Récupère périodiquement les messages de LOG_QUEUE et met à jour UI.
 
+        - Tous les messages reçus depuis le passage précédent sont insérés en
+          une fois; la zone garde au plus LOG_VIEW_LINES lignes (mémoire et
+          coût d'affichage constants), l'historique complet part dans LOG_FILE.
         - Gère les retours chariot (\r) pour écraser la dernière ligne (progression inline).
         - Déclenche recalcul progression globale.
+        Les événements de téléchargement y sont rendus en texte (voir _on_core_event).
         """
+        shown: list[str] = []   # texte affiché (langue courante)
+        history: list[str] = [] # texte du fichier de log (français)
         updated_any = False
         while True:
             try:
                 item = LOG_QUEUE.get_nowait()
             except queue.Empty:
                 break
+            updated_any = True
+            if isinstance(item, core.DownloadEvent):
+                # Texte produit à l'affichage, dans la langue courante
+                history.append(core.format_event(item) + "\n")
+                shown.append(core.format_event(item, self.lang) + "\n")
+            # Gérer les retours chariot (\r) pour progression inline
+            elif "\r" in item:
+                last = item.split("\r")[-1]
+                if last:
+                    # Remplacer dernière ligne du widget (après le texte déjà reçu)
+                    if shown:
+                        self._insert_log_text("".join(shown))
+                        shown = []
+                    self._replace_last_log_line(last)
             else:
-                # Gérer les retours chariot (\r) pour progression inline
-                if "\r" in item:
-                    parts = item.split("\r")
-                    for p in parts[:-1]:  # lignes complètes avant le dernier segment
-                        if p:
-                            self._update_progress_from_line(p + "\n")
-                    last = parts[-1]
-                    if last:
-                        # Remplacer dernière ligne du widget
-                        self._replace_last_log_line(last)
-                        self._update_progress_from_line(last)
-                else:
-                    self.append_log(item)
-                    self._update_progress_from_line(item)
-                updated_any = True
+                history.append(item)
+                shown.append(self._translate_log_text(item) if self.lang == 'en' else item)
+        if shown:
+            self._insert_log_text("".join(shown))
+        if history and self.log_file:
+            try:
+                self.log_file.info("".join(history).strip("\n"))
+            except Exception:
+                pass
         if updated_any:
             self._recompute_global_progress()
-        self.root.after(150, self._poll_log_queue)
+        self.root.after(LOG_POLL_MS, self._poll_log_queue)
 
     def _replace_last_log_line(self, text):
         """Remplace la dernière ligne du widget log par `text` (utilisé pour \r)."""
@@ -611,32 +783,49 @@ class DownloaderGUI:
             out.append(replaced + ('\n' if ln.endswith('\n') else ''))
         return ''.join(out)
 
-    def _update_progress_from_line(self, line: str):
-        """Interprète une ligne de log pour en extraire des informations.
+    def _log_line(self, m):
+        """log_cb des téléchargements: texte brut vers LOG_QUEUE."""
+        LOG_QUEUE.put(m + ("\n" if not m.endswith("\n") else ""))
+
+    def _on_core_event(self, ev):
+        """event_cb de core.download_file (thread réseau).
 
-        Actions:
-        - Capture et affecte un nom de fichier si log correspondant.
-        - Marque un fichier terminé quand une ligne '✅ Terminé' apparaît.
+        progress -> progress_bus (appliqué une fois par image), waiting ->
+        compte à rebours; les événements qui ont un texte vont tels quels
+        dans LOG_QUEUE (rendus à l'affichage), l'état de la ligne est mis à
+        jour dans le thread principal (_apply_event).
         """
-        # Capture nom affiché logué par main.py (souple sur le texte exact)
-        if "📄" in line and ("Nom" in line or "Nom :" in line):
-            # Extraire après le dernier ':'
-            parts = line.split(":")
-            if len(parts) > 1:
-                name = parts[-1].strip()
-                if name:
-                    for url, data in self.urls_in_progress.items():
-                        if not data.get('display'):
-                            data['display'] = name
-                            self.tree.set(data['iid'], 'display', name)
-                            break
-        elif line.startswith("✅ Terminé"):
-            for url, data in self.urls_in_progress.items():
-                if data['status'] == 'En cours':
-                    data['status'] = 'Terminé'
-                    data['pct'] = 100.0
-                    self.tree.set(data['iid'], 'status', 'Terminé')
-                    self.tree.set(data['iid'], 'progress', '100%')
+        if ev.kind == "progress":
+            self.progress_bus(ev.job, ev.name, ev.downloaded, ev.size, ev.percent)
+            return
+        if ev.kind == "waiting":
+            self._wait_callback(ev.job, ev.remaining, ev.wait)
+        text = core.format_event(ev, self.lang)
+        if text is None:
+            return
+        LOG_QUEUE.put(ev)
+        if ev.kind == "failed":
+            self.last_errors[ev.job] = text
+        elif ev.kind in ("resolved", "completed"):
+            self.root.after(0, self._apply_event, ev)
+
+    def _apply_event(self, ev):
+        """Nom résolu / fichier terminé pour la ligne `ev.job` (thread principal)."""
+        data = self.urls_in_progress.get(ev.job)
+        if not data:
+            return
+        if ev.kind == "resolved":
+            if ev.name and not data.get('display'):
+                data['display'] = ev.name
+                self.tree.set(data['iid'], 'display', ev.name)
+                if self.store:
+                    self.store.update(ev.job, name=ev.name)
+        elif ev.kind == "completed":
+            data['status'] = TEXT[self.lang]['status_done']
+            data['pct'] = 100.0
+            self.tree.set(data['iid'], 'status', data['status'])
+            self.tree.set(data['iid'], 'progress', '100%')
+            self._recompute_global_progress()
 
     def _recompute_global_progress(self):
         """Calcule la moyenne simple des pourcentages des URLs suivies."""
@@ -657,16 +846,17 @@ class DownloaderGUI:
             return
         # Compter combien sont terminés (>=100%) pour index actuel
         finished = sum(1 for d in self.urls_in_progress.values() if d.get('pct',0) >= 100)
-        # Position actuelle = fichiers complétés + 1 si un en cours
-        current_index = finished
-        any_running = any(d.get('status') in (TEXT[self.lang]['status_running'], TEXT[self.lang]['status_paused']) or (isinstance(d.get('pct'), float) and 0 < d.get('pct',0) < 100) for d in self.urls_in_progress.values())
-        if any_running and finished < total_files:
-            current_index = finished + 1
+        # Position actuelle = fichiers complétés + fichiers actifs
+        # Copie: active_urls est modifié par le thread réseau (_job)
+        running = sum(1 for u in list(self.active_urls) if self.urls_in_progress.get(u, {}).get('pct', 0) < 100)
+        current_index = min(total_files, finished + running)
         percent = self.global_progress['value']
         if self.lang == 'fr':
             txt = f"Fichier {current_index}/{total_files} : {percent:.1f}%"
         else:
             txt = f"File {current_index}/{total_files}: {percent:.1f}%"
+        if self.downloading and self.batch_estimator.speed > 0:
+            txt += f" — {core.format_speed(self.batch_estimator.speed)}, {TEXT[self.lang]['eta']}: {core.format_eta(self.batch_estimator.eta())}"
         self.total_progress_label_var.set(txt)
 
     def add_to_queue(self):
@@ -690,21 +880,64 @@ class DownloaderGUI:
         for u in urls:
             if u in self.urls_in_progress:
                 continue
-            initial_status = TEXT[self.lang]['status_waiting']
-            iid = self.tree.insert('', tk.END, values=('', initial_status, '0%', '', '', u))
-            self.urls_in_progress[u] = {'iid': iid, 'status': initial_status, 'pct': 0.0, 'display': '', 'url': u, 'speed': '', 'eta': ''}
-            self.queued_order.append(u)
+            self._add_row(u)
             new_urls.append(u)
+        if new_urls and self.store:
+            self.store.add(new_urls)
         # Efface la zone texte après ajout
         self.urls_text.delete("1.0", tk.END)
-        # Préfetch des noms pour les nouvelles URLs (thread séparé)
+        # Préfetch des noms pour les nouvelles URLs (thread réseau)
         if new_urls:
-            threading.Thread(target=self._prefetch_names_thread, args=(new_urls,), daemon=True).start()
+            self._submit(self._async_prefetch_names(new_urls))
         # Mettre à jour le libellé de progression globale (nombre de fichiers total changé)
         self._update_total_progress_label()
 
+    def _add_row(self, u, display='', status_key='status_waiting', pct=0.0):
+        """Ajoute `u` au tableau et en fin de file (thread principal)."""
+        status = TEXT[self.lang][status_key]
+        iid = self.tree.insert('', tk.END, values=(display, status, f"{pct:.1f}%" if pct else '0%', '', '', u))
+        self.urls_in_progress[u] = {'iid': iid, 'status': status, 'pct': pct, 'display': display, 'url': u, 'speed': '', 'eta': ''}
+        self.queued_order.append(u)
+
+    def _load_job_store(self):
+        """Ouvre la file persistante et réaffiche les jobs non terminés.
+
+        Les noms déjà résolus sont repris tels quels (pas de nouveau préfetch).
+        """
+        try:
+            self.meta_cache = core.MetadataCache()
+            self.store = core.JobStore()
+            pending = self.store.pending()
+        except Exception as e:
+            LOG_QUEUE.put(f"{TEXT[self.lang]['store_error']} {e}\n")
+            self.store = None
+            return
+        for job in pending:
+            pct = job['downloaded'] / job['size'] * 100 if job['size'] else 0.0
+            status_key = 'status_error' if job['state'] == 'error' else 'status_waiting'
+            self._add_row(job['url'], job['name'] or '', status_key, pct)
+        if pending:
+            LOG_QUEUE.put(TEXT[self.lang]['store_restored'].format(n=len(pending)) + "\n")
+            self._update_total_progress_label()
+
+    def remove_selected(self):
+        """Retire les lignes sélectionnées de la file (hors téléchargement)."""
+        if self.downloading:
+            messagebox.showinfo("Info", TEXT[self.lang]['info_add_disabled'])
+            return
+        urls = [self.tree.item(iid, 'values')[5] for iid in self.tree.selection()]
+        for u in urls:
+            data = self.urls_in_progress.pop(u, None)
+            if data:
+                self.tree.delete(data['iid'])
+            if u in self.queued_order:
+                self.queued_order.remove(u)
+        if urls and self.store:
+            self.store.remove(urls)
+        self._update_total_progress_label()
+
     def start_downloads(self):
-        """Démarre l'exécution séquentielle des URLs en file (thread séparé)."""
+        """Démarre l'exécution des URLs en file (thread séparé, N en parallèle)."""
         if self.downloading:
             messagebox.showinfo("Info", TEXT[self.lang]['info_downloading_exists'])
             return
@@ -715,19 +948,62 @@ class DownloaderGUI:
                 return
         self.stop_requested = False
         self.downloading = True
+        # Nouvelles bases de vitesse: chaque ligne part de son premier état
+        # reçu dans ce lot (voir _apply_progress), l'existant n'est pas compté
+        self.batch_estimator = core.SpeedEstimator()
+        for data in self.urls_in_progress.values():
+            data.pop('estimator', None)
+            data.pop('batch_start', None)
         self.start_btn.configure(state=tk.DISABLED)
         self.add_btn.configure(state=tk.DISABLED)
         self.stop_btn.configure(state=tk.NORMAL)
         self.pause_btn.configure(state=tk.NORMAL, text=TEXT[self.lang]['pause'])
-        self.worker_thread = threading.Thread(target=self._thread_run, args=(self.outdir_var.get().strip(),), daemon=True)
-        self.worker_thread.start()
+        future = self._submit(self._async_download(self.outdir_var.get().strip()))
+        future.add_done_callback(self._on_download_future_done)
+
+    def _submit(self, coro):
+        """Planifie `coro` dans l'event loop du thread réseau (démarré au premier appel).
+
+        Retourne un concurrent.futures.Future.
+        """
+        if self.loop is None:
+            self.loop = asyncio.new_event_loop()
+            threading.Thread(target=self.loop.run_forever, name="network", daemon=True).start()
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def _get_client(self):
+        """Client httpx partagé par le préfetch et les téléchargements (thread réseau)."""
+        if self.client is None:
+            self.scheduler = core.JobScheduler()
+            self.client = core.make_client(self.scheduler)
+        return self.client
+
+    def shutdown(self, timeout: float = 5.0):
+        """Ferme le client httpx partagé (aclose) puis arrête l'event loop réseau.
+
+        Appelé à la fermeture de la fenêtre; les téléchargements encore en
+        cours sont annulés avant la fermeture du client.
+        """
+        loop = self.loop
+        if loop is None or not loop.is_running():
+            return
+
+        async def _close():
+            current = asyncio.current_task()
+            tasks = [t for t in asyncio.all_tasks() if t is not current]
+            for t in tasks:
+                t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if self.client is not None:
+                await self.client.aclose()
+                self.client = None
 
-    def _prefetch_names_thread(self, urls):
-        """Enveloppe synchrone pour lancer l'extraction des noms en thread."""
         try:
-            asyncio.run(self._async_prefetch_names(urls))
-        except Exception as e:
-            LOG_QUEUE.put(f"[Préfetch noms] Erreur: {e}\n")
+            asyncio.run_coroutine_threadsafe(_close(), loop).result(timeout)
+        except Exception:
+            pass
+        loop.call_soon_threadsafe(loop.stop)
+        self.loop = None
 
     async def _async_prefetch_names(self, urls):
         """Coroutine: pré-récupère (en parallèle) les noms affichables des URLs.
@@ -736,318 +1012,304 @@ class DownloaderGUI:
         La mise à jour de la Treeview est tolérante (try/except) car elle peut
         survenir alors que l'utilisateur manipule l'interface.
         """
-        async with core.httpx.AsyncClient(headers={"User-Agent": "Mozilla/5.0"}):
-            # Utilise une nouvelle session pour chaque (limitation mineure). On peut optimiser.
-            async with core.httpx.AsyncClient(headers={"User-Agent": "Mozilla/5.0"}) as client:  # type: ignore[attr-defined]
-                name_map = await core.prefetch_display_names(client, urls, log_cb=lambda m: LOG_QUEUE.put(m + ("\n" if not m.endswith("\n") else "")))
-            for u, name in name_map.items():
-                if name and u in self.urls_in_progress:
-                    data = self.urls_in_progress[u]
-                    if not data.get('display'):
-                        data['display'] = name
-                        try:
-                            self.tree.set(data['iid'], 'display', name)
-                        except Exception:
-                            pass
+        try:
+            name_map = await core.prefetch_display_names(self._get_client(), urls, log_cb=lambda m: LOG_QUEUE.put(m + ("\n" if not m.endswith("\n") else "")), cache=self.meta_cache)
+        except Exception as e:
+            LOG_QUEUE.put(f"[Préfetch noms] Erreur: {e}\n")
+            return
+        for u, name in name_map.items():
+            if name and self.store:
+                self.store.update(u, name=name)
+            if name and u in self.urls_in_progress:
+                data = self.urls_in_progress[u]
+                if not data.get('display'):
+                    data['display'] = name
+                    try:
+                        self.tree.set(data['iid'], 'display', name)
+                    except Exception:
+                        pass
 
     def toggle_pause(self):
         """Met en pause ou reprend les opérations (attente + téléchargement).
 
-        - En pause: on efface (clear) l'Event -> les boucles asynchrones se bloquent.
-        - Reprise: set() l'Event -> reprise des boucles. Si on était en 'Attente',
-            on restaure le compte à rebours formatté; sinon 'En cours'.
+        - En pause: on efface (clear) l'Event -> les boucles asynchrones se bloquent;
+            les échéances d'attente sont gelées (WaitScheduler.pause).
+        - Reprise: set() l'Event -> reprise des boucles, échéances décalées de la
+            durée de la pause. Une ligne en attente retrouve son compte à rebours
+            (_render_waits); sinon 'En cours'.
         """
         if not self.downloading or not self.pause_event:
             return
         if self.pause_event.is_set():  # passer en pause
-            self.pause_event.clear()
+            self.pause_event.clear()  # self.waits suit l'Event (WaitScheduler.follow)
             self.pause_btn.configure(text=TEXT[self.lang]['resume'])
             for u, data in self.urls_in_progress.items():
                 if data['status'] in (TEXT[self.lang]['status_running'],) or data['status'].startswith(TEXT[self.lang]['wait_prefix']):
                     data['status'] = TEXT[self.lang]['status_paused']
                     self.tree.set(data['iid'], 'status', data['status'])
         else:
-            # reprise
-            self.pause_event.set()
+            # reprise (set() réveille des coroutines: à faire dans le thread réseau)
+            self.loop.call_soon_threadsafe(self.pause_event.set)
             self.pause_btn.configure(text=TEXT[self.lang]['pause'])
-            # Restaurer 'En cours' pour l'URL active suivie ou sinon première en pause
-            target = None
-            if self.current_url and self.current_url in self.urls_in_progress and self.urls_in_progress[self.current_url]['status'] == 'En pause':
-                target = self.current_url
-            else:
-                for u, d in self.urls_in_progress.items():
-                    if d['status'] == 'En pause':
-                        target = u
-                        break
-            if target:
-                d = self.urls_in_progress[target]
-                # Si encore en phase d'attente connue, restaurer le compte à rebours
-                rem = self.wait_remaining.get(target)
-                if isinstance(rem, int) and rem and rem > 0:
-                    if rem >= 3600:
-                        disp_t = TEXT[self.lang]['time_hms'].format(h=rem//3600, m=(rem%3600)//60, s=rem%60)
-                    elif rem >= 60:
-                        disp_t = TEXT[self.lang]['time_ms'].format(m=rem//60, s=rem%60)
-                    else:
-                        disp_t = TEXT[self.lang]['time_s'].format(s=rem)
-                    d['status'] = f"{TEXT[self.lang]['wait_prefix']}{disp_t}"
+            # Restaurer l'état de chaque fichier actif mis en pause
+            for target in list(self.active_urls):
+                d = self.urls_in_progress.get(target)
+                if not d or d['status'] != TEXT[self.lang]['status_paused']:
+                    continue
+                left = self.waits.remaining(target) if target in self.waiting_urls else None
+                if left:
+                    # Restant figé pendant la pause; _render_waits reprend le décompte
+                    d['wait_shown'] = math.ceil(left)
+                    d['status'] = self._format_wait(d['wait_shown'])
                 else:
                     d['status'] = TEXT[self.lang]['status_running']
                 self.tree.set(d['iid'], 'status', d['status'])
-                # Démarre un fallback de compte à rebours local si on est en attente
-                if d['status'].startswith(TEXT[self.lang]['wait_prefix']):
-                    self._ensure_local_wait_countdown(target)
 
     def request_stop(self):
-        """Demande l'arrêt après le fichier courant (implémentation douce)."""
+        """Demande l'arrêt après les fichiers en cours (implémentation douce)."""
         # Pas de stop propre implémenté dans le code de base; on se contente d'un flag.
         self.stop_requested = True
         messagebox.showinfo("Info", TEXT[self.lang]['stop_info'])
 
-    def _thread_run(self, outdir):
-        """Point d'entrée du thread worker: exécute l'event loop asyncio."""
-        # Rediriger stdout
+    def _on_download_future_done(self, future):
+        """Fin de _async_download (thread réseau): erreur éventuelle + nettoyage UI."""
         try:
-            asyncio.run(self._async_download(outdir))
+            future.result()
         except Exception as e:
             LOG_QUEUE.put(f"\n[Erreur] {e}\n")
         finally:
             self.root.after(0, self._on_all_done)
 
     async def _async_download(self, outdir):
-        """Coroutine principale: préfetch des noms puis téléchargement séquentiel.
+        """Coroutine principale: préfetch des noms puis téléchargements en parallèle.
 
-        Gère aussi l'initialisation de l'Event de pause et la mise à jour des
-        colonnes de statut avant chaque fichier.
+        Un core.JobScheduler fait tourner au plus `get_parallel()` fichiers à la
+        fois, pris dans l'ordre de la file; chaque fichier suit son propre
+        statut (log_cb et callbacks identifiés par URL).
+        Gère aussi l'initialisation de l'Event de pause.
         """
-        async with core.httpx.AsyncClient(headers={"User-Agent": "Mozilla/5.0"}) as client:  # type: ignore[attr-defined]
-            # pause_event initialisé (set = fonctionnement normal)
-            self.pause_event = asyncio.Event()
-            self.pause_event.set()
-            # Pré-récupération des noms (utile surtout si plusieurs URLs)
-            try:
-                urls = list(self.queued_order)
-                if len(urls) > 0:
+        connections = self.get_connections()
+        preallocate = bool(self.preallocate_var.get())
+        checksum = bool(self.checksum_var.get())
+        limit, limit_per_file, limit_schedule = self.get_limits()
+        global_limiter = core.RateLimiter(limit, limit_schedule)
+        retry = core.RetryPolicy(self.get_retries())
+        client = self._get_client()
+        self.scheduler.max_jobs = self.get_parallel()
+        # Segments d'un même fichier: tous en vol sur l'hôte a-NN
+        self.scheduler.raise_per_host(connections)
+        # pause_event initialisé (set = fonctionnement normal); les attentes le suivent
+        self.pause_event = core.PauseEvent()
+        self.pause_event.set()
+        unfollow = self.waits.follow(self.pause_event)
+        # Pré-récupération des noms (utile surtout si plusieurs URLs; noms déjà connus gardés)
+        try:
+            urls = list(self.queued_order)
+            if len(urls) > 0:
+                name_map = {u: self.urls_in_progress[u]['display'] for u in urls if self.urls_in_progress.get(u, {}).get('display')}
+                unknown = [u for u in urls if u not in name_map]
+                if unknown:
                     LOG_QUEUE.put(TEXT[self.lang]['prefetch_start'] + "\n")
-                    name_map = await core.prefetch_display_names(
+                    name_map.update(await core.prefetch_display_names(
                         client,
-                        urls,
+                        unknown,
                         log_cb=lambda m: LOG_QUEUE.put(m + ("\n" if not m.endswith("\n") else "")),
-                    )
-                    # Mise à jour de la colonne Nom
-                    for u, name in name_map.items():
-                        if not name:
-                            continue
-                        data = self.urls_in_progress.get(u)
-                        if data:
-                            data['display'] = name
-                            try:
-                                self.tree.set(data['iid'], 'display', name)
-                            except Exception:
-                                pass
-                    LOG_QUEUE.put(TEXT[self.lang]['prefetch_summary_header'] + "\n")
-                    for idx, u in enumerate(urls, 1):
-                        nm = name_map.get(u) or TEXT[self.lang]['prefetch_unknown_name']
-                        LOG_QUEUE.put(f"{idx:2d}. {nm}\n")
-                    LOG_QUEUE.put("\n")
+                        cache=self.meta_cache,
+                    ))
+                # Mise à jour de la colonne Nom
+                for u, name in name_map.items():
+                    if not name:
+                        continue
+                    if self.store and u in unknown:
+                        self.store.update(u, name=name)
+                    data = self.urls_in_progress.get(u)
+                    if data:
+                        data['display'] = name
+                        try:
+                            self.tree.set(data['iid'], 'display', name)
+                        except Exception:
+                            pass
+                LOG_QUEUE.put(TEXT[self.lang]['prefetch_summary_header'] + "\n")
+                for idx, u in enumerate(urls, 1):
+                    nm = name_map.get(u) or TEXT[self.lang]['prefetch_unknown_name']
+                    LOG_QUEUE.put(f"{idx:2d}. {nm}\n")
+                LOG_QUEUE.put("\n")
+        except Exception as e:
+            LOG_QUEUE.put(f"{TEXT[self.lang]['prefetch_error']} {e}\n")
+
+        async def _job(url):
+            data = self.urls_in_progress.get(url)
+            self.active_urls.add(url)
+            if data:
+                self.root.after(0, self._set_row_status, url, 'status_running')
+            limiter = core.RateLimiter(limit_per_file, parent=global_limiter)
+            self.last_errors.pop(url, None)
+            if self.store:
+                self.store.update(url, state="running", error=None)
+            try:
+                ok = await core.download_file(
+                    client,
+                    url,
+                    outdir=outdir,
+                    log_cb=self._log_line,
+                    event_cb=self._on_core_event,
+                    job_id=url,
+                    waits=self.waits,
+                    pause_event=self.pause_event,
+                    api_key=self.get_api_key(),
+                    connections=connections,
+                    preallocate=preallocate,
+                    checksum=checksum,
+                    limiter=limiter if limiter.active else None,
+                    retry=retry,
+                    resolver=resolver,
+                    cache=self.meta_cache,
+                )
+                if self.store:
+                    error = None if ok else self.last_errors.get(url, TEXT[self.lang]['status_error'])
+                    self.store.update(url, state="done" if ok else "error", error=error)
+                if not ok and data:
+                    self.root.after(0, self._set_row_status, url, 'status_error')
             except Exception as e:
-                LOG_QUEUE.put(f"{TEXT[self.lang]['prefetch_error']} {e}\n")
-            for url in list(self.queued_order):
-                if self.stop_requested:
-                    break
-                data = self.urls_in_progress.get(url)
+                LOG_QUEUE.put(f"\n❌ {TEXT[self.lang]['status_error']} {url}: {e}\n")
+                if self.store:
+                    self.store.update(url, state="error", error=str(e) or type(e).__name__)
                 if data:
-                    data['status'] = TEXT[self.lang]['status_running']
-                    self.tree.set(data['iid'], 'status', data['status'])
-                self.current_url = url
-                try:
-                    await core.download_file(
-                        client,
-                        url,
-                        outdir=outdir,
-                        log_cb=lambda m, u=url: LOG_QUEUE.put(m + ("\n" if not m.endswith("\n") else "")),
-                        progress_cb=self._progress_callback,
-                        wait_cb=self._wait_callback,
-                        pause_event=self.pause_event,
-                        api_key=self.get_api_key(),
-                    )
-                except Exception as e:
-                    LOG_QUEUE.put(f"\n❌ {TEXT[self.lang]['status_error']} {url}: {e}\n")
-                    if data:
-                        data['status'] = TEXT[self.lang]['status_error']
-                        self.tree.set(data['iid'], 'status', data['status'])
+                    self.root.after(0, self._set_row_status, url, 'status_error')
+            finally:
+                self.active_urls.discard(url)
+
+        pending = [u for u in self.queued_order if self.urls_in_progress.get(u, {}).get('status') != TEXT[self.lang]['status_done']]
+        # Premium: infos + lien des fichiers suivants obtenus pendant les transferts
+        api_key = (self.get_api_key() or "").strip()
+        resolver = core.PremiumResolver(client, api_key, retry=retry) if api_key else None
+        if resolver:
+            resolver.queue(pending)
+        try:
+            await self.scheduler.run(pending, _job, should_stop=lambda: self.stop_requested)
+        finally:
+            unfollow()
+            if resolver:
+                await resolver.aclose()
+
+    def _set_row_status(self, url, key):
+        """Affecte le statut TEXT[lang][key] à la ligne de `url` (thread principal)."""
+        data = self.urls_in_progress.get(url)
+        if not data:
+            return
+        data['status'] = TEXT[self.lang][key]
+        self.tree.set(data['iid'], 'status', data['status'])
+        self._update_total_progress_label()
 
-    def _progress_callback(self, url, filename, downloaded, total, percent):
-        """Callback progression (depuis core.download_file).
+    def _drain_progress(self):
+        """Applique une fois par image les derniers états publiés sur progress_bus.
 
-        Re-synchronisé vers le thread principal via root.after.
-        Met à jour: pourcentage individuel + statut + progression globale + vitesse + ETA.
+        core.download_file publie à chaque bloc; seul le dernier état de
+        chaque fichier est appliqué, puis la progression globale est
+        recalculée une seule fois.
         """
-        # Exécuter modifications UI dans le thread principal
-        def _apply():
-            data = self.urls_in_progress.get(url)
-            if not data:
-                return
-            
-            current_time = time.time()
-            
-            # Initialiser le temps de début si nécessaire
-            if 'start_time' not in data:
-                data['start_time'] = current_time
-                data['last_update'] = current_time
-                data['last_downloaded'] = downloaded
-            
-            # Calculer la vitesse (octets par seconde)
-            time_diff = current_time - data.get('last_update', current_time)
-            if time_diff > 0.5:  # Mettre à jour la vitesse toutes les 0.5 secondes
-                bytes_diff = downloaded - data.get('last_downloaded', 0)
-                speed_bps = bytes_diff / time_diff if time_diff > 0 else 0
-                
-                # Formater la vitesse
-                if speed_bps < 1024:
-                    speed_str = f"{speed_bps:.0f} B/s"
-                elif speed_bps < 1024*1024:
-                    speed_str = f"{speed_bps/1024:.1f} KB/s"
-                elif speed_bps < 1024*1024*1024:
-                    speed_str = f"{speed_bps/(1024*1024):.1f} MB/s"
-                else:
-                    speed_str = f"{speed_bps/(1024*1024*1024):.1f} GB/s"
-                
-                data['speed'] = speed_str
-                data['last_update'] = current_time
-                data['last_downloaded'] = downloaded
-                
-                # Calculer l'ETA
-                if total and speed_bps > 0:
-                    remaining_bytes = total - downloaded
-                    eta_seconds = remaining_bytes / speed_bps
-                    
-                    if eta_seconds < 60:
-                        eta_str = f"{eta_seconds:.0f}s"
-                    elif eta_seconds < 3600:
-                        minutes = int(eta_seconds // 60)
-                        seconds = int(eta_seconds % 60)
-                        eta_str = f"{minutes}m{seconds:02d}s"
-                    else:
-                        hours = int(eta_seconds // 3600)
-                        minutes = int((eta_seconds % 3600) // 60)
-                        eta_str = f"{hours}h{minutes:02d}m"
-                    data['eta'] = eta_str
-                else:
-                    data['eta'] = '--'
-                
-                # Mettre à jour l'affichage
-                self.tree.set(data['iid'], 'speed', data['speed'])
-                self.tree.set(data['iid'], 'eta', data['eta'])
-            
-            if percent is not None:
-                data['pct'] = percent
-                self.tree.set(data['iid'], 'progress', f"{percent:.1f}%")
-                # Si revenu de pause et statut resté 'En pause', remettre 'En cours'
-                if data['status'] == TEXT[self.lang]['status_paused'] and (not self.pause_event or self.pause_event.is_set()):
-                    data['status'] = TEXT[self.lang]['status_running']
-                    self.tree.set(data['iid'], 'status', data['status'])
-            
-            if percent == 100 or (total and downloaded >= total):
-                data['status'] = TEXT[self.lang]['status_done']
-                data['speed'] = '--'
-                data['eta'] = '--'
-                self.tree.set(data['iid'], 'status', data['status'])
-                self.tree.set(data['iid'], 'speed', data['speed'])
-                self.tree.set(data['iid'], 'eta', data['eta'])
-            
+        updates = self.progress_bus.drain()
+        if self.waiting_urls:
+            self._render_waits()
+        for state in updates:
+            self._apply_progress(*state)
+        if updates:
+            # Estimation globale du lot: octets reçus / à recevoir depuis le début du lot,
+            # lignes actives dans ce lot uniquement (terminées avant et .part existants exclus)
+            rows = [d for d in self.urls_in_progress.values() if 'batch_start' in d]
+            self.batch_estimator.update(sum(d['downloaded'] - d['batch_start'] for d in rows),
+                                        sum(max(0, (d.get('total') or 0) - d['batch_start']) for d in rows))
             self._recompute_global_progress()
-        try:
-            self.root.after(0, _apply)
-        except Exception:
-            pass
+        self.root.after(PROGRESS_FRAME_MS, self._drain_progress)
+
+    def _apply_progress(self, url, filename, downloaded, total, percent):
+        """Applique un état de progression (thread principal).
+
+        Met à jour: pourcentage individuel + statut + vitesse + ETA.
+        """
+        data = self.urls_in_progress.get(url)
+        if not data:
+            return
+        
+        # Vitesse / ETA lissées (estimateur du cœur, un par fichier)
+        estimator = data.get('estimator')
+        if estimator is None:
+            estimator = data['estimator'] = core.SpeedEstimator(total, downloaded)
+        data['downloaded'] = downloaded
+        data['total'] = total
+        # Point de départ de la ligne dans le lot (un redémarrage à zéro le ramène)
+        data['batch_start'] = min(data.get('batch_start', downloaded), downloaded)
+        if self.store:
+            self.store.update(url, name=filename, size=total, downloaded=downloaded)
+        if estimator.update(downloaded, total):
+            data['speed'] = core.format_speed(estimator.speed)
+            data['eta'] = core.format_eta(estimator.eta())
+            self.tree.set(data['iid'], 'speed', data['speed'])
+            self.tree.set(data['iid'], 'eta', data['eta'])
+        
+        if percent is not None:
+            data['pct'] = percent
+            self.tree.set(data['iid'], 'progress', f"{percent:.1f}%")
+            # Si revenu de pause et statut resté 'En pause', remettre 'En cours'
+            if data['status'] == TEXT[self.lang]['status_paused'] and (not self.pause_event or self.pause_event.is_set()):
+                data['status'] = TEXT[self.lang]['status_running']
+                self.tree.set(data['iid'], 'status', data['status'])
+        
+        if percent == 100 or (total and downloaded >= total):
+            data['status'] = TEXT[self.lang]['status_done']
+            data['speed'] = '--'
+            data['eta'] = '--'
+            self.tree.set(data['iid'], 'status', data['status'])
+            self.tree.set(data['iid'], 'speed', data['speed'])
+            self.tree.set(data['iid'], 'eta', data['eta'])
 
     def _wait_callback(self, url, remaining, total_wait):
-        """Callback attente (compte à rebours) invoked par download_file.
+        """Début (remaining > 0) ou fin (0) de l'attente de `url` (événement waiting).
 
-        Sauvegarde `remaining` pour permettre restauration après pause.
-        Formatage h/m/s cohérent avec la version CLI.
+        Le restant n'est pas transmis à chaque seconde: _render_waits le
+        recalcule à partir de l'échéance gardée par self.waits.
         """
-        def _human(secs: int) -> str:
-            if secs >= 3600:
-                return f"{secs//3600}h{(secs%3600)//60:02d}m{secs%60:02d}s"
-            if secs >= 60:
-                return f"{secs//60}m{secs%60:02d}s"
-            return f"{secs}s"
         def _apply():
             data = self.urls_in_progress.get(url)
             if not data:
                 return
-            # Mémorise le restant pour reprise
-            self.wait_remaining[url] = remaining
             if remaining > 0:
-                if data['status'] != TEXT[self.lang]['status_paused']:
-                    r = remaining
-                    if r >= 3600:
-                        disp_t = TEXT[self.lang]['time_hms'].format(h=r//3600, m=(r%3600)//60, s=r%60)
-                    elif r >= 60:
-                        disp_t = TEXT[self.lang]['time_ms'].format(m=r//60, s=r%60)
-                    else:
-                        disp_t = TEXT[self.lang]['time_s'].format(s=r)
-                    data['status'] = f"{TEXT[self.lang]['wait_prefix']}{disp_t}"
-            else:
-                if data['status'].startswith(TEXT[self.lang]['wait_prefix']):
-                    data['status'] = TEXT[self.lang]['status_running']
-            self.tree.set(data['iid'], 'status', data['status'])
+                self.waiting_urls.add(url)
+                data.pop('wait_shown', None)
+                self._render_waits()
+                return
+            self.waiting_urls.discard(url)
+            if data['status'].startswith(TEXT[self.lang]['wait_prefix']):
+                data['status'] = TEXT[self.lang]['status_running']
+                self.tree.set(data['iid'], 'status', data['status'])
         self.root.after(0, _apply)
 
-    # -------- Countdown fallback GUI --------
-    def _ensure_local_wait_countdown(self, url):
-        """Démarre un thread léger qui décrémente localement le compte à rebours.
+    def _format_wait(self, secs: int) -> str:
+        if secs >= 3600:
+            disp_t = TEXT[self.lang]['time_hms'].format(h=secs//3600, m=(secs%3600)//60, s=secs%60)
+        elif secs >= 60:
+            disp_t = TEXT[self.lang]['time_ms'].format(m=secs//60, s=secs%60)
+        else:
+            disp_t = TEXT[self.lang]['time_s'].format(s=secs)
+        return f"{TEXT[self.lang]['wait_prefix']}{disp_t}"
+
+    def _render_waits(self):
+        """Statut 'Attente …' des lignes en attente, recalculé depuis leur échéance.
 
-        Utilisé uniquement après reprise si le serveur ne renvoie plus de
-        callbacks d'attente (cas rare). S'arrête dès qu'un changement d'état
-        intervient ou que le temps atteint 0.
+        Appelé à chaque image; la ligne n'est réécrite que si la seconde
+        affichée change. Une ligne en pause garde son statut 'En pause'.
         """
-        if url in self.wait_countdown_threads:
-            return
-        self.wait_countdown_threads.add(url)
-        def runner():
-            import time
-            try:
-                while True:
-                    if not self.pause_event or not self.pause_event.is_set():
-                        time.sleep(0.2)
-                        continue
-                    rem = self.wait_remaining.get(url)
-                    if not isinstance(rem, int) or rem <= 0:
-                        break
-                    data = self.urls_in_progress.get(url)
-                    if not data or not data['status'].startswith(TEXT[self.lang]['wait_prefix']):
-                        break
-                    time.sleep(1)
-                    new_rem = self.wait_remaining.get(url)
-                    if not isinstance(new_rem, int) or new_rem <= 0:
-                        break
-                    if new_rem == rem:  # aucun callback externe, décrément local
-                        new_rem -= 1
-                        self.wait_remaining[url] = new_rem
-                        def _upd():
-                            d = self.urls_in_progress.get(url)
-                            if not d:
-                                return
-                            if isinstance(new_rem, int) and new_rem > 0 and d['status'].startswith(TEXT[self.lang]['wait_prefix']):
-                                r = new_rem
-                                if r >= 3600:
-                                    disp_t = TEXT[self.lang]['time_hms'].format(h=r//3600, m=(r%3600)//60, s=r%60)
-                                elif r >= 60:
-                                    disp_t = TEXT[self.lang]['time_ms'].format(m=r//60, s=r%60)
-                                else:
-                                    disp_t = TEXT[self.lang]['time_s'].format(s=r)
-                                d['status'] = f"{TEXT[self.lang]['wait_prefix']}{disp_t}"
-                                self.tree.set(d['iid'], 'status', d['status'])
-                            elif isinstance(new_rem, int) and new_rem <= 0:
-                                d['status'] = TEXT[self.lang]['status_running']
-                                self.tree.set(d['iid'], 'status', d['status'])
-                        self.root.after(0, _upd)
-            finally:
-                self.wait_countdown_threads.discard(url)
-        threading.Thread(target=runner, daemon=True).start()
+        for url in self.waiting_urls:
+            data = self.urls_in_progress.get(url)
+            left = self.waits.remaining(url)
+            if not data or left is None or data['status'] == TEXT[self.lang]['status_paused']:
+                continue
+            secs = math.ceil(left)
+            if data.get('wait_shown') == secs:
+                continue
+            data['wait_shown'] = secs
+            data['status'] = self._format_wait(secs)
+            self.tree.set(data['iid'], 'status', data['status'])
 
     def _on_all_done(self):
         """Nettoyage UI une fois tous les téléchargements terminés ou arrêtés."""
@@ -1057,8 +1319,13 @@ class DownloaderGUI:
                     if self.stop_requested:
                         data['status'] = TEXT[self.lang]['status_cancelled']
                         self.tree.set(data['iid'], 'status', data['status'])
-                        self.start_btn.configure(state=tk.NORMAL)
-                        self.stop_btn.configure(state=tk.DISABLED)
+        self.downloading = False
+        self.active_urls.clear()
+        self.waiting_urls.clear()
+        self.start_btn.configure(state=tk.NORMAL)
+        self.add_btn.configure(state=tk.NORMAL)
+        self.stop_btn.configure(state=tk.DISABLED)
+        self.pause_btn.configure(state=tk.DISABLED, text=TEXT[self.lang]['pause'])
 
     def _save_api_key(self):
         """Sauvegarde la clé API dans un fichier de configuration."""
@@ -1142,6 +1409,11 @@ def launch_gui():
     root = tk.Tk()
     app = DownloaderGUI(root)
     root.mainloop()
+    app.shutdown()
+    if app.store:
+        app.store.close()
+    if app.meta_cache:
+        app.meta_cache.close()
 
 
 if __name__ == '__main__':
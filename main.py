@@ -2,22 +2,40 @@ import os
 import re
 import time
 import html
+import errno
+import hashlib
+import random
+import shutil
 import asyncio
+import contextlib
+import json
+import sqlite3
+import importlib.util
+import bisect
+import heapq
+import math
+import threading
 import sys
 import traceback
 import httpx #type:ignore
 from bs4 import BeautifulSoup #type:ignore
 from urllib.parse import unquote, urljoin, urlparse
 
-WAIT_REGEXES = [
-    r"(?:veuillez\s+)?patiente[rz]\s*(\d+)\s*(?:sec|secondes?|s)\b",
-    r"please\s+wait\s*(\d+)\s*(?:sec|seconds?)\b",
-    r"t[ée]l[ée]chargement\s+gratuit\s+dans\s*(\d+)",
-    r"vous\s+devez\s+attendre\s+encore\s+(\d+)\s+minutes?",  # 'Vous devez attendre encore 1 minutes'
-    r"var\s+ct\s*=\s*(\d+)\s*;",  # var ct = 60;
-    r"var\s+ct\s*=\s*(\d+)\s*\*\s*60\s*;",  # var ct = 1*60;
+# (motif, secondes par unité), par priorité décroissante; (\d+) = la valeur.
+# Chaque motif commence par un littéral: re saute alors directement à ses
+# occurrences (un préfixe optionnel, ou une alternance des motifs en un seul
+# automate, ferait tester chaque position de la page: plusieurs fois plus lent).
+WAIT_PATTERNS = [
+    (r"patiente[rz]\s*(\d+)\s*(?:sec|secondes?|s)\b", 1),  # '(veuillez) patientez 30 s'
+    (r"please\s+wait\s*(\d+)\s*(?:sec|seconds?)\b", 1),
+    (r"t[ée]l[ée]chargement\s+gratuit\s+dans\s*(\d+)", 1),
+    (r"vous\s+devez\s+attendre\s+encore\s+(\d+)\s+minutes?", 60),  # 'Vous devez attendre encore 1 minutes'
+    (r"var\s+ct\s*=\s*(\d+)\s*;", 1),  # var ct = 60;
+    (r"var\s+ct\s*=\s*(\d+)\s*\*\s*60\b", 60),  # var ct = 1*60;
 ]
 
+WAIT_MATCHERS = [(re.compile(pat), unit) for pat, unit in WAIT_PATTERNS]
+
 DOWNLOAD_BUTTON_PATTERNS = [
     re.compile(r"cliquez\s+ici", re.I),
     re.compile(r"click\s+here", re.I),
@@ -33,25 +51,13 @@ def human_duration(secs: int) -> str:
     return f"{secs}s"
 
 def extract_wait_seconds(text: str) -> int:
-    low = text.lower()
-    for pat in WAIT_REGEXES:
-        m = re.search(pat, low)
+    return _wait_seconds_lower(text.lower())
+
+def _wait_seconds_lower(low: str) -> int:
+    for rx, unit in WAIT_MATCHERS:
+        m = rx.search(low)
         if m:
-            val = m.group(1)
-            try:
-                secs = int(val)
-                if "minute" in pat:
-                    return secs * 60
-                return secs
-            except ValueError:
-                pass
-    # Fallback explicite si expression multiplicative non couverte
-    expr = re.search(r"var\s+ct\s*=\s*(\d+)\s*\*\s*60", low)
-    if expr:
-        try:
-            return int(expr.group(1)) * 60
-        except ValueError:
-            pass
+            return int(m.group(1)) * unit
     return 0
 
 def choose_filename_from_headers(resp, fallback="fichier_1fichier.bin"):
@@ -67,6 +73,13 @@ def choose_filename_from_headers(resp, fallback="fichier_1fichier.bin"):
         return os.path.basename(unquote(tail))
     return fallback
 
+def response_total_size(resp) -> int:
+    """Taille complète du fichier: Content-Range d'un 206, sinon Content-Length (0 si inconnue)."""
+    if resp.status_code == 206:
+        m = re.search(r"/(\d+)\s*$", resp.headers.get("content-range", ""))
+        return int(m.group(1)) if m else 0
+    return int(resp.headers.get("content-length", 0))
+
 DISPLAY_NAME_EXT_REGEX = re.compile(r"\.(?:7z|zip|rar|mp4|mkv|avi|mp3|flac|iso|xci|nsp|exe|pdf|epub|apk|tar|gz|bz2|xz|part\d+|bin|img|dmg|msi|wav|aac|mov|srt|ass|txt)(?:$|[\s])", re.I)
 
 def extract_display_filename(soup) -> str | None:
@@ -89,6 +102,9 @@ def extract_display_filename(soup) -> str | None:
         txt = (td.get_text(" ") or "").strip()
         if DISPLAY_NAME_EXT_REGEX.search(txt):
             candidates.append(txt)
+    return _best_display_name(candidates)
+
+def _best_display_name(candidates: list[str]) -> str | None:
     if not candidates:
         return None
     # Garder le plus long (souvent inclut extension complète)
@@ -113,7 +129,9 @@ HTML_ERROR_MARKERS = [
 ]
 
 def looks_like_error_html(text: str) -> bool:
-    low = text.lower()
+    return _has_error_marker(text.lower())
+
+def _has_error_marker(low: str) -> bool:
     return any(m in low for m in HTML_ERROR_MARKERS)
 
 def probable_file_response(resp: httpx.Response) -> bool:
@@ -129,18 +147,69 @@ def probable_file_response(resp: httpx.Response) -> bool:
         return False
     return False if ct.startswith("text/html") else True
 
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+class RetryPolicy:
+    """Nouvelles tentatives avec attente exponentielle et gigue.
+
+    Sont réessayées les erreurs réseau (httpx.TransportError: connexion
+    refusée / coupée, délai dépassé...) et les statuts HTTP transitoires
+    (RETRYABLE_STATUS, Retry-After respecté). Les autres erreurs (404,
+    empreinte invalide, disque plein...) remontent immédiatement.
+    `retries` = nombre de tentatives après la première.
+    """
+
+    def __init__(self, retries: int = 5, base_delay: float = 2.0, max_delay: float = 60.0, jitter: float = 0.5):
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+
+    @staticmethod
+    def is_retryable(exc: BaseException) -> bool:
+        if isinstance(exc, httpx.HTTPStatusError):
+            return exc.response.status_code in RETRYABLE_STATUS
+        return isinstance(exc, httpx.TransportError)
+
+    def delay(self, attempt: int, exc: BaseException | None = None) -> float:
+        """Attente avant la tentative `attempt` (1 = première nouvelle tentative)."""
+        if isinstance(exc, httpx.HTTPStatusError):
+            retry_after = exc.response.headers.get("retry-after", "")
+            if retry_after.isdigit():
+                return min(self.max_delay, float(retry_after))
+        d = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return d * (1 - self.jitter * random.random())
+
+    async def run(self, fn, log=None, label: str = ""):
+        """Appelle `await fn()` jusqu'au succès ou à une erreur non réessayable."""
+        attempt = 0
+        while True:
+            try:
+                return await fn()
+            except Exception as e:
+                attempt += 1
+                if attempt > self.retries or not self.is_retryable(e):
+                    raise
+                wait = self.delay(attempt, e)
+                if log:
+                    log(f"🔁 {label}: {str(e) or type(e).__name__} — nouvelle tentative {attempt}/{self.retries} dans {wait:.0f}s")
+                await asyncio.sleep(wait)
+
+DEFAULT_RETRY_POLICY = RetryPolicy()
+
 async def fetch_html(client, url):
-    r = await client.get(url, timeout=30)
+    r = await client.get(url, timeout=TIMEOUT_PAGE)
     r.raise_for_status()
     return r
 
+DIRECT_LINK_KEYWORDS = ["cliquez ici", "cliquer ici", "click here", "télécharger", "telecharger", "download"]
+
 def find_direct_link(soup, base_url):
     base_url_str = str(base_url)
-    KEYWORDS = ["cliquez ici", "cliquer ici", "click here", "télécharger", "telecharger", "download"]
     # 1. Recherche par texte explicite contenant un mot-clé
     for a in soup.find_all("a", href=True):
         txt = (a.get_text(" ") or "").strip().lower()
-        if any(k in txt for k in KEYWORDS):
+        if any(k in txt for k in DIRECT_LINK_KEYWORDS):
             return urljoin(base_url_str, a["href"])
     # 2. Ancres avec motif /dl/ ou param dl
     for a in soup.find_all("a", href=True):
@@ -171,25 +240,182 @@ def detect_captcha(soup):
 def find_download_form(soup):
     # Cherche un formulaire avec un bouton submit cohérent
     for form in soup.find_all("form"):
-        # Inspecte inputs et boutons
-        submit_candidate = False
-        texts = []
-        # Collect possible textual indicators
-        for inp in form.find_all(["input", "button"]):
-            t = (inp.get("value") or "").strip()
-            if t:
-                texts.append(t)
-            if inp.name == "input" and inp.get("type", "").lower() == "submit":
-                submit_candidate = True
-            if inp.name == "button" and (inp.get("type") in (None, "submit")):
-                submit_candidate = True
-        # Also consider direct text inside form
-        form_text = " ".join(texts + [form.get_text(" ").strip()])
-        if submit_candidate and any(p.search(form_text) for p in DOWNLOAD_BUTTON_PATTERNS):
+        if _is_download_form(form):
             return form
     return None
 
-async def submit_download_form(client, form, base_url):
+def _is_download_form(form) -> bool:
+    # Inspecte inputs et boutons
+    submit_candidate = False
+    texts = []
+    # Collect possible textual indicators
+    for inp in form.find_all(["input", "button"]):
+        t = (inp.get("value") or "").strip()
+        if t:
+            texts.append(t)
+        if inp.name == "input" and inp.get("type", "").lower() == "submit":
+            submit_candidate = True
+        if inp.name == "button" and (inp.get("type") in (None, "submit")):
+            submit_candidate = True
+    # Also consider direct text inside form
+    form_text = " ".join(texts + [form.get_text(" ").strip()])
+    return submit_candidate and any(p.search(form_text) for p in DOWNLOAD_BUTTON_PATTERNS)
+
+# Parseur HTML des pages: html.parser (stdlib) par défaut; F1_HTML_PARSER=lxml, plus
+# rapide, corrige autrement le HTML invalide (champs de formulaire différents possibles)
+HTML_PARSER = os.environ.get("F1_HTML_PARSER") or "html.parser"
+
+def parse_html(text: str):
+    return BeautifulSoup(text, HTML_PARSER)
+
+class PageInfo:
+    """Résumé d'une page 1fichier, calculé par analyze_page.
+
+    name: nom affiché (extract_display_filename); wait_seconds: attente
+    (extract_wait_seconds); captcha / error: detect_captcha /
+    looks_like_error_html; form: formulaire de téléchargement
+    (find_download_form); form_f1: <form id="f1">; links: liens directs
+    candidats par priorité (texte explicite, motif /dl/, domaine 1fichier),
+    absolus; direct_link: le premier (find_direct_link).
+    """
+    __slots__ = ("name", "wait_seconds", "captcha", "error", "form", "form_f1", "links")
+
+    def __init__(self):
+        self.name: str | None = None
+        self.wait_seconds = 0
+        self.captcha = False
+        self.error = False
+        self.form = None
+        self.form_f1 = None
+        self.links: list[str] = []
+
+    @property
+    def direct_link(self) -> str | None:
+        return self.links[0] if self.links else None
+
+def _matches_captcha(value) -> bool:
+    if value is None:
+        return False
+    values = value if isinstance(value, list) else [value]
+    return any("captcha" in v.lower() for v in values)
+
+def analyze_page(text: str, base_url) -> PageInfo:
+    """Analyse une page en un seul parcours de l'arbre.
+
+    Donne les mêmes résultats que les fonctions unitaires
+    (extract_display_filename, detect_captcha, find_download_form,
+    find_direct_link...), qui reparcourent chacune le document.
+    """
+    info = PageInfo()
+    low = text.lower()
+    info.wait_seconds = _wait_seconds_lower(low)
+    info.error = _has_error_marker(low)
+    soup = parse_html(text)
+    # Sans extension connue dans le texte de la page, aucun élément ne peut fournir de nom
+    want_name = DISPLAY_NAME_EXT_REGEX.search(soup.get_text(" ")) is not None
+    bold_names: list[str] = []
+    td_names: list[str] = []
+    forms = []
+    keyword_href = dl_href = domain_href = None
+    for tag in soup.find_all(True):
+        name = tag.name
+        attrs = tag.attrs
+        if not info.captcha and (attrs.get("data-sitekey") is not None or _matches_captcha(attrs.get("class")) or _matches_captcha(attrs.get("id"))):
+            info.captcha = True
+        if name == "a":
+            href = attrs.get("href")
+            if href is None:
+                continue
+            if keyword_href is None:
+                txt = (tag.get_text(" ") or "").strip().lower()
+                if any(k in txt for k in DIRECT_LINK_KEYWORDS):
+                    keyword_href = href
+            if dl_href is None and re.search(r"/dl/|[?&]dl=", href, re.IGNORECASE):
+                dl_href = href
+            if domain_href is None and re.search(r"1fichier\.com/", href, re.I):
+                domain_href = href
+        elif name == "form":
+            forms.append(tag)
+            if info.form_f1 is None and attrs.get("id") == "f1":
+                info.form_f1 = tag
+        elif want_name and name in ("span", "b", "strong", "td"):
+            txt = (tag.get_text(" ") or "").strip()
+            if name != "td" and len(txt) < 5:
+                continue
+            if DISPLAY_NAME_EXT_REGEX.search(txt):
+                (td_names if name == "td" else bold_names).append(txt)
+    info.name = _best_display_name(bold_names + td_names)
+    info.form = next((f for f in forms if _is_download_form(f)), None)
+    base_url_str = str(base_url)
+    for href in (keyword_href, dl_href, domain_href):
+        if href is not None:
+            link = urljoin(base_url_str, href)
+            if link not in info.links:
+                info.links.append(link)
+    return info
+
+FLIGHT_RESULT_TTL = 15.0  # secondes pendant lesquelles un résultat partagé est resservi
+
+class SingleFlight:
+    """Regroupe les appels concurrents portant sur une même clé.
+
+    do(key, fn): si un appel pour `key` est en cours, l'attend au lieu d'en
+    lancer un second; un résultat de moins de `ttl` secondes est resservi
+    tel quel. Les erreurs ne sont pas gardées (l'appel suivant relance).
+    L'annulation d'un appelant n'annule pas l'appel partagé.
+    """
+
+    def __init__(self, ttl: float = FLIGHT_RESULT_TTL):
+        self.ttl = ttl
+        self._inflight: dict = {}
+        self._results: dict = {}  # clé -> (date, résultat), du plus ancien au plus récent
+
+    def _expire(self, now: float):
+        while self._results:
+            key, (stamp, _) = next(iter(self._results.items()))
+            if now - stamp <= self.ttl:
+                break
+            del self._results[key]
+
+    async def do(self, key, fn):
+        now = time.monotonic()
+        self._expire(now)
+        if key in self._results:
+            return self._results[key][1]
+        task = self._inflight.get(key)
+        if task is None or task.get_loop() is not asyncio.get_running_loop():
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+        return await asyncio.shield(task)
+
+    def _finish(self, key, task: asyncio.Future):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled() and task.exception() is None:
+            self._results.pop(key, None)
+            self._results[key] = (time.monotonic(), task.result())
+
+    def forget(self, key):
+        """Oublie le résultat gardé pour `key` (l'appel suivant relance)."""
+        self._results.pop(key, None)
+
+PAGE_FLIGHT = SingleFlight()
+
+async def fetch_page(client, url) -> tuple[httpx.Response, PageInfo]:
+    """GET + analyse de la page d'un fichier, partagés entre appelants.
+
+    Les lectures simultanées d'un même fichier (pré-récupération des noms,
+    download_file) font une seule requête et une seule analyse (voir
+    SingleFlight).
+    """
+    async def _fetch():
+        r = await fetch_html(client, url)
+        return r, analyze_page(r.text, r.url)
+    return await PAGE_FLIGHT.do((id(client), file_id(url)), _fetch)
+
+def build_form_request(form, base_url) -> tuple[str, dict[str, str], dict[str, str]]:
+    """Prépare la soumission d'un formulaire: (action absolue, champs, en-têtes)."""
     base_url_str = str(base_url)
     raw_action = None
     try:
@@ -224,10 +450,1397 @@ async def submit_download_form(client, form, base_url):
     }
     # Force cast to str to avoid TypeError "Cannot mix str and non-str arguments"
     cast_data = {str(k): ("" if v is None else str(v)) for k, v in data.items()}
-    r = await client.post(action_abs, data=cast_data, headers=headers, timeout=60, follow_redirects=True)
+    return action_abs, cast_data, headers
+
+async def submit_download_form(client, form, base_url):
+    action_abs, data, headers = build_form_request(form, base_url)
+    r = await client.post(action_abs, data=data, headers=headers, timeout=TIMEOUT_FORM, follow_redirects=True)
     r.raise_for_status()
     return r
 
+@contextlib.asynccontextmanager
+async def stream_download_form(client, form, base_url):
+    """Comme submit_download_form, mais sans lire le corps de la réponse.
+
+    Si le serveur renvoie directement le fichier, il peut être écrit par
+    blocs; pour une page HTML, `await resp.aread()` avant d'utiliser resp.text.
+    """
+    action_abs, data, headers = build_form_request(form, base_url)
+    async with client.stream("POST", action_abs, data=data, headers=headers, timeout=TIMEOUT_FORM, follow_redirects=True) as r:
+        r.raise_for_status()
+        yield r
+
+WRITE_BUFFER_SIZE = 4 * 1024 * 1024    # taille des écritures regroupées
+WRITE_MAX_PENDING = 32 * 1024 * 1024   # octets en mémoire au-delà desquels write() attend le disque
+
+JOURNAL_CHECKPOINT_INTERVAL = 2.0  # secondes entre deux sauvegardes du journal de reprise
+
+class ResumeJournal:
+    """Journal de reprise d'un .part, stocké à côté (`<nom>.part.json`).
+
+    Contient l'URL 1fichier, la taille totale, les validateurs HTTP
+    (ETag / Last-Modified) et les plages d'octets écrites. Les writers y
+    déclarent chaque écriture (commit) depuis leur thread; le journal est
+    sauvegardé au plus toutes les JOURNAL_CHECKPOINT_INTERVAL secondes,
+    après fsync du .part, donc il ne décrit jamais plus que le disque.
+    """
+
+    def __init__(self, part_path: str, url: str | None = None, size: int = 0):
+        self.part_path = part_path
+        self.path = part_path + ".json"
+        self.url = url
+        self.size = size
+        self.etag: str | None = None
+        self.last_modified: str | None = None
+        self.ranges: list[list[int]] = []  # [début, fin) triées, disjointes
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._last_save = 0.0
+
+    @classmethod
+    def load(cls, part_path: str) -> "ResumeJournal | None":
+        try:
+            with open(part_path + ".json", "r", encoding="utf-8") as f:
+                data = json.load(f)
+            j = cls(part_path, data.get("url"), int(data.get("size") or 0))
+            j.etag = data.get("etag")
+            j.last_modified = data.get("last_modified")
+            j.ranges = sorted([int(a), int(b)] for a, b in data.get("ranges", []) if int(b) > int(a))
+            return j
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def matches(self, url: str, size: int) -> bool:
+        return self.url == url and (not size or not self.size or self.size == size)
+
+    def reset(self, size: int | None = None):
+        with self._lock:
+            self.ranges = []
+            self.etag = self.last_modified = None
+            if size is not None:
+                self.size = size
+
+    def set_validators(self, headers):
+        """Mémorise ETag (fort uniquement) / Last-Modified d'une réponse."""
+        etag = headers.get("etag")
+        self.etag = etag if etag and not etag.startswith("W/") else None
+        self.last_modified = headers.get("last-modified")
+
+    def validator(self) -> str | None:
+        """Valeur à envoyer en If-Range (None: pas de validation possible)."""
+        return self.etag or self.last_modified
+
+    def changed(self, headers) -> bool:
+        """True si ETag / Last-Modified de la réponse diffèrent de ceux mémorisés."""
+        etag = headers.get("etag")
+        if self.etag and etag:
+            return etag != self.etag
+        last_modified = headers.get("last-modified")
+        return bool(self.last_modified and last_modified and last_modified != self.last_modified)
+
+    def add_range(self, start: int, end: int):
+        with self._lock:
+            self._add_range(start, end)
+
+    def _add_range(self, start: int, end: int):
+        if end <= start:
+            return
+        r = self.ranges
+        i = bisect.bisect_left(r, [start, start])
+        # fusion avec la plage précédente si contiguë / chevauchante
+        if i > 0 and r[i - 1][1] >= start:
+            i -= 1
+            start = r[i][0]
+        j = i
+        while j < len(r) and r[j][0] <= end:
+            end = max(end, r[j][1])
+            j += 1
+        r[i:j] = [[start, end]]
+
+    def contiguous_prefix(self) -> int:
+        """Octets valides depuis le début du fichier."""
+        with self._lock:
+            return self.ranges[0][1] if self.ranges and self.ranges[0][0] == 0 else 0
+
+    def committed(self) -> int:
+        with self._lock:
+            return sum(b - a for a, b in self.ranges)
+
+    def missing(self, total: int) -> list[tuple[int, int]]:
+        """Plages [début, fin) restant à télécharger pour atteindre `total`."""
+        out = []
+        pos = 0
+        with self._lock:
+            for a, b in self.ranges:
+                if a > pos:
+                    out.append((pos, min(a, total)))
+                pos = max(pos, b)
+        if pos < total:
+            out.append((pos, total))
+        return [(a, b) for a, b in out if b > a]
+
+    def commit(self, start: int, end: int, f=None):
+        """Déclare [start, end) écrit (appelé depuis le thread d'écriture)."""
+        with self._lock:
+            self._add_range(start, end)
+            due = time.monotonic() - self._last_save >= JOURNAL_CHECKPOINT_INTERVAL
+            if due:
+                self._last_save = time.monotonic()
+        if due:
+            self.save(f)
+
+    def save(self, f=None):
+        """Sauvegarde atomique; fsync du .part (via `f`) avant écriture du journal."""
+        with self._lock:
+            data = {
+                "url": self.url,
+                "size": self.size,
+                "etag": self.etag,
+                "last_modified": self.last_modified,
+                "ranges": [list(r) for r in self.ranges],
+                "updated": int(time.time()),
+            }
+        with self._save_lock:
+            if f is not None:
+                f.flush()
+                os.fsync(f.fileno())
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as jf:
+                json.dump(data, jf)
+            os.replace(tmp, self.path)
+
+    def remove(self):
+        for p in (self.path, self.path + ".tmp"):
+            try:
+                os.remove(p)
+            except OSError:
+                pass
+
+def restart_message(journal: "ResumeJournal", headers, range_sent: bool = True) -> str:
+    """Motif d'un redémarrage complet: réponse entière (pas 206) alors qu'un .part existe."""
+    if not range_sent:
+        return "ℹ️ Réponse complète sans requête Range, redémarrage complet."
+    if journal.changed(headers):
+        return "ℹ️ Fichier distant modifié, redémarrage complet."
+    return "ℹ️ Requête Range ignorée par le serveur, redémarrage complet."
+
+def load_resume_state(part_path: str, url: str, total: int, log=None) -> tuple[int, ResumeJournal]:
+    """Détermine le point de reprise d'un transfert mono-flux.
+
+    Retourne (octets déjà valides, journal). Sans journal, un ancien .part
+    est repris sur sa taille (comportement historique); un journal qui ne
+    correspond plus (autre URL, autre taille) force un redémarrage.
+    """
+    if not os.path.exists(part_path):
+        journal = ResumeJournal(part_path, url, total)
+        journal.remove()
+        return 0, journal
+    journal = ResumeJournal.load(part_path)
+    if journal is None:
+        existing = os.path.getsize(part_path)
+        journal = ResumeJournal(part_path, url, total)
+        journal.add_range(0, existing)
+        return existing, journal
+    if not journal.matches(url, total):
+        if log:
+            log("ℹ️ Journal de reprise obsolète, redémarrage complet.")
+        return 0, ResumeJournal(part_path, url, total)
+    journal.size = total or journal.size
+    return min(journal.contiguous_prefix(), os.path.getsize(part_path)), journal
+
+CHECKSUM_ALGO = "sha256"  # empreinte calculée au fil de l'eau, écrite dans <nom>.sha256
+CHECKSUM_HEX_LENGTHS = {32: "md5", 40: "sha1", 64: "sha256", 128: "whirlpool"}  # somme fournie par l'API
+CHECKSUM_READ_SIZE = 4 * 1024 * 1024
+
+class ChecksumMismatch(Exception):
+    """L'empreinte du fichier reçu ne correspond pas à celle annoncée."""
+
+def checksum_algorithm(expected: str | None) -> str | None:
+    """Devine l'algorithme d'une somme hexadécimale (None si inconnu / indisponible)."""
+    if not expected or not re.fullmatch(r"[0-9a-fA-F]+", expected):
+        return None
+    algo = CHECKSUM_HEX_LENGTHS.get(len(expected))
+    return algo if algo in hashlib.algorithms_available else None
+
+class StreamHasher:
+    """Empreinte(s) d'un fichier calculée(s) pendant son écriture.
+
+    Les blocs sont hachés dans l'ordre du fichier: un bloc écrit à la
+    position courante fait avancer le calcul, un bloc en avance (plage
+    segmentée) est ignoré puis relu depuis le disque par finish(). À la
+    reprise, catch_up() hache les octets déjà présents dans le .part.
+    """
+
+    def __init__(self, algorithms=(CHECKSUM_ALGO,)):
+        self._hashes = {name: hashlib.new(name) for name in dict.fromkeys(algorithms)}
+        self.pos = 0
+        self._lock = threading.Lock()
+
+    def update(self, offset: int, data):
+        """Bloc `data` écrit à `offset` (appelé depuis le thread d'écriture)."""
+        with self._lock:
+            if offset <= self.pos < offset + len(data):
+                view = memoryview(data)[self.pos - offset:]
+                for h in self._hashes.values():
+                    h.update(view)
+                self.pos += len(view)
+
+    def catch_up(self, path: str, end: int):
+        """Hache depuis le disque les octets [pos, end) de `path`."""
+        with self._lock, open(path, "rb") as f:
+            f.seek(self.pos)
+            while self.pos < end:
+                block = f.read(min(CHECKSUM_READ_SIZE, end - self.pos))
+                if not block:
+                    break
+                for h in self._hashes.values():
+                    h.update(block)
+                self.pos += len(block)
+
+    def finish(self, path: str) -> dict[str, str]:
+        """Complète le calcul jusqu'à la fin de `path`; retourne {algo: hex}."""
+        self.catch_up(path, os.path.getsize(path))
+        with self._lock:
+            return {name: h.hexdigest() for name, h in self._hashes.items()}
+
+def new_hasher(expected: str | None = None) -> StreamHasher:
+    """Hasher pour l'empreinte locale, plus l'algorithme de `expected` si reconnu."""
+    algo = checksum_algorithm(expected)
+    return StreamHasher((CHECKSUM_ALGO, algo) if algo else (CHECKSUM_ALGO,))
+
+async def verify_checksum(hasher: StreamHasher, part_path: str, expected: str | None = None) -> dict[str, str]:
+    """Termine l'empreinte du .part et la compare à `expected` (ChecksumMismatch sinon)."""
+    digests = await asyncio.to_thread(hasher.finish, part_path)
+    algo = checksum_algorithm(expected)
+    if algo and digests[algo].lower() != expected.lower():
+        raise ChecksumMismatch(f"{algo} attendu {expected.lower()}, obtenu {digests[algo]}")
+    return digests
+
+def write_checksum_sidecar(final_path: str, digests: dict[str, str]):
+    """Écrit `<nom>.sha256` (format sha256sum) à côté du fichier terminé."""
+    with open(f"{final_path}.{CHECKSUM_ALGO}", "w", encoding="utf-8") as f:
+        f.write(f"{digests[CHECKSUM_ALGO]}  {os.path.basename(final_path)}\n")
+
+class BufferedFileWriter:
+    """Écriture différée (write-behind) d'un fichier depuis l'event loop.
+
+    Les blocs reçus sont regroupés en mémoire puis écrits par gros morceaux
+    sur un thread, une écriture à la fois et dans l'ordre. write() ne
+    bloque l'event loop que par contre-pression: quand plus de
+    `max_pending` octets attendent le disque. aclose() (ou la sortie du
+    bloc `async with`) vide tout et ferme le fichier.
+    Avec un `journal`, chaque écriture terminée y est déclarée; avec un
+    `hasher`, elle alimente l'empreinte sans relecture du fichier.
+    """
+
+    def __init__(self, path: str, mode: str = "wb", offset: int | None = None, buffer_size: int = WRITE_BUFFER_SIZE, max_pending: int = WRITE_MAX_PENDING, journal: ResumeJournal | None = None, hasher: StreamHasher | None = None):
+        self.buffer_size = buffer_size
+        self.max_pending = max(max_pending, buffer_size)
+        self._f = open(path, mode)
+        if offset is not None:
+            self._f.seek(offset)
+        # Octets effectivement écrits sur disque: [start, committed_end)
+        self.start = self._f.tell()
+        self.committed_end = self.start
+        self._submit_pos = self.start
+        self.journal = journal
+        self.hasher = hasher
+        self._buf = bytearray()
+        self._inflight: asyncio.Future | None = None
+        self._inflight_len = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def _wait_inflight(self):
+        fut = self._inflight
+        if fut is None:
+            return
+        try:
+            # shield: une annulation ne doit pas abandonner une écriture en cours
+            await asyncio.shield(fut)
+        finally:
+            # _inflight reste posé tant que l'écriture n'est pas réellement finie
+            if fut.done():
+                self._inflight = None
+                n, self._inflight_len = self._inflight_len, 0
+                if not fut.cancelled() and fut.exception() is None:
+                    self.committed_end += n
+
+    async def _settle(self) -> bool:
+        """Attend la fin de l'écriture en cours, même sous annulation (True si annulé)."""
+        cancelled = False
+        while self._inflight is not None:
+            try:
+                await self._wait_inflight()
+            except asyncio.CancelledError:
+                cancelled = True
+        return cancelled
+
+    def _write_blocking(self, buf, offset: int):
+        self._f.seek(offset)
+        self._f.write(buf)
+        self._f.flush()
+        if self.hasher is not None:
+            self.hasher.update(offset, buf)
+        if self.journal is not None:
+            self.journal.commit(offset, offset + len(buf), self._f)
+
+    def _submit(self):
+        assert self._inflight is None, "écriture précédente non terminée"
+        buf, self._buf = self._buf, bytearray()
+        self._inflight = asyncio.get_running_loop().run_in_executor(None, self._write_blocking, buf, self._submit_pos)
+        self._inflight_len = len(buf)
+        self._submit_pos += len(buf)
+
+    async def write(self, data):
+        self._buf += data
+        if len(self._buf) < self.buffer_size:
+            return
+        if self._inflight is not None:
+            if not self._inflight.done() and len(self._buf) + self._inflight_len < self.max_pending:
+                return  # disque occupé: on continue d'accumuler
+            await self._wait_inflight()
+        self._submit()
+
+    async def flush(self):
+        await self._wait_inflight()
+        if self._buf:
+            self._submit()
+            await self._wait_inflight()
+
+    def _close_blocking(self):
+        try:
+            if self.journal is not None:
+                self.journal.save(self._f)
+        finally:
+            self._f.close()
+
+    async def aclose(self):
+        if self._f.closed:
+            return
+        try:
+            await self.flush()
+        finally:
+            # Jamais de fermeture sous une écriture en cours, même après annulation:
+            # la fermeture passe elle aussi par _inflight pour être attendue jusqu'au bout.
+            cancelled = False
+            try:
+                cancelled = await self._settle()
+            finally:
+                self._inflight = asyncio.get_running_loop().run_in_executor(None, self._close_blocking)
+                cancelled = await self._settle() or cancelled
+            if cancelled:
+                raise asyncio.CancelledError
+
+def preallocate_part(part_path: str, total: int, keep: int = 0):
+    """Réserve `total` octets pour `part_path` avant le téléchargement.
+
+    Échoue immédiatement (OSError ENOSPC) si l'espace libre ne suffit pas.
+    Les `keep` premiers octets d'un .part existant sont conservés.
+    """
+    current = os.path.getsize(part_path) if keep and os.path.exists(part_path) else 0
+    needed = total - current
+    free = shutil.disk_usage(os.path.dirname(os.path.abspath(part_path))).free
+    if needed > free:
+        raise OSError(errno.ENOSPC, f"Espace disque insuffisant: {needed/1024/1024:.2f} MB requis, {free/1024/1024:.2f} MB libres", part_path)
+    with open(part_path, "r+b" if current else "wb") as f:
+        if hasattr(os, "posix_fallocate"):
+            os.posix_fallocate(f.fileno(), 0, total)
+        else:
+            f.truncate(total)
+
+@contextlib.asynccontextmanager
+async def open_part_writer(part_path: str, existing: int, total: int | None = None, preallocate: bool = False, journal: ResumeJournal | None = None, hasher: StreamHasher | None = None):
+    """Ouvre le writer d'un .part qui reprend à l'octet `existing`.
+
+    Sans préallocation: ajout en fin de fichier (comportement historique).
+    Avec préallocation et taille connue: le fichier est réservé à sa taille
+    finale puis écrit par offset. En sortie anticipée, il est tronqué aux
+    octets réellement écrits, sa taille restant le point de reprise.
+    Un `hasher` est d'abord amené au point de reprise (relecture du .part).
+    """
+    if hasher is not None and existing:
+        await asyncio.to_thread(hasher.catch_up, part_path, existing)
+    preallocated = bool(preallocate and total and total > existing)
+    if preallocated:
+        if journal is not None:
+            # Journal sur disque avant d'étendre le .part (voir download_segmented)
+            await asyncio.to_thread(journal.save)
+        await asyncio.to_thread(preallocate_part, part_path, total, existing)
+        writer = BufferedFileWriter(part_path, "r+b", offset=existing, journal=journal, hasher=hasher)
+    else:
+        # Octets au-delà du point de reprise (non journalisés): écartés
+        if existing and os.path.getsize(part_path) > existing:
+            os.truncate(part_path, existing)
+        writer = BufferedFileWriter(part_path, "ab" if existing else "wb", journal=journal, hasher=hasher)
+    try:
+        async with writer:
+            yield writer
+    finally:
+        if preallocated and writer.committed_end < total:
+            os.truncate(part_path, writer.committed_end)
+
+RATE_UNITS = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3}
+
+def parse_rate(text: str) -> int:
+    """Convertit un débit ("500K", "2M", "1.5G", octets/s) en octets/s; 0 = illimité."""
+    m = re.fullmatch(r"\s*(\d+(?:[.,]\d+)?)\s*([KMG]?)(?:i?B?(?:/s)?)?\s*", text or "", re.I)
+    if not m:
+        raise ValueError(f"Débit invalide: {text!r}")
+    return int(float(m.group(1).replace(",", ".")) * RATE_UNITS[m.group(2).upper()])
+
+def parse_schedule(text: str) -> list[tuple[int, int, int]]:
+    """Analyse "08:00-19:00=1M,19:00-08:00=0" en [(début_min, fin_min, octets/s)].
+
+    Une fin à 24:00 vaut 1440; début == fin couvre toute la journée.
+    """
+    out = []
+    for part in filter(None, (p.strip() for p in (text or "").split(","))):
+        m = re.fullmatch(r"(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})\s*=\s*(.+)", part)
+        if not m:
+            raise ValueError(f"Plage horaire invalide: {part!r}")
+        h1, m1, h2, m2 = (int(g) for g in m.groups()[:4])
+        start, end = h1 * 60 + m1, h2 * 60 + m2
+        if start > 1440 or end > 1440 or m1 > 59 or m2 > 59:
+            raise ValueError(f"Plage horaire invalide: {part!r}")
+        out.append((start % 1440, end, parse_rate(m.group(5))))
+    return out
+
+class RateLimiter:
+    """Seau à jetons (token bucket) limitant le débit en octets/s.
+
+    acquire(n) est appelé pour chaque bloc reçu; au-delà du débit, il dort
+    le temps nécessaire. Un limiteur peut avoir un `parent` (limite globale
+    partagée par plusieurs téléchargements): acquire() débite les deux.
+    `schedule` ([(début_min, fin_min, débit)], voir parse_schedule) remplace
+    `rate` aux heures indiquées (heure locale). Un débit de 0 = illimité.
+    """
+
+    def __init__(self, rate: int = 0, schedule: list[tuple[int, int, int]] | None = None, parent: "RateLimiter | None" = None, burst: float = 0.25):
+        self.rate = rate
+        self.schedule = schedule or []
+        self.parent = parent
+        self.burst = burst  # secondes de débit accumulables à l'arrêt
+        self._tokens = 0.0
+        self._last = time.monotonic()
+
+    @property
+    def active(self) -> bool:
+        return bool(self.rate or self.schedule or (self.parent and self.parent.active))
+
+    def current_rate(self) -> int:
+        if self.schedule:
+            now = time.localtime()
+            minute = now.tm_hour * 60 + now.tm_min
+            for start, end, rate in self.schedule:
+                if start == end:
+                    inside = True
+                elif start < end:
+                    inside = start <= minute < end
+                else:
+                    inside = minute >= start or minute < end
+                if inside:
+                    return rate
+        return self.rate
+
+    async def acquire(self, n: int):
+        await self._acquire(n)
+        if self.parent is not None:
+            await self.parent.acquire(n)
+
+    async def _acquire(self, n: int):
+        rate = self.current_rate()
+        now = time.monotonic()
+        if not rate:
+            self._tokens, self._last = 0.0, now
+            return
+        # Capacité d'au moins un bloc: un parent rempli pendant l'attente de l'enfant ne redort pas
+        self._tokens = min(max(rate * self.burst, n), self._tokens + (now - self._last) * rate) - n
+        self._last = now
+        if self._tokens < 0:
+            # Dette: on dort le temps de la rembourser (les appels concurrents s'additionnent)
+            await asyncio.sleep(-self._tokens / rate)
+
+CHUNK_MIN_SIZE = 16 * 1024          # taille de bloc minimale (liens lents)
+CHUNK_MAX_SIZE = 2 * 1024 * 1024    # taille de bloc maximale (liens rapides)
+CHUNK_TARGET_INTERVAL = 0.1         # secondes de débit visées par bloc
+
+async def aiter_adaptive(resp, min_size: int = CHUNK_MIN_SIZE, max_size: int = CHUNK_MAX_SIZE, interval: float = CHUNK_TARGET_INTERVAL):
+    """Itère le corps de `resp` par blocs dont la taille suit le débit mesuré.
+
+    Les morceaux bruts reçus sont regroupés jusqu'à environ `interval`
+    secondes de débit (bornés par min_size / max_size): peu d'itérations
+    Python par seconde à haut débit, et un bloc est rendu au plus tard
+    après `interval` secondes sur un lien lent (progression régulière).
+    """
+    target = 128 * 1024
+    buf = bytearray()
+    last = time.monotonic()
+    try:
+        async for data in resp.aiter_bytes():
+            buf += data
+            now = time.monotonic()
+            elapsed = now - last
+            if len(buf) < target and elapsed < interval:
+                continue
+            if elapsed > 0:
+                # Moyenne glissante: évite les oscillations sur un débit irrégulier
+                wanted = len(buf) / elapsed * interval
+                target = int(min(max_size, max(min_size, (target + wanted) / 2)))
+            chunk, buf = buf, bytearray()
+            last = now
+            yield chunk
+    except httpx.TransportError:
+        # Coupure: les octets déjà reçus sont rendus (donc écrits) avant l'erreur
+        if buf:
+            chunk, buf = buf, bytearray()
+            yield chunk
+        raise
+    if buf:
+        yield buf
+
+async def stream_to_writer(resp, writer: BufferedFileWriter, on_chunk=None, pause_event: asyncio.Event | None = None, limiter: RateLimiter | None = None):
+    """Copie le corps de `resp` dans `writer`; on_chunk(n) après chaque bloc.
+
+    Avec `limiter`, le débit est plafonné (voir RateLimiter). Les blocs
+    suivent le débit (voir aiter_adaptive).
+    """
+    async for chunk in aiter_adaptive(resp):
+        if pause_event and not pause_event.is_set():
+            await pause_event.wait()
+        if limiter is not None:
+            await limiter.acquire(len(chunk))
+        await writer.write(chunk)
+        if on_chunk:
+            on_chunk(len(chunk))
+
+SEGMENT_MIN_SIZE = 4 * 1024 * 1024  # en dessous, pas de découpe / de vol de travail
+
+class RangeNotSupported(Exception):
+    """Le serveur ignore l'en-tête Range (réponse 200 au lieu de 206)."""
+
+class RemoteChanged(Exception):
+    """If-Range refusé: le fichier distant n'est plus celui du .part."""
+
+class _Segment:
+    """Plage [pos, end) restant à télécharger; `end` peut être réduit par un vol de travail."""
+    __slots__ = ("pos", "end")
+
+    def __init__(self, start: int, end: int):
+        self.pos = start
+        self.end = end
+
+    @property
+    def remaining(self) -> int:
+        return self.end - self.pos
+
+async def download_segmented(client, download_url: str, part_path: str, total: int, connections: int, on_bytes=None, pause_event: asyncio.Event | None = None, preallocate: bool = False, journal: ResumeJournal | None = None, hasher: StreamHasher | None = None, limiter: RateLimiter | None = None):
+    """Télécharge `download_url` via `connections` requêtes Range parallèles.
+
+    Chaque plage est écrite à son propre offset dans `part_path` (créé à la
+    taille finale) via un BufferedFileWriter. Quand une connexion termine sa plage, elle reprend la
+    moitié de la plage active la plus en retard (vol de travail).
+    `on_bytes(n)` est appelé pour chaque bloc écrit.
+    Avec `preallocate`, l'espace est réservé d'avance (voir preallocate_part);
+    sinon le fichier est simplement étendu (creux possible).
+    Si `journal` contient déjà des plages, seules les plages manquantes sont
+    demandées, avec If-Range sur ses validateurs.
+    Un `hasher` avance avec la plage de tête; le reste est relu à la fin
+    (StreamHasher.finish). Toutes les connexions partagent `limiter`.
+    Lève RangeNotSupported si le serveur ne renvoie pas de 206, RemoteChanged
+    si le fichier distant a changé depuis le journal.
+    """
+    resuming = bool(journal and journal.ranges and os.path.exists(part_path))
+    if journal is not None:
+        # Journal sur disque avant d'étendre le .part: sinon, après un arrêt brutal,
+        # sa taille (finale) serait prise pour le point de reprise
+        await asyncio.to_thread(journal.save)
+    if preallocate:
+        await asyncio.to_thread(preallocate_part, part_path, total, total if resuming else 0)
+    else:
+        with open(part_path, "r+b" if resuming else "wb") as f:
+            f.truncate(total)
+    todo = journal.missing(total) if resuming and journal else [(0, total)]
+    if_range = journal.validator() if resuming and journal else None
+    seg_size = max(SEGMENT_MIN_SIZE, -(-sum(b - a for a, b in todo) // connections))
+    pending = [_Segment(s, min(s + seg_size, b)) for a, b in todo for s in range(a, b, seg_size)]
+    if not pending:
+        return  # journal complet (ex.: arrêt juste avant le renommage): rien à demander
+    active: list[_Segment] = []
+
+    def _next_segment():
+        if pending:
+            return pending.pop(0)
+        victim = max(active, key=lambda s: s.remaining, default=None)
+        if victim is None or victim.remaining < 2 * SEGMENT_MIN_SIZE:
+            return None
+        mid = victim.pos + victim.remaining // 2
+        stolen = _Segment(mid, victim.end)
+        victim.end = mid
+        return stolen
+
+    async def _fetch(seg: _Segment):
+        while seg.pos < seg.end:
+            received = 0
+            headers = {"Range": f"bytes={seg.pos}-{seg.end - 1}"}
+            if if_range:
+                headers["If-Range"] = if_range
+            async with client.stream("GET", download_url, headers=headers, timeout=TIMEOUT_TRANSFER) as resp:
+                resp.raise_for_status()
+                if resp.status_code != 206:
+                    if if_range:
+                        raise RemoteChanged(f"HTTP {resp.status_code}")
+                    raise RangeNotSupported(f"HTTP {resp.status_code}")
+                if journal and not resuming and journal.validator() is None:
+                    journal.set_validators(resp.headers)
+                async with BufferedFileWriter(part_path, "r+b", offset=seg.pos, journal=journal, hasher=hasher) as writer:
+                    async for chunk in aiter_adaptive(resp):
+                        if pause_event and not pause_event.is_set():
+                            await pause_event.wait()
+                        # La fin peut avoir été réduite entre deux blocs (plage volée)
+                        take = min(len(chunk), seg.end - seg.pos)
+                        if take <= 0:
+                            break
+                        if limiter is not None:
+                            await limiter.acquire(take)
+                        await writer.write(chunk[:take] if take < len(chunk) else chunk)
+                        seg.pos += take
+                        received += take
+                        if on_bytes:
+                            on_bytes(take)
+                        if seg.pos >= seg.end:
+                            break
+            if received == 0 and seg.pos < seg.end:
+                raise httpx.RemoteProtocolError(f"Plage {seg.pos}-{seg.end - 1} vide")
+
+    async def _worker():
+        while True:
+            seg = _next_segment()
+            if seg is None:
+                return
+            active.append(seg)
+            try:
+                await _fetch(seg)
+            finally:
+                active.remove(seg)
+
+    tasks = [asyncio.create_task(_worker()) for _ in range(min(connections, len(pending)))]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        for t in done:
+            if t.exception():
+                raise t.exception()  # type: ignore[misc]
+    finally:
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+EVENT_KINDS = ("resolved", "waiting", "started", "progress", "completed", "failed")
+
+class DownloadEvent:
+    """Événement typé d'un téléchargement, publié via `event_cb` (voir download_file).
+
+    kind: un de EVENT_KINDS; job: identifiant du téléchargement (job_id,
+    l'URL par défaut); url. Champs renseignés selon kind (None sinon):
+      resolved   name, size, mode ("free": page, "premium": API)
+      waiting    remaining, wait (secondes), au début et à la fin (remaining=0)
+                 de l'attente; entre les deux, voir WaitScheduler.remaining
+      started    name, size, downloaded (octets déjà présents), mode
+      progress   name, downloaded, size
+      completed  name, path, size, mode
+      failed     reason (clé "failed_<reason>" de EVENT_MESSAGES)
+    Le texte n'est produit qu'à l'affichage (format_event).
+    """
+    __slots__ = ("kind", "job", "url", "name", "size", "downloaded", "remaining", "wait", "path", "mode", "reason")
+
+    def __init__(self, kind: str, job: str, url: str, **fields):
+        self.kind = kind
+        self.job = job
+        self.url = url
+        self.name = self.size = self.downloaded = self.remaining = self.wait = None
+        self.path = self.mode = self.reason = None
+        for k, v in fields.items():
+            setattr(self, k, v)
+
+    @property
+    def percent(self) -> float | None:
+        return (self.downloaded or 0) / self.size * 100 if self.size else None
+
+EVENT_MESSAGES = {
+    "fr": {
+        "resolved": "📄 Nom: {name}",
+        "resolved_premium": "📄 Nom via API: {name} ({size_mb:.2f} MB)",
+        "waiting": "⏳ Attente {duration} (mode gratuit)…",
+        "started": "⬇️ Téléchargement → {name}",
+        "started_size": "⬇️ Téléchargement → {name} ({size_mb:.2f} MB)",
+        "started_premium": "⬇️ Téléchargement premium → {name}",
+        "completed": "✅ Terminé → {path}",
+        "completed_premium": "✅ Téléchargement premium terminé → {path}",
+        "failed_captcha": "⚠️ Captcha détecté. Résolution manuelle requise (ouvrir l'URL dans un navigateur, résoudre, puis récupérer le cookie / token).",
+        "failed_captcha_submit": "⚠️ Captcha détecté après soumission. Abandon.",
+        "failed_captcha_wait": "⚠️ Captcha détecté après attente. Abandon.",
+        "failed_unavailable": "❌ Page reçue indique indisponibilité / conditions. (Fichier supprimé ou limites atteintes.)",
+        "failed_no_link": "❌ Impossible de trouver le lien direct (peut-être Captcha ou changement de page). Active --debug pour plus d'info.",
+        "failed_html_page": "❌ Page HTML reçue au lieu du fichier (probablement indisponible / supprimé / conditions). Aucune sauvegarde.",
+    },
+    "en": {
+        "resolved": "📄 Name: {name}",
+        "resolved_premium": "📄 Name via API: {name} ({size_mb:.2f} MB)",
+        "waiting": "⏳ Waiting {duration} (free mode)…",
+        "started": "⬇️ Downloading → {name}",
+        "started_size": "⬇️ Downloading → {name} ({size_mb:.2f} MB)",
+        "started_premium": "⬇️ Premium downloading → {name}",
+        "completed": "✅ Done → {path}",
+        "completed_premium": "✅ Premium download completed → {path}",
+        "failed_captcha": "⚠️ Captcha detected. Manual resolution required (open in browser, solve, then reuse cookie/token).",
+        "failed_captcha_submit": "⚠️ Captcha detected after submission. Aborting.",
+        "failed_captcha_wait": "⚠️ Captcha detected after wait. Aborting.",
+        "failed_unavailable": "❌ Page indicates unavailability / conditions (File removed or limits reached).",
+        "failed_no_link": "❌ Unable to find direct link (maybe Captcha or page changed). Enable --debug for more info.",
+        "failed_html_page": "❌ HTML page received instead of file (probably unavailable / removed / conditions). No save.",
+    },
+}
+
+def format_event(ev: DownloadEvent, lang: str = "fr") -> str | None:
+    """Texte d'un événement dans la langue `lang` (None: rien à afficher).
+
+    progress n'a pas de texte; waiting seulement au début du compte à rebours.
+    """
+    if ev.kind == "failed":
+        key = f"failed_{ev.reason}"
+    elif ev.kind == "waiting":
+        if ev.remaining != ev.wait:
+            return None
+        key = "waiting"
+    elif ev.kind in ("resolved", "started", "completed"):
+        key = ev.kind
+        if ev.mode == "premium":
+            key += "_premium"
+        elif ev.kind == "started" and ev.size:
+            key += "_size"
+    else:
+        return None
+    messages = EVENT_MESSAGES.get(lang, EVENT_MESSAGES["fr"])
+    template = messages.get(key) or EVENT_MESSAGES["fr"].get(key)
+    if template is None:
+        return None
+    return template.format(name=ev.name, path=ev.path, size_mb=(ev.size or 0) / 1024 / 1024,
+                           duration=human_duration(ev.wait or 0))
+
+def dispatch_event(ev: DownloadEvent, event_cb=None, log=None):
+    """Remet `ev` à event_cb; sans abonné, son texte (français) part dans `log`."""
+    if event_cb:
+        try:
+            event_cb(ev)
+        except Exception:
+            pass
+        return
+    text = format_event(ev)
+    if text and log:
+        log(text)
+
+class ProgressBus:
+    """Bus de progression entre le cœur et une interface.
+
+    S'utilise comme `progress_cb` (même signature) depuis n'importe quel
+    thread. Seul le dernier état de chaque URL est conservé: l'interface
+    appelle drain() à son rythme (une fois par image) et applique les
+    mises à jour en lot, quel que soit le nombre de blocs reçus.
+    """
+
+    def __init__(self):
+        self._latest: dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, url, filename, downloaded, total, percent):
+        with self._lock:
+            self._latest[url] = (url, filename, downloaded, total, percent)
+
+    def drain(self) -> list[tuple]:
+        """Retourne puis oublie les derniers états (url, filename, downloaded, total, percent)."""
+        with self._lock:
+            latest, self._latest = self._latest, {}
+        return list(latest.values())
+
+def format_speed(bps: float) -> str:
+    """Formate un débit en B/s, KB/s, MB/s ou GB/s."""
+    if bps < 1024:
+        return f"{bps:.0f} B/s"
+    if bps < 1024*1024:
+        return f"{bps/1024:.1f} KB/s"
+    if bps < 1024*1024*1024:
+        return f"{bps/(1024*1024):.1f} MB/s"
+    return f"{bps/(1024*1024*1024):.1f} GB/s"
+
+def format_eta(seconds: float | None) -> str:
+    """Formate un temps restant (`--` si inconnu)."""
+    if seconds is None:
+        return "--"
+    if seconds < 60:
+        return f"{seconds:.0f}s"
+    if seconds < 3600:
+        return f"{int(seconds // 60)}m{int(seconds % 60):02d}s"
+    return f"{int(seconds // 3600)}h{int((seconds % 3600) // 60):02d}m"
+
+SPEED_SAMPLE_INTERVAL = 0.5  # secondes entre deux échantillons de débit
+SPEED_HALF_LIFE = 3.0        # demi-vie du lissage exponentiel (secondes)
+
+class SpeedEstimator:
+    """Débit et temps restant lissés (moyenne mobile exponentielle).
+
+    update() ne fait qu'enregistrer le compteur d'octets, sauf une fois
+    par SPEED_SAMPLE_INTERVAL où le débit de l'intervalle est intégré au
+    lissage (poids selon SPEED_HALF_LIFE). Un compteur qui recule
+    (redémarrage complet) repart d'une nouvelle base. Sert aussi
+    d'estimateur global en lui passant la somme de plusieurs transferts.
+    """
+
+    def __init__(self, total: int | None = None, start: int = 0, half_life: float = SPEED_HALF_LIFE, sample_interval: float = SPEED_SAMPLE_INTERVAL):
+        self.total = total
+        self.downloaded = start
+        self.speed = 0.0
+        self.half_life = half_life
+        self.sample_interval = sample_interval
+        self._sample_bytes = start
+        self._sample_time = time.monotonic()
+        self._primed = False
+
+    def update(self, downloaded: int, total: int | None = None, now: float | None = None) -> bool:
+        """Enregistre le compteur; retourne True si le débit vient d'être recalculé."""
+        if total is not None:
+            self.total = total
+        self.downloaded = downloaded
+        now = time.monotonic() if now is None else now
+        dt = now - self._sample_time
+        if downloaded < self._sample_bytes:
+            self._sample_bytes, self._sample_time = downloaded, now
+            return False
+        if dt < self.sample_interval:
+            return False
+        rate = (downloaded - self._sample_bytes) / dt
+        if self._primed:
+            alpha = 1 - 0.5 ** (dt / self.half_life)
+            self.speed += alpha * (rate - self.speed)
+        else:
+            self.speed = rate
+            self._primed = True
+        self._sample_bytes, self._sample_time = downloaded, now
+        return True
+
+    def eta(self) -> float | None:
+        """Secondes restantes estimées (None si taille ou débit inconnus)."""
+        if not self.total or self.speed <= 0:
+            return None
+        return max(0.0, (self.total - self.downloaded) / self.speed)
+
+DEFAULT_MAX_JOBS = 3   # téléchargements simultanés
+DEFAULT_PER_HOST = 4   # requêtes simultanées par hôte (pages, a-NN, api)
+
+def host_key(host: str) -> str:
+    """Clé de limitation d'un hôte: www.1fichier.com et 1fichier.com partagent la même."""
+    host = (host or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+class _HostSlotStream(httpx.AsyncByteStream):
+    """Flux de réponse qui libère le créneau de l'hôte à sa fermeture."""
+
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            if self._release:
+                self._release()
+                self._release = None
+
+class HostLimitedTransport(httpx.AsyncBaseTransport):
+    """Transport httpx qui borne le nombre de requêtes en vol par hôte.
+
+    Le créneau est tenu jusqu'à la fermeture de la réponse, donc pendant
+    tout le flux d'un téléchargement.
+    """
+
+    def __init__(self, scheduler: "JobScheduler", transport: httpx.AsyncBaseTransport | None = None):
+        self._scheduler = scheduler
+        self._transport = transport or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request):
+        sem = self._scheduler.host_semaphore(request.url.host)
+        await sem.acquire()
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            sem.release()
+            raise
+        response.stream = _HostSlotStream(response.stream, sem.release)
+        return response
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+class JobScheduler:
+    """Ordonnanceur de lots: plafond global de jobs + plafond par hôte.
+
+    - run(): au plus `max_jobs` jobs actifs; un nouveau démarre dès qu'un
+      précédent se termine, dans l'ordre de la liste.
+    - transport(): transport httpx appliquant `per_host` requêtes en vol
+      par hôte (`host_limits` permet de surcharger un hôte précis).
+    À créer dans l'event loop qui l'utilise.
+    """
+
+    def __init__(self, max_jobs: int = DEFAULT_MAX_JOBS, per_host: int = DEFAULT_PER_HOST, host_limits: dict[str, int] | None = None):
+        self.max_jobs = max(1, max_jobs)
+        self.per_host = max(1, per_host)
+        self.host_limits = {host_key(h): max(1, n) for h, n in (host_limits or {}).items()}
+        self._host_sems: dict[str, asyncio.Semaphore] = {}
+
+    def host_semaphore(self, host: str) -> asyncio.Semaphore:
+        key = host_key(host)
+        sem = self._host_sems.get(key)
+        if sem is None:
+            sem = self._host_sems[key] = asyncio.Semaphore(self.host_limits.get(key, self.per_host))
+        return sem
+
+    def raise_per_host(self, n: int):
+        """Relève le plafond par hôte à `n` (sans effet s'il est déjà atteint).
+
+        Les hôtes déjà vus gagnent les places manquantes (sauf ceux de
+        host_limits). À appeler dans l'event loop du client.
+        """
+        extra = n - self.per_host
+        if extra <= 0:
+            return
+        self.per_host = n
+        for key, sem in self._host_sems.items():
+            if key not in self.host_limits:
+                for _ in range(extra):
+                    sem.release()
+
+    def transport(self, transport: httpx.AsyncBaseTransport | None = None) -> HostLimitedTransport:
+        return HostLimitedTransport(self, transport)
+
+    async def run(self, items, job, should_stop=None) -> list[tuple[object, BaseException]]:
+        """Exécute `await job(item)` pour chaque item avec au plus max_jobs en parallèle.
+
+        `should_stop()` est consulté avant chaque nouveau job (arrêt doux).
+        Une erreur n'interrompt pas le lot: retourne la liste (item, exception).
+        """
+        it = iter(items)
+        errors: list[tuple[object, BaseException]] = []
+
+        async def _worker():
+            for item in it:
+                if should_stop and should_stop():
+                    return
+                try:
+                    await job(item)
+                except Exception as e:
+                    errors.append((item, e))
+
+        await asyncio.gather(*[_worker() for _ in range(self.max_jobs)])
+        return errors
+
+class _WaitEntry:
+    __slots__ = ("deadline", "seq", "job", "future")
+
+    def __init__(self, deadline: float, seq: int, job: str, future: asyncio.Future):
+        self.deadline = deadline
+        self.seq = seq
+        self.job = job
+        self.future = future
+
+    def __lt__(self, other: "_WaitEntry") -> bool:
+        return (self.deadline, self.seq) < (other.deadline, other.seq)
+
+class WaitScheduler:
+    """Service unique des attentes du mode gratuit, par échéance absolue.
+
+    wait(job, secondes) enregistre l'échéance (time.monotonic) du job; un
+    seul minuteur de l'event loop est armé sur la plus proche et réveille
+    exactement les jobs échus: ni thread ni réveil par seconde, quel que
+    soit le nombre d'attentes. pause() gèle toutes les attentes, resume()
+    décale leurs échéances de la durée de la pause. remaining(job) se lit
+    depuis n'importe quel thread (l'affichage calcule le restant à partir
+    de l'échéance). wait/pause/resume: dans l'event loop (depuis un autre
+    thread, via loop.call_soon_threadsafe).
+    """
+
+    def __init__(self):
+        self._heap: list[_WaitEntry] = []
+        self._jobs: dict[str, _WaitEntry] = {}
+        self._timer: asyncio.TimerHandle | None = None
+        self._paused_at: float | None = None
+        self._seq = 0
+
+    @property
+    def paused(self) -> bool:
+        return self._paused_at is not None
+
+    def _now(self) -> float:
+        paused_at = self._paused_at
+        return time.monotonic() if paused_at is None else paused_at
+
+    async def wait(self, job: str, seconds: float):
+        """Rend la main quand l'échéance de `job` (maintenant + seconds, hors pauses) est passée."""
+        future = asyncio.get_running_loop().create_future()
+        self._seq += 1
+        entry = _WaitEntry(self._now() + max(0.0, seconds), self._seq, job, future)
+        heapq.heappush(self._heap, entry)
+        self._jobs[job] = entry
+        self._arm()
+        try:
+            await future
+        finally:
+            if self._jobs.get(job) is entry:
+                del self._jobs[job]
+            if not future.done():
+                # Annulé: l'entrée est ignorée (puis retirée) par _fire
+                future.cancel()
+
+    def deadline(self, job: str) -> float | None:
+        entry = self._jobs.get(job)
+        return entry.deadline if entry else None
+
+    def remaining(self, job: str) -> float | None:
+        """Secondes restantes pour `job` (None s'il n'attend pas), figées pendant une pause."""
+        entry = self._jobs.get(job)
+        return max(0.0, entry.deadline - self._now()) if entry else None
+
+    def pause(self):
+        if self._paused_at is None:
+            self._paused_at = time.monotonic()
+            self._arm()
+
+    def resume(self):
+        if self._paused_at is None:
+            return
+        shift = time.monotonic() - self._paused_at
+        self._paused_at = None
+        for entry in self._heap:  # même décalage pour tous: le tas reste ordonné
+            entry.deadline += shift
+        self._arm()
+
+    def _arm(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._heap and self._heap[0].future.done():
+            heapq.heappop(self._heap)
+        if self._heap and self._paused_at is None:
+            delay = self._heap[0].deadline - time.monotonic()
+            self._timer = asyncio.get_running_loop().call_later(max(0.0, delay), self._fire)
+
+    def _fire(self):
+        self._timer = None
+        now = time.monotonic()
+        while self._heap and self._heap[0].deadline <= now:
+            entry = heapq.heappop(self._heap)
+            if not entry.future.done():
+                entry.future.set_result(None)
+        self._arm()
+
+    def follow(self, pause_event: "PauseEvent"):
+        """Gèle / relance les échéances à chaque clear() / set() de `pause_event`.
+
+        Pour un appelant qui ne pilote pas lui-même pause()/resume().
+        Retourne la fonction de désabonnement. Dans l'event loop.
+        """
+        def _sync():
+            if pause_event.is_set():
+                self.resume()
+            else:
+                self.pause()
+        return pause_event.subscribe(_sync)
+
+class PauseEvent(asyncio.Event):
+    """pause_event (set = en marche, clear = en pause) qui signale ses changements.
+
+    asyncio.Event ne prévient pas de clear(); ici chaque changement d'état
+    planifie les rappels abonnés dans leur event loop (call_soon_threadsafe),
+    ce qui permet d'appeler clear() depuis un autre thread.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._listeners: list[tuple] = []  # (event loop, rappel)
+
+    def subscribe(self, callback):
+        """Appelle `callback()` maintenant puis à chaque set()/clear(); retourne le désabonnement."""
+        entry = (asyncio.get_running_loop(), callback)
+        self._listeners.append(entry)
+        callback()
+        return lambda: self._listeners.remove(entry) if entry in self._listeners else None
+
+    def _notify(self):
+        for loop, callback in list(self._listeners):
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(callback)
+
+    def set(self):
+        changed = not self.is_set()
+        super().set()
+        if changed:
+            self._notify()
+
+    def clear(self):
+        changed = self.is_set()
+        super().clear()
+        if changed:
+            self._notify()
+
+USER_AGENT = "Mozilla/5.0"
+HTTP_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=16, keepalive_expiry=30.0)
+# Délais par phase (connect court, lecture adaptée à la phase)
+TIMEOUT_PAGE = httpx.Timeout(30.0, connect=10.0)
+TIMEOUT_FORM = httpx.Timeout(60.0, connect=10.0)
+TIMEOUT_API = httpx.Timeout(30.0, connect=10.0)
+TIMEOUT_TRANSFER = httpx.Timeout(60.0, connect=15.0)  # lecture: 60 s sans recevoir d'octet
+HTTP2_HOSTS = ("https://1fichier.com", "https://www.1fichier.com", "https://api.1fichier.com")
+
+def http2_available() -> bool:
+    return importlib.util.find_spec("h2") is not None
+
+def make_client(scheduler: JobScheduler | None = None, http2: bool | None = None) -> httpx.AsyncClient:
+    """Client httpx à garder pour toute une session (pages, API, transferts).
+
+    Pool de connexions borné (HTTP_LIMITS, keep-alive 30 s) et délai par
+    défaut TIMEOUT_PAGE; chaque phase précise le sien. HTTP/2 (si `h2` est
+    installé, ou `http2=True`) n'est utilisé que pour les pages et l'API
+    (HTTP2_HOSTS): les transferts restent en HTTP/1.1, une connexion TCP par
+    plage. Avec `scheduler`, chaque requête passe par sa limite par hôte.
+    """
+    if http2 is None:
+        http2 = http2_available()
+    def _wrap(transport):
+        return scheduler.transport(transport) if scheduler else transport
+    default = _wrap(httpx.AsyncHTTPTransport(limits=HTTP_LIMITS))
+    mounts = {}
+    if http2:
+        h2 = _wrap(httpx.AsyncHTTPTransport(limits=HTTP_LIMITS, http2=True))
+        mounts = {host: h2 for host in HTTP2_HOSTS}
+    return httpx.AsyncClient(headers={"User-Agent": USER_AGENT}, timeout=TIMEOUT_PAGE, transport=default, mounts=mounts)
+
+JOBS_DB = os.environ.get("F1_JOBS_DB") or os.path.join(os.path.expanduser("~"), ".1fichier_jobs.sqlite3")
+JOB_FLUSH_INTERVAL = 1.0   # secondes entre deux écritures groupées
+JOB_HISTORY = 1000         # jobs terminés conservés
+JOB_FIELDS = ("state", "name", "size", "downloaded", "error")
+
+class JobStore:
+    """File de téléchargements persistante (SQLite), partagée par la GUI et le CLI.
+
+    Un job: url, position, state ("queued", "running", "done", "error"),
+    name (nom résolu), size, downloaded, error (dernière erreur).
+    update() ne fait qu'accumuler en mémoire (appelable à chaque bloc reçu);
+    un thread applique les changements en une transaction toutes les
+    `flush_interval` secondes, et close() écrit le reste.
+    Lectures et écritures sont protégées par un verrou: utilisable depuis
+    plusieurs threads.
+    """
+
+    def __init__(self, path: str | None = None, flush_interval: float = JOB_FLUSH_INTERVAL):
+        self.path = path or JOBS_DB
+        self.flush_interval = flush_interval
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._pending: dict[str, dict] = {}
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs (url TEXT PRIMARY KEY, position INTEGER NOT NULL,"
+                " state TEXT NOT NULL DEFAULT 'queued', name TEXT, size INTEGER,"
+                " downloaded INTEGER NOT NULL DEFAULT 0, error TEXT, updated REAL)"
+            )
+            # Historique borné: les plus anciens jobs terminés disparaissent
+            self._db.execute(
+                "DELETE FROM jobs WHERE state = 'done' AND url NOT IN"
+                " (SELECT url FROM jobs WHERE state = 'done' ORDER BY updated DESC LIMIT ?)", (JOB_HISTORY,)
+            )
+        self._closed = threading.Event()
+        self._writer = threading.Thread(target=self._run, name="jobstore", daemon=True)
+        self._writer.start()
+
+    def _run(self):
+        while not self._closed.wait(self.flush_interval):
+            try:
+                self.flush()
+            except sqlite3.Error:
+                pass
+
+    def add(self, urls) -> list[str]:
+        """Ajoute les URLs absentes en fin de file; une URL déjà connue et non
+        terminée est remise en file (erreur effacée). Retourne les nouvelles."""
+        self.flush()
+        added = []
+        with self._lock, self._db:
+            pos = self._db.execute("SELECT COALESCE(MAX(position), 0) FROM jobs").fetchone()[0]
+            for url in urls:
+                if self._db.execute("SELECT 1 FROM jobs WHERE url = ?", (url,)).fetchone():
+                    self._db.execute("UPDATE jobs SET state = 'queued', error = NULL WHERE url = ? AND state != 'done'", (url,))
+                    continue
+                pos += 1
+                self._db.execute("INSERT INTO jobs (url, position, updated) VALUES (?, ?, ?)", (url, pos, time.time()))
+                added.append(url)
+        return added
+
+    def update(self, url: str, **fields):
+        """Change des champs de JOB_FIELDS d'un job (écrit au prochain flush)."""
+        with self._lock:
+            self._pending.setdefault(url, {}).update(fields)
+
+    def flush(self):
+        """Écrit les changements accumulés en une transaction."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            if not pending:
+                return
+            now = time.time()
+            with self._db:
+                for url, fields in pending.items():
+                    cols = [k for k in fields if k in JOB_FIELDS]
+                    if cols:
+                        self._db.execute(
+                            f"UPDATE jobs SET {', '.join(f'{c} = ?' for c in cols)}, updated = ? WHERE url = ?",
+                            [fields[c] for c in cols] + [now, url],
+                        )
+
+    def get(self, url: str) -> dict | None:
+        jobs = self.jobs(urls=[url])
+        return jobs[0] if jobs else None
+
+    def jobs(self, states=None, urls=None) -> list[dict]:
+        """Jobs dans l'ordre de la file (filtrés par états et/ou URLs)."""
+        self.flush()
+        query, args = "SELECT url, state, name, size, downloaded, error FROM jobs", []
+        where = []
+        if states:
+            where.append(f"state IN ({', '.join('?' * len(states))})")
+            args += list(states)
+        if urls is not None:
+            where.append(f"url IN ({', '.join('?' * len(urls))})")
+            args += list(urls)
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        with self._lock:
+            rows = self._db.execute(query + " ORDER BY position", args).fetchall()
+        return [dict(zip(("url",) + JOB_FIELDS, row)) for row in rows]
+
+    def pending(self) -> list[dict]:
+        """Jobs non terminés (un job "running" a été interrompu: à reprendre)."""
+        return self.jobs(states=("queued", "running", "error"))
+
+    def remove(self, urls):
+        self.flush()
+        with self._lock, self._db:
+            self._db.executemany("DELETE FROM jobs WHERE url = ?", [(u,) for u in urls])
+
+    def close(self):
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self._writer.join()
+        self.flush()
+        with self._lock:
+            self._db.close()
+
+META_CACHE_DB = os.environ.get("F1_CACHE_DB") or os.path.join(os.path.expanduser("~"), ".1fichier_cache.sqlite3")
+META_TTL = 24 * 3600       # secondes: au-delà, la page est relue
+META_MAX_ENTRIES = 5000    # au-delà, les moins récemment utilisées sont évincées
+META_EVICT_EVERY = 100     # insertions entre deux contrôles de la taille
+
+def file_id(url: str) -> str:
+    """Identifiant 1fichier d'une URL (https://1fichier.com/?abc123&af=1 -> abc123)."""
+    parts = urlparse(url.strip())
+    fid = parts.query.split("&", 1)[0].split("=", 1)[0]
+    if re.fullmatch(r"[A-Za-z0-9]{5,}", fid or ""):
+        return fid.lower()
+    return url.strip()
+
+class MetadataCache:
+    """Cache disque (SQLite) des métadonnées par identifiant de fichier.
+
+    Une entrée: name (nom affiché), size, alive (True/False/None = inconnu)
+    et fetched (date de lecture). Une entrée plus vieille que `ttl` est
+    ignorée; au-delà de `max_entries`, les moins récemment lues sont
+    évincées (LRU), contrôle fait toutes les META_EVICT_EVERY insertions.
+    put() fusionne: un champ None ne remplace pas l'existant.
+    Depuis un event loop, utiliser aget() / aput() (SQLite dans un thread).
+    """
+
+    def __init__(self, path: str | None = None, ttl: float = META_TTL, max_entries: int = META_MAX_ENTRIES):
+        self.path = path or META_CACHE_DB
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS meta (id TEXT PRIMARY KEY, name TEXT, size INTEGER,"
+                " alive INTEGER, fetched REAL NOT NULL, used REAL NOT NULL)"
+            )
+            self._db.execute("DELETE FROM meta WHERE fetched < ?", (time.time() - ttl,))
+        self._puts = 0
+        self._evict()
+
+    def get(self, url: str) -> dict | None:
+        """Entrée encore valide pour `url` (None sinon)."""
+        fid, now = file_id(url), time.time()
+        with self._lock, self._db:
+            row = self._db.execute("SELECT name, size, alive, fetched FROM meta WHERE id = ?", (fid,)).fetchone()
+            if row is None:
+                return None
+            if now - row[3] > self.ttl:
+                self._db.execute("DELETE FROM meta WHERE id = ?", (fid,))
+                return None
+            self._db.execute("UPDATE meta SET used = ? WHERE id = ?", (now, fid))
+        name, size, alive, fetched = row
+        return {"name": name, "size": size, "alive": None if alive is None else bool(alive), "fetched": fetched}
+
+    def put(self, url: str, name: str | None = None, size: int | None = None, alive: bool | None = None):
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT INTO meta (id, name, size, alive, fetched, used) VALUES (?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT(id) DO UPDATE SET name = COALESCE(excluded.name, name),"
+                " size = COALESCE(excluded.size, size), alive = COALESCE(excluded.alive, alive),"
+                " fetched = excluded.fetched, used = excluded.used",
+                (file_id(url), name, size or None, None if alive is None else int(alive), now, now),
+            )
+            self._puts += 1
+            evict = self._puts % META_EVICT_EVERY == 0
+        if evict:
+            self._evict()
+
+    def _evict(self):
+        with self._lock, self._db:
+            self._db.execute(
+                "DELETE FROM meta WHERE id IN (SELECT id FROM meta ORDER BY used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    async def aget(self, url: str) -> dict | None:
+        return await asyncio.to_thread(self.get, url)
+
+    async def aput(self, url: str, name: str | None = None, size: int | None = None, alive: bool | None = None):
+        await asyncio.to_thread(self.put, url, name, size, alive)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
 def save_debug(debug, label, content):
     if not debug:
         return
@@ -239,10 +1852,158 @@ def save_debug(debug, label, content):
     except Exception as e:
         print(f"[debug] Échec sauvegarde {label}: {e}")
 
-async def download_via_api(client: httpx.AsyncClient, url: str, api_key: str, outdir: str = ".", log_cb=None, progress_cb=None) -> bool:
+API_BASE = os.environ.get("F1_API_BASE", "https://api.1fichier.com/v1").rstrip("/")
+PREMIUM_LOOKAHEAD = 2        # fichiers résolus à l'avance (info + lien)
+PREMIUM_TOKEN_TTL = 240.0    # secondes: au-delà, un lien pré-résolu est redemandé
+TOKEN_EXPIRED_STATUS = {403, 404, 410}
+
+class PremiumApiError(Exception):
+    """Échec d'une étape de l'API premium.
+
+    `step`: "info" (file/info.cgi), "token" (download/get_token.cgi) ou
+    "link" (get_token.cgi n'a renvoyé aucun lien);
+    `cause`: exception d'origine (None si l'API a renvoyé une erreur).
+    """
+
+    def __init__(self, step: str, message: str, cause: BaseException | None = None):
+        super().__init__(message)
+        self.step = step
+        self.cause = cause
+
+def api_headers(api_key: str) -> dict[str, str]:
+    return {
+        'Authorization': f'Bearer {api_key}',
+        'Content-Type': 'application/json'
+    }
+
+async def api_post(client, api_key: str, endpoint: str, payload: dict) -> dict:
+    """POST JSON sur l'API 1fichier (API_BASE/endpoint); retourne la réponse décodée."""
+    resp = await client.post(f"{API_BASE}/{endpoint}", json=payload, headers=api_headers(api_key), timeout=TIMEOUT_API)
+    resp.raise_for_status()
+    return resp.json()
+
+API_INFO_FLIGHT = SingleFlight()
+
+async def api_file_info(client, url: str, api_key: str, retry: "RetryPolicy | None" = None, log=None) -> dict:
+    """Infos d'un fichier (filename, size, checksum...); PremiumApiError si refus.
+
+    Les demandes simultanées pour un même fichier partagent un seul appel
+    (voir SingleFlight); le dict retourné ne doit pas être modifié.
+    """
+    retry = retry or DEFAULT_RETRY_POLICY
+    async def _info():
+        return await retry.run(lambda: api_post(client, api_key, "file/info.cgi", {'url': url}), log, "API")
+    try:
+        data = await API_INFO_FLIGHT.do((id(client), api_key, file_id(url)), _info)
+    except Exception as e:
+        raise PremiumApiError("info", str(e), e) from e
+    # Soit directement les infos du fichier, soit un status/message
+    if not ('filename' in data and 'size' in data) and data.get('status') != 'OK':
+        raise PremiumApiError("info", data.get('message', 'Unknown error'))
+    return data
+
+async def api_get_token(client, url: str, api_key: str, retry: "RetryPolicy | None" = None, log=None) -> str:
+    """Lien de téléchargement premium d'un fichier; PremiumApiError si refus."""
+    retry = retry or DEFAULT_RETRY_POLICY
+    try:
+        data = await retry.run(lambda: api_post(client, api_key, "download/get_token.cgi", {'url': url}), log, "API")
+    except Exception as e:
+        raise PremiumApiError("token", str(e), e) from e
+    # L'API peut retourner directement l'URL ou avec un status
+    if 'url' not in data and data.get('status') != 'OK':
+        raise PremiumApiError("token", data.get('message', 'Unknown error'))
+    if not data.get('url'):
+        raise PremiumApiError("link", "Aucun lien de téléchargement reçu de l'API")
+    return data['url']
+
+class PremiumTicket:
+    """Résolution premium d'une URL: infos du fichier + lien (daté)."""
+    __slots__ = ("info", "download_url", "issued")
+
+    def __init__(self, info: dict, download_url: str):
+        self.info = info
+        self.download_url = download_url
+        self.issued = time.monotonic()
+
+    def expired(self, ttl: float = PREMIUM_TOKEN_TTL) -> bool:
+        return time.monotonic() - self.issued > ttl
+
+async def resolve_premium(client, url: str, api_key: str, retry: "RetryPolicy | None" = None, log=None) -> PremiumTicket:
+    info = await api_file_info(client, url, api_key, retry, log)
+    return PremiumTicket(info, await api_get_token(client, url, api_key, retry, log))
+
+class PremiumResolver:
+    """Résolution premium en avance sur les transferts.
+
+    queue(urls) donne l'ordre du lot. get(url) rend la résolution de `url`
+    (déjà lancée en tâche de fond, ou faite immédiatement) et lance celle
+    des `lookahead` fichiers suivants: un transfert démarre sans les deux
+    allers-retours API. Un lien plus vieux que PREMIUM_TOKEN_TTL est
+    redemandé (get_token seul) avant usage. À créer dans l'event loop qui
+    l'utilise; aclose() annule les résolutions non consommées.
+    """
+
+    def __init__(self, client, api_key: str, lookahead: int = PREMIUM_LOOKAHEAD, retry: "RetryPolicy | None" = None):
+        self.client = client
+        self.api_key = api_key
+        self.lookahead = lookahead
+        self.retry = retry
+        self._order: list[str] = []
+        self._tasks: dict[str, asyncio.Task] = {}
+
+    def queue(self, urls):
+        self._order = list(urls)
+
+    def _start(self, url: str) -> asyncio.Task:
+        task = asyncio.create_task(resolve_premium(self.client, url, self.api_key, self.retry))
+        # Erreur relevée au get(); évite l'avertissement si jamais consommée
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return task
+
+    def _prefetch_after(self, url: str):
+        try:
+            i = self._order.index(url)
+        except ValueError:
+            return
+        for nxt in self._order[i + 1:i + 1 + self.lookahead]:
+            if nxt not in self._tasks:
+                self._tasks[nxt] = self._start(nxt)
+
+    async def get(self, url: str, log=None) -> PremiumTicket:
+        self._prefetch_after(url)
+        task = self._tasks.pop(url, None)
+        ticket = await (task if task is not None else resolve_premium(self.client, url, self.api_key, self.retry, log))
+        if ticket.expired():
+            await self.refresh(url, ticket, log)
+        return ticket
+
+    async def refresh(self, url: str, ticket: PremiumTicket, log=None):
+        """Redemande le lien de `ticket` (expiré ou refusé par le serveur)."""
+        ticket.download_url = await api_get_token(self.client, url, self.api_key, self.retry, log)
+        ticket.issued = time.monotonic()
+
+    async def aclose(self):
+        tasks, self._tasks = list(self._tasks.values()), {}
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+async def download_via_api(client: httpx.AsyncClient, url: str, api_key: str, outdir: str = ".", log_cb=None, progress_cb=None, connections: int = 1, pause_event: asyncio.Event | None = None, preallocate: bool = False, checksum: bool = False, limiter: RateLimiter | None = None, retry: RetryPolicy | None = None, resolver: "PremiumResolver | None" = None, cache: MetadataCache | None = None, event_cb=None, job_id: str | None = None) -> bool:
     """Tente un téléchargement via l'API premium 1fichier.
     
+    Avec connections > 1 et une taille connue, le fichier est découpé en
+    plages téléchargées en parallèle (voir download_segmented).
+    Avec checksum, l'empreinte est calculée pendant l'écriture, comparée à
+    celle d'info.cgi si fournie et enregistrée dans <nom>.sha256.
+    `limiter` plafonne le débit (voir RateLimiter). Les appels API et le
+    transfert suivent `retry` (une coupure reprend au dernier octet journalisé).
+    Avec `resolver`, infos et lien viennent de la résolution faite en avance
+    (voir PremiumResolver); un lien refusé au transfert est renouvelé une fois.
+    `cache` reçoit le nom et la taille donnés par l'API.
+    `event_cb` / `job_id`: événements typés, comme pour download_file
+    (pas de "failed" ici: un échec mène au mode gratuit).
     Retourne True si succès, False si échec (fallback vers mode gratuit).
+    Lève ChecksumMismatch si le fichier reçu est corrompu.
     """
     def _log(msg: str):
         if log_cb:
@@ -252,8 +2013,17 @@ async def download_via_api(client: httpx.AsyncClient, url: str, api_key: str, ou
                 print(msg)
         else:
             print(msg)
+
+    def _emit(kind: str, **fields):
+        dispatch_event(DownloadEvent(kind, job_id or url, url, **fields), event_cb, _log)
     
     def _progress(filename, downloaded, total):
+        # Affichage avec vitesse pour CLI (sans log_cb)
+        if total and not log_cb and downloaded < total and estimator.update(downloaded, total):
+            pct = downloaded / total * 100
+            print(f"\rProgression: {pct:5.1f}% ({downloaded/1024/1024:.2f} / {total/1024/1024:.2f} MB) - {format_speed(estimator.speed)} - ETA: {format_eta(estimator.eta())}", end="")
+        if event_cb:
+            _emit("progress", name=filename, downloaded=downloaded, size=total)
         if progress_cb:
             pct = (downloaded / total * 100) if total else None
             try:
@@ -263,125 +2033,178 @@ async def download_via_api(client: httpx.AsyncClient, url: str, api_key: str, ou
     
     _log(f"🔑 Tentative téléchargement premium via API")
     
-    # Headers d'authentification
-    auth_headers = {
-        'Authorization': f'Bearer {api_key}',
-        'Content-Type': 'application/json'
-    }
+    retry = retry or DEFAULT_RETRY_POLICY
     
-    # Étape 1: Obtenir les infos du fichier
+    # Étapes 1-2: infos du fichier + lien (souvent déjà résolus par `resolver`)
     try:
-        info_resp = await client.post(
-            "https://api.1fichier.com/v1/file/info.cgi",
-            json={'url': url},
-            headers=auth_headers
-        )
-        info_resp.raise_for_status()
-        info_data = info_resp.json()
-        
-        # Si la réponse contient directement les infos du fichier (pas de status/message)
-        if 'filename' in info_data and 'size' in info_data:
-            filename = info_data.get('filename', 'unknown_file')
-            file_size = int(info_data.get('size', 0))
-        elif info_data.get('status') == 'OK':
-            filename = info_data.get('filename', 'unknown_file')
-            file_size = int(info_data.get('size', 0))
+        if resolver is not None:
+            ticket = await resolver.get(url, _log)
         else:
-            error_msg = info_data.get('message', 'Unknown error')
-            _log(f"❌ API info error: {error_msg}")
-            if 'authenticated' in error_msg.lower():
+            ticket = await resolve_premium(client, url, api_key, retry, _log)
+    except PremiumApiError as e:
+        cause = e.cause
+        if isinstance(cause, httpx.HTTPStatusError):
+            what = "la récupération des infos" if e.step == "info" else "l'obtention du lien"
+            _log(f"❌ Erreur HTTP lors de {what}: {cause.response.status_code} - {cause.response.text}")
+        elif cause is not None:
+            what = "récupération infos" if e.step == "info" else "obtention lien"
+            _log(f"❌ Erreur {what} API: {cause}")
+        elif e.step == "info":
+            _log(f"❌ API info error: {e}")
+            if 'authenticated' in str(e).lower():
                 _log("💡 Vérifiez que votre clé API est valide et que vous avez un compte premium")
-            return False
-        
-        _log(f"📄 Nom via API: {filename} ({file_size/1024/1024:.2f} MB)")
-        
-    except httpx.HTTPStatusError as e:
-        _log(f"❌ Erreur HTTP lors de la récupération des infos: {e.response.status_code} - {e.response.text}")
-        return False
-    except Exception as e:
-        _log(f"❌ Erreur récupération infos API: {e}")
-        return False
-    
-    # Étape 2: Obtenir le lien de téléchargement
-    try:
-        dl_resp = await client.post(
-            "https://api.1fichier.com/v1/download/get_token.cgi", 
-            json={'url': url},
-            headers=auth_headers
-        )
-        dl_resp.raise_for_status()
-        dl_data = dl_resp.json()
-        
-        # L'API peut retourner directement l'URL ou avec un status
-        if 'url' in dl_data:
-            download_url = dl_data.get('url')
-        elif dl_data.get('status') == 'OK':
-            download_url = dl_data.get('url')
+        elif e.step == "link":
+            _log(f"❌ {e}")
         else:
-            error_msg = dl_data.get('message', 'Unknown error')
-            _log(f"❌ API download error: {error_msg}")
-            if 'limit' in error_msg.lower():
+            _log(f"❌ API download error: {e}")
+            if 'limit' in str(e).lower():
                 _log("💡 Limite de téléchargement premium atteinte")
-            return False
-        
-        if not download_url:
-            _log("❌ Aucun lien de téléchargement reçu de l'API")
-            return False
-        
-    except httpx.HTTPStatusError as e:
-        _log(f"❌ Erreur HTTP lors de l'obtention du lien: {e.response.status_code} - {e.response.text}")
-        return False
-    except Exception as e:
-        _log(f"❌ Erreur obtention lien API: {e}")
         return False
     
+    info_data = ticket.info
+    filename = info_data.get('filename', 'unknown_file')
+    file_size = int(info_data.get('size', 0))
+    expected_checksum = info_data.get('checksum') or None
+    _emit("resolved", name=filename, size=file_size, mode="premium")
+    if cache:
+        await cache.aput(url, name=filename, size=file_size, alive=True)
+    
     # Étape 3: Téléchargement du fichier
     try:
         final_path = os.path.join(outdir, filename)
         part_path = final_path + ".part"
         
-        # Vérification reprise
-        existing = os.path.getsize(part_path) if os.path.exists(part_path) else 0
-        headers = {}
-        mode = "wb"
-        
-        if existing > 0:
-            headers["Range"] = f"bytes={existing}-"
-            mode = "ab"
-            _log(f"▶️ Reprise à {existing/1024/1024:.2f} MB")
-        
-        _log(f"⬇️ Téléchargement premium → {filename}")
+        _emit("started", name=filename, size=file_size, mode="premium")
+        estimator = SpeedEstimator(file_size)
         
-        # Variables pour calcul de vitesse
-        start_time = time.time()
-        
-        async with client.stream("GET", download_url, headers=headers) as resp:
-            resp.raise_for_status()
-            total = int(resp.headers.get("content-length", 0)) + existing if file_size else None
-            downloaded = existing
-            
-            with open(part_path, mode) as f:
-                async for chunk in resp.aiter_bytes(1024*128):
-                    f.write(chunk)
-                    downloaded += len(chunk)
-                    _progress(filename, downloaded, total)
+        async def _transfer():
+            # Vérification reprise (journal <nom>.part.json, sinon taille du .part)
+            existing, journal = load_resume_state(part_path, url, file_size, _log)
+            committed = journal.committed()
+            if committed > 0:
+                _log(f"▶️ Reprise à {committed/1024/1024:.2f} MB")
+
+            # Mode segmenté; obligatoire aussi pour combler les trous d'un .part segmenté
+            has_holes = committed > existing
+            segmented = bool(file_size) and (has_holes or (connections > 1 and file_size >= 2 * SEGMENT_MIN_SIZE))
+            if segmented:
+                _log(f"🔀 Téléchargement segmenté: {connections} connexions")
+                downloaded = committed
+                def _on_bytes(n):
+                    nonlocal downloaded
+                    downloaded += n
+                    _progress(filename, downloaded, file_size)
+                try:
+                    try:
+                        hasher = new_hasher(expected_checksum) if checksum else None
+                        await download_segmented(client, ticket.download_url, part_path, file_size, connections, _on_bytes, pause_event, preallocate, journal, hasher, limiter)
+                    except RemoteChanged:
+                        _log("ℹ️ Fichier distant modifié, redémarrage complet.")
+                        journal.reset(file_size)
+                        downloaded = 0
+                        hasher = new_hasher(expected_checksum) if checksum else None
+                        await download_segmented(client, ticket.download_url, part_path, file_size, connections, _on_bytes, pause_event, preallocate, journal, hasher, limiter)
+                except RangeNotSupported:
+                    _log("ℹ️ Plages non supportées, connexion unique.")
+                    segmented = False
+                    existing = 0
+                    journal.reset(file_size)
+
+            if not segmented:
+                headers = {}
+                if existing > 0:
+                    headers["Range"] = f"bytes={existing}-"
+                    if journal.validator():
+                        headers["If-Range"] = journal.validator()
+                async with client.stream("GET", ticket.download_url, headers=headers, timeout=TIMEOUT_TRANSFER) as resp:
+                    resp.raise_for_status()
+                    if existing > 0 and resp.status_code != 206:
+                        # If-Range refusé (fichier changé) ou Range ignoré: on repart de zéro
+                        _log(restart_message(journal, resp.headers))
+                        existing = 0
+                        journal.reset(file_size)
+                    if existing == 0:
+                        journal.set_validators(resp.headers)
+                    total = int(resp.headers.get("content-length", 0)) + existing if file_size else None
+                    downloaded = existing
+                    def _on_chunk(n):
+                        nonlocal downloaded
+                        downloaded += n
+                        _progress(filename, downloaded, total)
+
+                    hasher = new_hasher(expected_checksum) if checksum else None
+                    async with open_part_writer(part_path, existing, total, preallocate, journal, hasher) as writer:
+                        await stream_to_writer(resp, writer, _on_chunk, pause_event, limiter)
+            return journal, hasher
+
+        # Une coupure relance _transfer, qui reprend d'après le journal
+        try:
+            journal, hasher = await retry.run(_transfer, _log, "Transfert")
+        except httpx.HTTPStatusError as e:
+            # Lien résolu à l'avance refusé (expiré entre-temps): un nouveau, une fois
+            if resolver is None or e.response.status_code not in TOKEN_EXPIRED_STATUS:
+                raise
+            _log("🔑 Lien premium expiré, renouvellement")
+            await resolver.refresh(url, ticket, _log)
+            journal, hasher = await retry.run(_transfer, _log, "Transfert")
+        if not log_cb:
+            print()
         
+        digests = None
+        if hasher is not None:
+            try:
+                digests = await verify_checksum(hasher, part_path, expected_checksum)
+            except ChecksumMismatch:
+                # Données corrompues: inutile de reprendre ce .part
+                os.remove(part_path)
+                journal.remove()
+                raise
+            if checksum_algorithm(expected_checksum):
+                _log("🔒 Empreinte vérifiée")
         os.replace(part_path, final_path)
-        _log(f"✅ Téléchargement premium terminé → {final_path}")
+        journal.remove()
+        if digests:
+            write_checksum_sidecar(final_path, digests)
         _progress(filename, file_size or os.path.getsize(final_path), file_size or os.path.getsize(final_path))
+        _emit("completed", name=filename, path=final_path, size=file_size or os.path.getsize(final_path), mode="premium")
         return True
         
+    except ChecksumMismatch as e:
+        _log(f"❌ Empreinte invalide: {e}")
+        raise
     except Exception as e:
         _log(f"❌ Erreur téléchargement API: {e}")
         return False
 
-async def download_file(client, url, outdir=".", debug=False, force_wait=False, save_html=False, log_cb=None, progress_cb=None, wait_cb=None, pause_event: asyncio.Event | None = None, api_key: str | None = None):
+async def download_file(client, url, outdir=".", debug=False, force_wait=False, save_html=False, log_cb=None, progress_cb=None, wait_cb=None, pause_event: asyncio.Event | None = None, api_key: str | None = None, connections: int = 1, preallocate: bool = False, checksum: bool = False, limiter: RateLimiter | None = None, retry: RetryPolicy | None = None, resolver: PremiumResolver | None = None, cache: MetadataCache | None = None, event_cb=None, job_id: str | None = None, waits: WaitScheduler | None = None):
     """Télécharge un fichier avec callbacks optionnels.
     log_cb(msg) et progress_cb(url, filename, downloaded, total, percent)
     
-    Si api_key est fournie, tente d'abord le téléchargement premium via API.
+    Si api_key est fournie, tente d'abord le téléchargement premium via API
+    (segmenté sur `connections` connexions si > 1).
     En cas d'échec, fallback vers le mode gratuit.
+    Avec preallocate, le .part est réservé à sa taille finale si elle est connue.
+    Avec checksum, l'empreinte SHA-256 est calculée pendant le téléchargement
+    et écrite dans <nom>.sha256 (vérifiée contre l'API en premium).
+    `limiter` plafonne le débit du transfert (voir RateLimiter).
+    `retry` (défaut: DEFAULT_RETRY_POLICY) gouverne les nouvelles tentatives
+    des pages, de l'API et du transfert.
+    `resolver` fournit les résolutions premium faites en avance (voir
+    PremiumResolver).
+    `cache` reçoit le nom, la taille et l'état (disponible ou non) observés.
+    `event_cb(DownloadEvent)` reçoit les événements typés (resolved, waiting,
+    started, progress, completed, failed) marqués `job_id` (l'URL par
+    défaut); l'abonné affiche lui-même leur texte (format_event), qui ne
+    passe alors plus par log_cb. Les exceptions remontent comme avant.
+    `waits` porte l'attente du mode gratuit; le restant se lit sur
+    waits.remaining(job_id). Qui le fournit pilote sa pause (pause/resume);
+    sans lui, un WaitScheduler propre à l'appel suit `pause_event` si c'est
+    un PauseEvent (WaitScheduler.follow). wait_cb(url, restant, total)
+    et l'événement waiting sont émis au début et à la fin de l'attente.
+    Retourne True si le fichier a été téléchargé, False sinon (captcha,
+    fichier indisponible, lien introuvable...).
     """
+    retry = retry or DEFAULT_RETRY_POLICY
     def _log(msg: str):
         if log_cb:
             try:
@@ -390,7 +2213,14 @@ async def download_file(client, url, outdir=".", debug=False, force_wait=False,
                 print(msg)
         else:
             print(msg)
+    def _emit(kind: str, **fields):
+        dispatch_event(DownloadEvent(kind, job_id or url, url, **fields), event_cb, _log)
+    def _fail(reason: str) -> bool:
+        _emit("failed", reason=reason)
+        return False
     def _progress(filename, downloaded, total):
+        if event_cb:
+            _emit("progress", name=filename, downloaded=downloaded, size=total)
         if progress_cb:
             pct = (downloaded / total * 100) if total else None
             try:
@@ -398,132 +2228,212 @@ async def download_file(client, url, outdir=".", debug=False, force_wait=False,
             except Exception:
                 pass
     def _wait_update(remaining, total_wait):
+        _emit("waiting", remaining=remaining, wait=total_wait)
         if wait_cb:
             try:
                 wait_cb(url, remaining, total_wait)
             except Exception:
                 pass
+
+    async def _save_response(resp, filename, existing, journal, total_size, range_sent=True):
+        """Écrit le corps de `resp` dans <filename>.part (repris à `existing`), puis le renomme.
+
+        `range_sent`: False si `resp` ne répond pas à une requête Range.
+        Retourne le chemin final.
+        """
+        final_path = os.path.join(outdir, filename)
+        part_path = final_path + ".part"
+        if existing > 0 and resp.status_code != 206:
+            # Réponse entière: If-Range refusé, Range ignoré ou jamais envoyé
+            _log(restart_message(journal, resp.headers, range_sent))
+            existing = 0
+            journal.reset(total_size)
+        if existing == 0:
+            journal.set_validators(resp.headers)
+        total = int(resp.headers.get("content-length", 0)) + existing if total_size else None
+        downloaded = existing
+        _emit("started", name=filename, size=total, downloaded=existing, mode="free")
+
+        estimator = SpeedEstimator(total, existing)
+
+        def _on_chunk(n):
+            nonlocal downloaded
+            downloaded += n
+            # Affichage avec vitesse pour CLI (sans log_cb)
+            if total and not log_cb and estimator.update(downloaded):
+                pct = downloaded / total * 100
+                print(f"\rProgression: {pct:5.1f}% ({downloaded/1024/1024:.2f} / {total/1024/1024:.2f} MB) - {format_speed(estimator.speed)} - ETA: {format_eta(estimator.eta())}", end="")
+            _progress(filename, downloaded, total)
+
+        hasher = new_hasher() if checksum else None
+        async with open_part_writer(part_path, existing, total, preallocate, journal, hasher) as writer:
+            await stream_to_writer(resp, writer, _on_chunk, pause_event, limiter)
+        if not log_cb:
+            print()
+
+        digests = await verify_checksum(hasher, part_path) if hasher is not None else None
+        os.replace(part_path, final_path)
+        journal.remove()
+        if digests:
+            write_checksum_sidecar(final_path, digests)
+        return final_path
     
     _log(f"\n🔗 Traitement de {url}")
     
     # Tentative premium via API en priorité
     if api_key and api_key.strip():
         try:
-            success = await download_via_api(client, url, api_key.strip(), outdir, log_cb, progress_cb)
+            success = await download_via_api(client, url, api_key.strip(), outdir, log_cb, progress_cb, connections=connections, pause_event=pause_event, preallocate=preallocate, checksum=checksum, limiter=limiter, retry=retry, resolver=resolver, cache=cache, event_cb=event_cb, job_id=job_id)
             if success:
-                return  # Succès via API, on s'arrête ici
+                return True  # Succès via API, on s'arrête ici
             else:
                 _log("⚠️ Échec téléchargement premium, passage en mode gratuit...")
+        except ChecksumMismatch:
+            raise
         except Exception as e:
             _log(f"⚠️ Erreur API premium: {e}, passage en mode gratuit...")
     
     # Mode gratuit (code existant)
-    r = await fetch_html(client, url)
-    soup = BeautifulSoup(r.text, "html.parser")
+    r, page = await retry.run(lambda: fetch_page(client, url), _log, "Page")
+    # Page consommée (formulaire soumis ensuite): pas de réutilisation
+    PAGE_FLIGHT.forget((id(client), file_id(url)))
     save_debug(debug, "initial", r.text)
 
     # Nom affiché (avant toute action), pour feedback utilisateur
-    page_display_name = extract_display_filename(soup)
-    if page_display_name:
-        _log(f"📄 Nom: {page_display_name}")
+    display_name = page.name
+    if page.name:
+        _emit("resolved", name=page.name, mode="free")
+    if cache:
+        await cache.aput(url, name=page.name, alive=not (page.error and not page.direct_link))
 
-    if detect_captcha(soup):
-        _log("⚠️ Captcha détecté. Résolution manuelle requise (ouvrir l'URL dans un navigateur, résoudre, puis récupérer le cookie / token).")
+    if page.captcha:
         if save_html:
             save_debug(True, "captcha_page", r.text)
-        return
+        return _fail("captcha")
 
     # Détection page erreur précoce
-    if looks_like_error_html(r.text):
+    if page.error:
         # Ignore faux positifs si lien direct présent
-        if not find_direct_link(soup, str(r.url)):
-            _log("❌ Page reçue indique indisponibilité / conditions. (Fichier supprimé ou limites atteintes.)")
+        if not page.direct_link:
             if save_html:
                 save_debug(True, "early_error", r.text)
-            return
+            return _fail("unavailable")
 
     # Vérif temps d’attente (compte à rebours free 1fichier)
-    wait_s = extract_wait_seconds(r.text)
+    wait_s = page.wait_seconds
     form_after_wait_submitted = False
-    form_tag_initial = soup.find("form", id="f1")
+    form_tag_initial = page.form_f1
 
     # Soumission immédiate seulement si PAS de compte à rebours détecté
     immediate_attempt_done = False
+    immediate_saving = False  # fichier reçu: une erreur ne doit plus être ignorée
+    immediate_direct = None
+    direct = None
     if form_tag_initial and wait_s == 0:
         try:
-            r_immediate = await submit_download_form(client, form_tag_initial, str(r.url))
-            immediate_attempt_done = True
-            ct0 = r_immediate.headers.get("content-type", "")
-            if debug:
-                print(f"[debug] Soumission immédiate: status={r_immediate.status_code} url_finale={r_immediate.url} ct={ct0}")
-            if "text/html" not in ct0.lower():
-                head_like = r_immediate
-                filename = choose_filename_from_headers(head_like)
-                final_path = os.path.join(outdir, filename)
-                part_path = final_path + ".part"
-                with open(part_path, "wb") as f:
-                    f.write(r_immediate.content)
-                os.replace(part_path, final_path)
-                _log(f"✅ Terminé → {final_path} (sans attente)")
-                return
-            else:
-                save_debug(debug, "after_immediate_submit", r_immediate.text)
-                soup_after = BeautifulSoup(r_immediate.text, "html.parser")
-                direct_imm = find_direct_link(soup_after, str(r_immediate.url))
-                if direct_imm:
-                    direct = direct_imm
-                    form_after_wait_submitted = True
-                    soup = soup_after
-                    r = r_immediate
+            async with stream_download_form(client, form_tag_initial, str(r.url)) as r_immediate:
+                immediate_attempt_done = True
+                ct0 = r_immediate.headers.get("content-type", "")
+                if debug:
+                    print(f"[debug] Soumission immédiate: status={r_immediate.status_code} url_finale={r_immediate.url} ct={ct0}")
+                if "text/html" not in ct0.lower():
+                    filename = choose_filename_from_headers(r_immediate)
+                    part_path = os.path.join(outdir, filename) + ".part"
+                    if r_immediate.history and os.path.exists(part_path):
+                        # .part à reprendre: le lien direct (cible de la redirection) accepte Range
+                        direct = str(r_immediate.url)
+                        form_after_wait_submitted = True
+                    else:
+                        total_size = int(r_immediate.headers.get("content-length", 0))
+                        existing, journal = load_resume_state(part_path, url, total_size, _log)
+                        immediate_saving = True
+                        immediate_direct = str(r_immediate.url) if r_immediate.history else None
+                        final_path = await _save_response(r_immediate, filename, existing, journal, total_size, range_sent=False)
+                        _progress(filename, total_size or os.path.getsize(final_path), total_size or os.path.getsize(final_path))
+                        _emit("completed", name=filename, path=final_path, size=total_size or os.path.getsize(final_path), mode="free")
+                        return True
+                else:
+                    await r_immediate.aread()
+                    save_debug(debug, "after_immediate_submit", r_immediate.text)
+                    page_after = analyze_page(r_immediate.text, r_immediate.url)
+                    if page_after.direct_link:
+                        direct = page_after.direct_link
+                        form_after_wait_submitted = True
+                        page = page_after
+                        r = r_immediate
         except Exception as e:
+            if immediate_saving:
+                if not (immediate_direct and RetryPolicy.is_retryable(e)):
+                    raise
+                # Coupure: reprise du .part via le lien direct (chemin normal, avec nouvelles tentatives)
+                _log(f"🔁 Transfert: {str(e) or type(e).__name__} — reprise via le lien direct")
+                direct = immediate_direct
+                form_after_wait_submitted = True
             if debug:
                 print("[debug] Soumission immédiate échouée: " + str(e))
 
     if wait_s > 0 and not form_after_wait_submitted:
-        # Attente automatique toujours (suppression des seuils et abandons)
-        _log(f"⏳ Attente {human_duration(wait_s)} (mode gratuit)…")
+        # Attente automatique toujours (suppression des seuils et abandons);
+        # le premier événement waiting annonce l'attente
         fast_factor = 1
         try:
             if os.environ.get("F1_FAST"):
                 fast_factor = max(1, int(os.environ.get("F1_FAST") or 1))
         except ValueError:
             fast_factor = 1
-        # Affichage dynamique
-        for remaining in range(wait_s, 0, -1):
-            if pause_event and not pause_event.is_set():
-                # Attente de reprise
-                await pause_event.wait()
-            _wait_update(remaining, wait_s)
-            if not log_cb:
-                print(f"\r⏳ {human_duration(remaining):>8} restantes", end="")
-            await asyncio.sleep(1 / fast_factor)
+        job = job_id or url
+        unfollow = None
+        if waits is None:
+            # Attente propre à cet appel (et à son event loop); la pause gèle le compte à rebours
+            waits = WaitScheduler()
+            if isinstance(pause_event, PauseEvent):
+                unfollow = waits.follow(pause_event)
+        _wait_update(wait_s, wait_s)
+        try:
+            if log_cb:
+                await waits.wait(job, wait_s / fast_factor)
+            else:
+                # Affichage CLI: le restant est relu sur l'échéance à chaque seconde
+                waiter = asyncio.ensure_future(waits.wait(job, wait_s / fast_factor))
+                try:
+                    while not waiter.done():
+                        left = waits.remaining(job)
+                        remaining = wait_s if left is None else math.ceil(left)
+                        print(f"\r⏳ {human_duration(remaining):>8} restantes", end="")
+                        await asyncio.wait({waiter}, timeout=1)
+                    waiter.result()
+                finally:
+                    waiter.cancel()
+                print()  # newline
+        finally:
+            if unfollow:
+                unfollow()
+        if pause_event and not pause_event.is_set():
+            # Attente de reprise
+            await pause_event.wait()
         _wait_update(0, wait_s)
-        if not log_cb:
-            print()  # newline
         if form_tag_initial and not immediate_attempt_done:
             try:
-                r_after = await submit_download_form(client, form_tag_initial, str(r.url))
+                r_after = await retry.run(lambda: submit_download_form(client, form_tag_initial, str(r.url)), _log, "Formulaire")
                 form_after_wait_submitted = True
-                soup = BeautifulSoup(r_after.text, "html.parser")
+                page = analyze_page(r_after.text, r_after.url)
                 save_debug(debug, "after_wait_submit", r_after.text)
-                if detect_captcha(soup):
-                    print("⚠️ Captcha détecté après soumission. Abandon.")
-                    return
+                if page.captcha:
+                    return _fail("captcha_submit")
                 r = r_after
             except Exception as e:
                 print(f"❌ Soumission après attente échouée: {e}")
                 if debug:
                     print("[debug] Trace:\n" + traceback.format_exc())
         if not form_after_wait_submitted:
-            r = await fetch_html(client, url)
-            soup = BeautifulSoup(r.text, "html.parser")
+            r = await retry.run(lambda: fetch_html(client, url), _log, "Page")
+            page = analyze_page(r.text, r.url)
             save_debug(debug, "after_wait_fallback_get", r.text)
-            if detect_captcha(soup):
-                _log("⚠️ Captcha détecté après attente. Abandon.")
-                return
+            if page.captcha:
+                return _fail("captcha_wait")
 
     # Lien direct (heuristique initiale)
-    direct = find_direct_link(soup, r.url)
+    direct = direct or page.direct_link
     if not direct:
         dl_regex_hit = search_direct_link_in_html(r.text)
         if dl_regex_hit:
@@ -531,14 +2441,14 @@ async def download_file(client, url, outdir=".", debug=False, force_wait=False,
     if not direct:
         # Essai via formulaire
         # Si on a déjà soumis après attente, éviter double POST; sinon chercher un formulaire à soumettre
-        form = None if form_after_wait_submitted else find_download_form(soup)
+        form = None if form_after_wait_submitted else page.form
         if form:
             _log("📝 Soumission du formulaire de téléchargement…")
             attempt = 0
             while attempt < 3 and not direct:
                 attempt += 1
                 try:
-                    r2 = await submit_download_form(client, form, str(r.url))
+                    r2 = await retry.run(lambda: submit_download_form(client, form, str(r.url)), _log, "Formulaire")
                 except Exception as e:
                     if debug:
                         print("[debug] Trace:\n" + traceback.format_exc())
@@ -546,12 +2456,11 @@ async def download_file(client, url, outdir=".", debug=False, force_wait=False,
                     break
                 ct = r2.headers.get("content-type", "")
                 if "text/html" in ct.lower():
-                    soup2 = BeautifulSoup(r2.text, "html.parser")
+                    page2 = analyze_page(r2.text, r2.url)
                     save_debug(debug, f"after_manual_submit_{attempt}", r2.text)
-                    if detect_captcha(soup2):
-                        _log("⚠️ Captcha détecté après soumission. Abandon.")
-                        return
-                    direct = find_direct_link(soup2, r2.url)
+                    if page2.captcha:
+                        return _fail("captcha_submit")
+                    direct = page2.direct_link
                     if not direct:
                         dl_regex_hit = search_direct_link_in_html(r2.text)
                         if dl_regex_hit:
@@ -573,7 +2482,7 @@ async def download_file(client, url, outdir=".", debug=False, force_wait=False,
                                             direct = urljoin(str(r2.url), dest)
                     # Réactualise form avec nouvelle page si encore échec (peut contenir nouveau token hidden)
                     if not direct:
-                        new_form = find_download_form(soup2) or soup2.find("form", id="f1")
+                        new_form = page2.form or page2.form_f1
                         if new_form:
                             form = new_form
                 else:
@@ -581,119 +2490,101 @@ async def download_file(client, url, outdir=".", debug=False, force_wait=False,
                     direct = str(r2.url)
                     break
         if not direct:
-            _log("❌ Impossible de trouver le lien direct (peut-être Captcha ou changement de page). Active --debug pour plus d'info.")
-            return
+            return _fail("no_link")
 
-    # HEAD pour nom + taille
-    head = await client.head(direct, follow_redirects=True)
-    if head.status_code >= 400 or "content-length" not in head.headers:
-        head = await client.get(direct, follow_redirects=True)
-    # Si la réponse semble être une page HTML d'erreur, on fait un GET complet et vérifie contenu
-    if head.headers.get("content-type", "").lower().startswith("text/html") and not head.headers.get("content-disposition"):
-        full_html = head.text if hasattr(head, "text") else ""
-        if looks_like_error_html(full_html):
-            _log("❌ Page HTML reçue au lieu du fichier (probablement indisponible / supprimé / conditions). Aucune sauvegarde.")
-            if debug:
-                save_debug(True, "error_page", full_html)
-            return
-    filename = choose_filename_from_headers(head)
-    final_path = os.path.join(outdir, filename)
-    part_path = final_path + ".part"
-
-    total_size = int(head.headers.get("content-length", 0))
-    accept_ranges = "bytes" in head.headers.get("accept-ranges", "").lower()
-    existing = os.path.getsize(part_path) if os.path.exists(part_path) else 0
-
-    headers = {}
-    mode = "wb"
-    if existing > 0 and accept_ranges:
-        headers["Range"] = f"bytes={existing}-"
-        mode = "ab"
-        _log(f"▶️ Reprise à {existing/1024/1024:.2f} MB")
-    elif existing > 0:
-        _log("ℹ️ Reprise impossible, redémarrage complet.")
-        existing = 0
-
-    # Téléchargement
-    async with client.stream("GET", direct, headers=headers, follow_redirects=True) as resp:
-        resp.raise_for_status()
-        total = int(resp.headers.get("content-length", 0)) + existing if total_size else None
-        downloaded = existing
-        _log(f"⬇️ Téléchargement → {filename} ({total/1024/1024:.2f} MB)" if total else f"⬇️ Téléchargement → {filename}")
-
-        # Variables pour calcul de vitesse
-        start_time = time.time()
-        last_update = start_time
-        last_downloaded = downloaded
-
-        with open(part_path, mode) as f:
-            async for chunk in resp.aiter_bytes(1024*128):
-                if pause_event and not pause_event.is_set():
-                    await pause_event.wait()
-                f.write(chunk)
-                downloaded += len(chunk)
-                
-                # Affichage avec vitesse pour CLI (sans log_cb)
-                if total and not log_cb:
-                    current_time = time.time()
-                    if current_time - last_update > 0.5:  # Mise à jour toutes les 0.5s
-                        elapsed = current_time - start_time
-                        if elapsed > 0:
-                            speed_bps = (downloaded - existing) / elapsed
-                            if speed_bps < 1024:
-                                speed_str = f"{speed_bps:.0f} B/s"
-                            elif speed_bps < 1024*1024:
-                                speed_str = f"{speed_bps/1024:.1f} KB/s"
-                            elif speed_bps < 1024*1024*1024:
-                                speed_str = f"{speed_bps/(1024*1024):.1f} MB/s"
-                            else:
-                                speed_str = f"{speed_bps/(1024*1024*1024):.1f} GB/s"
-                            
-                            # Calcul ETA
-                            if speed_bps > 0:
-                                remaining = total - downloaded
-                                eta_seconds = remaining / speed_bps
-                                if eta_seconds < 60:
-                                    eta_str = f"{eta_seconds:.0f}s"
-                                elif eta_seconds < 3600:
-                                    minutes = int(eta_seconds // 60)
-                                    seconds = int(eta_seconds % 60)
-                                    eta_str = f"{minutes}m{seconds:02d}s"
-                                else:
-                                    hours = int(eta_seconds // 3600)
-                                    minutes = int((eta_seconds % 3600) // 60)
-                                    eta_str = f"{hours}h{minutes:02d}m"
-                            else:
-                                eta_str = "--"
-                            
-                            pct = downloaded / total * 100
-                            print(f"\rProgression: {pct:5.1f}% ({downloaded/1024/1024:.2f} / {total/1024/1024:.2f} MB) - {speed_str} - ETA: {eta_str}", end="")
-                            last_update = current_time
-                        else:
-                            pct = downloaded / total * 100
-                            print(f"\rProgression: {pct:5.1f}% ({downloaded/1024/1024:.2f} / {total/1024/1024:.2f} MB)", end="")
-                
-                _progress(filename, downloaded, total)
-        if not log_cb:
-            print()
+    # Un seul GET en flux: ses en-têtes servent de sonde (nom + taille), son corps
+    # de transfert. Si un .part existe pour le nom attendu (tentative précédente,
+    # sinon nom affiché sur la page), ce même GET porte Range/If-Range.
+    # Après une coupure, une nouvelle tentative repart du dernier octet journalisé.
+    expected = {"filename": os.path.basename(display_name) if display_name else None, "size": 0}
+
+    async def _transfer():
+        # Au plus une requête de plus, si le nom (ou la taille) diffère de l'attendu
+        for attempt in range(3):
+            filename = expected["filename"]
+            part_path = os.path.join(outdir, filename) + ".part" if filename else None
+            existing, journal, headers = 0, None, {}
+            if part_path and os.path.exists(part_path):
+                existing, journal = load_resume_state(part_path, url, expected["size"], _log)
+                if existing > 0:
+                    headers["Range"] = f"bytes={existing}-"
+                    if journal.validator():
+                        headers["If-Range"] = journal.validator()
+            async with client.stream("GET", direct, headers=headers, follow_redirects=True, timeout=TIMEOUT_TRANSFER) as resp:
+                # Si la réponse semble être une page HTML d'erreur, on lit le corps et vérifie contenu
+                if resp.headers.get("content-type", "").lower().startswith("text/html") and not resp.headers.get("content-disposition"):
+                    await resp.aread()
+                    full_html = resp.text
+                    if looks_like_error_html(full_html):
+                        if debug:
+                            save_debug(True, "error_page", full_html)
+                        return None
+                resp.raise_for_status()
+                name = choose_filename_from_headers(resp)
+                total_size = response_total_size(resp)
+                retry_left = attempt < 2
+                if headers and (name != filename or not journal.matches(url, total_size)):
+                    # Le .part attendu n'est pas celui de ce fichier: requête avec le bon nom / la bonne taille
+                    expected.update(filename=name, size=total_size)
+                    if resp.status_code == 206 and retry_left:
+                        continue
+                    headers = {}
+                if not headers:
+                    if journal is None or name != filename or not journal.matches(url, total_size):
+                        part_path = os.path.join(outdir, name) + ".part"
+                        existing, journal = load_resume_state(part_path, url, total_size, _log)
+                    filename = name
+                    journal.size = total_size or journal.size
+                    accept_ranges = "bytes" in resp.headers.get("accept-ranges", "").lower()
+                    if existing > 0 and accept_ranges and retry_left:
+                        # .part découvert seulement maintenant (nom ≠ nom affiché)
+                        expected.update(filename=name, size=total_size)
+                        continue
+                    if existing > 0:
+                        _log("ℹ️ Reprise impossible, redémarrage complet.")
+                        existing = 0
+                        journal.reset(total_size)
+                else:
+                    journal.size = total_size or journal.size
+                    if resp.status_code == 206:
+                        _log(f"▶️ Reprise à {existing/1024/1024:.2f} MB")
+                expected.update(filename=filename, size=total_size)
+                final_path = await _save_response(resp, filename, existing, journal, total_size, range_sent=bool(headers))
+                return final_path, filename, total_size
+        raise httpx.RemoteProtocolError("Nom ou taille du fichier instable entre deux requêtes")
 
-    os.replace(part_path, final_path)
-    _log(f"✅ Terminé → {final_path}")
+    result = await retry.run(_transfer, _log, "Transfert")
+    if result is None:
+        return _fail("html_page")
+    final_path, filename, total_size = result
+    if cache:
+        await cache.aput(url, size=total_size, alive=True)
     _progress(filename, total_size or os.path.getsize(final_path), total_size or os.path.getsize(final_path))
+    _emit("completed", name=filename, path=final_path, size=total_size or os.path.getsize(final_path), mode="free")
+    return True
 
-async def prefetch_display_names(client, urls, log_cb=None):
+async def prefetch_display_names(client, urls, log_cb=None, cache: MetadataCache | None = None):
     """Précharge les noms de fichiers (nom affiché) pour une liste d'URLs avant lancement des téléchargements.
     Ne déclenche pas d'attente ni de soumission de formulaire: simple GET initial.
+    Avec `cache`, une URL déjà résolue (nom connu ou fichier indisponible)
+    n'est pas relue; les pages lues y sont enregistrées.
     Retour: dict {url: nom_ou_None}.
     """
     results: dict[str, str | None] = {}
 
     async def _one(u: str):
+        meta = await cache.aget(u) if cache else None
+        if meta and (meta["name"] or meta["alive"] is False):
+            results[u] = meta["name"]
+            if log_cb:
+                log_cb(f"📄 Nom en cache: {meta['name']} ← {u}" if meta["name"] else f"📄 Fichier indisponible (cache) ← {u}")
+            return
         name = None
         try:
-            r = await fetch_html(client, u)
-            soup = BeautifulSoup(r.text, "html.parser")
-            name = extract_display_filename(soup)
+            r, page = await fetch_page(client, u)
+            name = page.name
+            if cache:
+                await cache.aput(u, name=name, alive=not (page.error and not page.direct_link))
         except Exception:
             name = None
         results[u] = name
@@ -721,15 +2612,15 @@ async def test_api_key(api_key: str, test_url: str = "https://1fichier.com/?egbi
         'Content-Type': 'application/json'
     }
     
-    async with httpx.AsyncClient(headers={"User-Agent":"Mozilla/5.0"}) as client:
+    async with make_client() as client:
         # Test 1: Récupération des infos du fichier
         print("\n📋 Test 1: Récupération des informations du fichier...")
         try:
             info_resp = await client.post(
-                "https://api.1fichier.com/v1/file/info.cgi",
+                f"{API_BASE}/file/info.cgi",
                 json={'url': test_url},
                 headers=auth_headers,
-                timeout=30
+                timeout=TIMEOUT_API
             )
             print(f"   Status HTTP: {info_resp.status_code}")
             
@@ -772,10 +2663,10 @@ async def test_api_key(api_key: str, test_url: str = "https://1fichier.com/?egbi
         print("\n🔗 Test 2: Obtention du lien de téléchargement...")
         try:
             dl_resp = await client.post(
-                "https://api.1fichier.com/v1/download/get_token.cgi",
+                f"{API_BASE}/download/get_token.cgi",
                 json={'url': test_url},
                 headers=auth_headers,
-                timeout=30
+                timeout=TIMEOUT_API
             )
             print(f"   Status HTTP: {dl_resp.status_code}")
             
@@ -827,6 +2718,27 @@ Options:
   -d, --debug         Mode debug (sauvegarde des pages HTML)
   --save-html         Sauvegarde les pages HTML pour diagnostic
   --api-key KEY       Clé API premium 1fichier pour téléchargement rapide
+  -c, --connections N Connexions parallèles par fichier en premium (défaut: 1)
+  -j, --jobs N        Téléchargements simultanés (défaut: 3)
+  --per-host N        Requêtes simultanées par hôte 1fichier (défaut: 4)
+  --preallocate       Réserve la taille finale du .part avant d'écrire (échec
+                      immédiat si l'espace disque manque)
+  --checksum          Calcule l'empreinte SHA-256 pendant le téléchargement
+                      (fichier <nom>.sha256, vérifiée contre l'API en premium)
+  --limit RATE        Débit maximal total, ex: 500K, 2M (défaut: illimité)
+  --limit-per-file RATE
+                      Débit maximal de chaque téléchargement
+  --limit-schedule SPEC
+                      Débit total selon l'heure, ex: "08:00-19:00=1M,19:00-08:00=0"
+                      (0 = illimité; hors plages: --limit)
+  --retries N         Nouvelles tentatives après une erreur réseau, avec
+                      attente croissante; un transfert reprend là où il a
+                      été coupé (défaut: 5, 0 = aucune)
+  --lookahead N       Premium: fichiers suivants dont les infos et le lien
+                      sont obtenus pendant le transfert en cours (défaut: 2)
+  --no-store          N'enregistre ni la file (~/.1fichier_jobs.sqlite3) ni le
+                      cache des noms (~/.1fichier_cache.sqlite3); sans URL,
+                      la file non terminée enregistrée est reprise
   --test-api          Test la clé API sans télécharger
   --gui               Lance l'interface graphique
   
@@ -837,9 +2749,15 @@ Exemples:
   # Téléchargement premium avec clé API
   python main.py --api-key YOUR_API_KEY https://1fichier.com/?abcd1234
   
+  # Téléchargement premium segmenté sur 4 connexions
+  python main.py --api-key YOUR_API_KEY -c 4 https://1fichier.com/?abcd1234
+  
   # Test de clé API
   python main.py --api-key YOUR_API_KEY --test-api
   
+  # Limiter le débit à 2 MB/s en journée, illimité la nuit
+  python main.py --limit-schedule "08:00-20:00=2M" https://1fichier.com/?abcd1234
+  
   # Téléchargement multiple avec dossier de sortie
   python main.py -o downloads https://1fichier.com/?file1 https://1fichier.com/?file2
   
@@ -852,68 +2770,14 @@ Exemples:
 Notes:
   - En mode premium (avec --api-key), le téléchargement se fait via l'API
   - En cas d'échec premium, fallback automatique vers le mode gratuit
+  - --connections découpe les fichiers premium en plages téléchargées en parallèle
+  - Les lots démarrent au plus --jobs fichiers à la fois, les suivants à mesure
+    que les précédents se terminent
   - L'option --test-api permet de vérifier votre clé API sans télécharger
   - Sans arguments, le programme demande les URLs interactivement
   - En binaire (.exe), lance automatiquement l'interface graphique
 """)
 
-async def main(argv=None):
-    # Si lancé en binaire PyInstaller (frozen) sans arguments -> ouvrir GUI automatiquement
-    if argv is None:
-        if getattr(sys, 'frozen', False) and len(sys.argv) == 1:
-            argv = ['--gui']
-        else:
-            argv = sys.argv[1:]
-    
-    if "--gui" in argv:
-        import gui  # type: ignore
-        gui.launch_gui()
-        return
-    
-    urls, outdir, debug, save_html, api_key, test_api, help_requested = parse_args(argv)
-    
-    if help_requested:
-        print_help()
-        return
-    
-    # Mode test API
-    if test_api:
-        if not api_key:
-            api_key = input("Entrez votre clé API 1fichier: ").strip()
-        if not api_key:
-            print("❌ Clé API requise pour le test")
-            return
-        
-        test_url = "https://1fichier.com/?egbirg99i0xnyikzmqhj"  # URL par défaut
-        if urls:
-            test_url = urls[0]  # Utiliser la première URL fournie si disponible
-        
-        success = await test_api_key(api_key, test_url)
-        if success:
-            print("\n🎉 Test API réussi ! Votre clé API fonctionne correctement.")
-        else:
-            print("\n❌ Test API échoué. Vérifiez votre clé API et votre statut premium.")
-        return
-    
-    force_wait = any(a in ("--force-wait",) for a in argv)
-    if not urls:
-        urls = input("Entre les URLs 1fichier (séparées par espace ou retour ligne) :\n").split()
-    if outdir and not os.path.isdir(outdir):
-        os.makedirs(outdir, exist_ok=True)
-    async with httpx.AsyncClient(headers={"User-Agent":"Mozilla/5.0"}) as client:
-        # Pré-récupération des noms si plusieurs URLs
-        clean_urls = [u.strip() for u in urls if u.strip()]
-        if len(clean_urls) > 1:
-            print("🔍 Pré-récupération des noms...")
-            name_map = await prefetch_display_names(client, clean_urls, log_cb=lambda m: print(m))
-            print("— Récapitulatif —")
-            for idx, u in enumerate(clean_urls, 1):
-                nm = name_map.get(u) or "(nom inconnu)"
-                print(f"{idx:2d}. {nm}")
-            print()
-        tasks = [download_file(client, u, outdir=outdir, debug=debug, force_wait=force_wait, save_html=save_html, api_key=api_key) for u in clean_urls]
-        await asyncio.gather(*tasks)
-
 def parse_args(argv):
     urls = []
     outdir = "."
@@ -922,6 +2786,38 @@ def parse_args(argv):
     api_key = None
     test_api = False
     help_requested = False
+    # Réglages de performance (valeurs par défaut = comportement historique)
+    opts = {
+        "connections": 1,
+        "max_jobs": DEFAULT_MAX_JOBS,
+        "per_host": DEFAULT_PER_HOST,
+        "preallocate": False,
+        "checksum": False,
+        "limit": 0,
+        "limit_per_job": 0,
+        "limit_schedule": [],
+        "retries": DEFAULT_RETRY_POLICY.retries,
+        "lookahead": PREMIUM_LOOKAHEAD,
+        "no_store": False,
+    }
+    bool_flags = {
+        "--preallocate": "preallocate",
+        "--checksum": "checksum",
+        "--no-store": "no_store",
+    }
+    int_flags = {
+        "--connections": "connections", "-c": "connections",
+        "--jobs": "max_jobs", "-j": "max_jobs",
+        "--per-host": "per_host",
+        "--retries": "retries",
+        "--lookahead": "lookahead",
+    }
+    int_minimums = {"retries": 0, "lookahead": 0}
+    value_flags = {
+        "--limit": ("limit", parse_rate),
+        "--limit-per-file": ("limit_per_job", parse_rate),
+        "--limit-schedule": ("limit_schedule", parse_schedule),
+    }
     i = 0
     while i < len(argv):
         a = argv[i]
@@ -939,13 +2835,28 @@ def parse_args(argv):
             i += 1
         elif a == "--test-api":
             test_api = True
+        elif a in bool_flags:
+            opts[bool_flags[a]] = True
+        elif a in int_flags and i + 1 < len(argv):
+            try:
+                opts[int_flags[a]] = max(int_minimums.get(int_flags[a], 1), int(argv[i+1]))
+            except ValueError:
+                pass
+            i += 1
+        elif a in value_flags and i + 1 < len(argv):
+            key, parse = value_flags[a]
+            try:
+                opts[key] = parse(argv[i+1])
+            except ValueError as e:
+                print(f"⚠️ {a} ignoré: {e}")
+            i += 1
         elif a.startswith("-"):
             # unrecognized flag ignored
             pass
         else:
             urls.append(a)
         i += 1
-    return urls, outdir, debug or bool(os.environ.get("F1_DEBUG")), save_html, api_key, test_api, help_requested
+    return urls, outdir, debug or bool(os.environ.get("F1_DEBUG")), save_html, api_key, test_api, help_requested, opts
 
 async def main(argv=None):
     # Si lancé en binaire PyInstaller (frozen) sans arguments -> ouvrir GUI automatiquement
@@ -960,7 +2871,7 @@ async def main(argv=None):
         gui.launch_gui()
         return
     
-    urls, outdir, debug, save_html, api_key, test_api, help_requested = parse_args(argv)
+    urls, outdir, debug, save_html, api_key, test_api, help_requested, opts = parse_args(argv)
     
     if help_requested:
         print_help()
@@ -986,23 +2897,85 @@ async def main(argv=None):
         return
     
     force_wait = any(a in ("--force-wait",) for a in argv)
+    store = cache = None
+    if not opts["no_store"]:
+        try:
+            store = JobStore()
+            cache = MetadataCache()
+        except sqlite3.Error as e:
+            print(f"⚠️ File persistante indisponible: {e}")
+    if not urls and store:
+        urls = [job["url"] for job in store.pending()]
+        if urls:
+            print(f"📋 Reprise de la file enregistrée: {len(urls)} lien(s) non terminé(s)")
     if not urls:
         urls = input("Entre les URLs 1fichier (séparées par espace ou retour ligne) :\n").split()
     if outdir and not os.path.isdir(outdir):
         os.makedirs(outdir, exist_ok=True)
-    async with httpx.AsyncClient(headers={"User-Agent":"Mozilla/5.0"}) as client:
-        # Pré-récupération des noms si plusieurs URLs
-        clean_urls = [u.strip() for u in urls if u.strip()]
-        if len(clean_urls) > 1:
-            print("🔍 Pré-récupération des noms...")
-            name_map = await prefetch_display_names(client, clean_urls, log_cb=lambda m: print(m))
-            print("— Récapitulatif —")
-            for idx, u in enumerate(clean_urls, 1):
-                nm = name_map.get(u) or "(nom inconnu)"
-                print(f"{idx:2d}. {nm}")
-            print()
-        tasks = [download_file(client, u, outdir=outdir, debug=debug, force_wait=force_wait, save_html=save_html, api_key=api_key) for u in clean_urls]
-        await asyncio.gather(*tasks)
+    clean_urls = [u.strip() for u in urls if u.strip()]
+    known: dict[str, dict] = {}
+    if store:
+        store.add(clean_urls)
+        known = {job["url"]: job for job in store.jobs(urls=clean_urls)}
+        # Déjà téléchargés (et toujours présents): rien à refaire
+        skipped = [u for u in clean_urls if known[u]["state"] == "done" and known[u]["name"] and os.path.exists(os.path.join(outdir, known[u]["name"]))]
+        for u in skipped:
+            print(f"✅ Déjà téléchargé: {known[u]['name']}")
+        clean_urls = [u for u in clean_urls if u not in skipped]
+    per_host = opts["per_host"]
+    if opts["connections"] > per_host:
+        # Sinon les connexions au-delà de --per-host attendraient leur tour sur l'hôte a-NN
+        print(f"ℹ️ --per-host relevé à {opts['connections']} pour --connections {opts['connections']}")
+        per_host = opts["connections"]
+    scheduler = JobScheduler(opts["max_jobs"], per_host)
+    global_limiter = RateLimiter(opts["limit"], opts["limit_schedule"])
+    retry = RetryPolicy(opts["retries"])
+    try:
+        async with make_client(scheduler) as client:
+            # Pré-récupération des noms si plusieurs URLs (sauf noms déjà connus)
+            resolver = None
+            if api_key and api_key.strip():
+                resolver = PremiumResolver(client, api_key.strip(), opts["lookahead"], retry)
+                resolver.queue(clean_urls)
+            if len(clean_urls) > 1:
+                name_map = {u: known[u]["name"] for u in clean_urls if u in known and known[u]["name"]}
+                unknown = [u for u in clean_urls if u not in name_map]
+                if unknown:
+                    print("🔍 Pré-récupération des noms...")
+                    name_map.update(await prefetch_display_names(client, unknown, log_cb=lambda m: print(m), cache=cache))
+                print("— Récapitulatif —")
+                for idx, u in enumerate(clean_urls, 1):
+                    nm = name_map.get(u) or "(nom inconnu)"
+                    print(f"{idx:2d}. {nm}")
+                    if store and name_map.get(u) and not known.get(u, {}).get("name"):
+                        store.update(u, name=name_map[u])
+                print()
+            def _track(u, filename, downloaded, total, pct):
+                store.update(u, name=filename, size=total, downloaded=downloaded)
+            async def _job(u):
+                limiter = RateLimiter(opts["limit_per_job"], parent=global_limiter)
+                if store:
+                    store.update(u, state="running", error=None)
+                try:
+                    ok = await download_file(client, u, outdir=outdir, debug=debug, force_wait=force_wait, save_html=save_html, progress_cb=_track if store else None, api_key=api_key, connections=opts["connections"], preallocate=opts["preallocate"], checksum=opts["checksum"], limiter=limiter if limiter.active else None, retry=retry, resolver=resolver, cache=cache)
+                except Exception as e:
+                    if store:
+                        store.update(u, state="error", error=str(e) or type(e).__name__)
+                    raise
+                if store:
+                    store.update(u, state="done" if ok else "error", error=None if ok else "Téléchargement non terminé")
+            try:
+                errors = await scheduler.run(clean_urls, _job)
+            finally:
+                if resolver:
+                    await resolver.aclose()
+            for u, e in errors:
+                print(f"❌ Erreur {u}: {e}")
+    finally:
+        if store:
+            store.close()
+        if cache:
+            cache.close()
 
 if __name__ == "__main__":
     asyncio.run(main())